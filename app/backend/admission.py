@@ -0,0 +1,160 @@
+import asyncio
+import math
+from collections import deque
+from typing import Optional, Sequence
+
+from starlette.responses import JSONResponse
+
+from metrics import Counter
+from ratelimit import QuotaExceeded, Quotas, TokenBucket
+
+
+class Rejected(Exception):
+    """Raised when a request is shed; answered with ``status`` and a Retry-After header."""
+
+    def __init__(self, status: int, reason: str, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status = status
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Gate:
+    """At most ``limit`` requests inside, at most ``max_queue`` more waiting, each for at most ``timeout`` seconds.
+
+    Waiters are admitted in arrival order; a leaving request hands its slot
+    straight to the oldest waiter. A limit of 0 disables the gate.
+    """
+
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def enter(self):
+        if self.limit <= 0:
+            self.active += 1
+            return
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue or self.timeout <= 0:
+            raise Rejected(503, "queue_full", "Server busy, retry shortly", max(1.0, self.timeout))
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            raise Rejected(503, "queue_timeout", "Server busy, retry shortly", max(1.0, self.timeout)) from None
+        except asyncio.CancelledError:
+            # The client went away; a slot handed over in the meantime is passed on
+            if waiter.done() and not waiter.cancelled():
+                self.leave()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def leave(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter; active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionRule:
+    """Admission limits for one group of routes: POSTs whose path starts with one of ``prefixes``.
+
+    Checked in order: a token bucket per client address (429), one shared by
+    the whole group (503), then the concurrency gate and its bounded queue
+    (503). A rate of 0 disables that bucket.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        prefixes: Sequence[str],
+        ip_rate: float,
+        ip_burst: float,
+        rate: float,
+        burst: float,
+        concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        methods: Sequence[str] = ("POST",),
+        max_clients: int = 10_000,
+    ):
+        self.name = name
+        self.prefixes = tuple(prefixes)
+        self.methods = frozenset(m.upper() for m in methods)
+        self.clients = Quotas(ip_rate, ip_burst, concurrency=0, max_keys=max_clients)
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.gate = Gate(concurrency, max_queue, queue_timeout)
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and path.startswith(self.prefixes)
+
+    async def admit(self, client: str):
+        try:
+            self.clients.charge(client)
+        except QuotaExceeded as e:
+            raise Rejected(429, "client_rate", "Too many requests", e.retry_after) from None
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait > 0:
+                raise Rejected(503, "route_rate", "Server busy, retry shortly", wait)
+        await self.gate.enter()
+
+    def stats(self) -> dict:
+        return {"active": self.gate.active, "queued": self.gate.queued}
+
+
+class AdmissionControl:
+    """ASGI middleware that sheds load on expensive routes before any work is done.
+
+    A request matching a rule is admitted, or answered at once with 429 (this
+    client is over its rate) or 503 (the route is over its rate, or its wait
+    queue is full or the wait ran past its deadline), always with
+    Retry-After. An admitted request keeps its slot until the response has
+    been sent. Other requests pass straight through.
+    """
+
+    def __init__(self, app, rules: Sequence[AdmissionRule], rejections: Optional[Counter] = None):
+        self.app = app
+        self.rules = tuple(rules)
+        self.rejections = rejections
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        rule = next((r for r in self.rules if r.matches(method, path)), None)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        try:
+            await rule.admit(client[0] if client else "unknown")
+        except Rejected as e:
+            if self.rejections is not None:
+                self.rejections.inc(rule.name, e.reason)
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status, headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            rule.gate.leave()
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+import mongo
+from circuit import CircuitBreaker
+from rollups import Rollups
+
+logger = logging.getLogger(__name__)
+
+# size_bytes histogram: four log2 buckets per doubling (~19% wide), bucket 0 holds empty files
+BUCKETS_PER_DOUBLING = 4
+# Descriptions are counted by their first characters; longer ones sharing a prefix count together
+DESCRIPTION_KEY_CHARS = 200
+PERCENTILES = (50, 90, 99)
+
+
+def size_bucket(size: int) -> int:
+    # Same expression as the backfill pipeline, so live and backfilled counts land in the same buckets
+    return 0 if size < 1 else math.floor(math.log(size, 2) * BUCKETS_PER_DOUBLING) + 1
+
+
+def bucket_value(bucket: int) -> float:
+    # Geometric middle of the bucket
+    return 0.0 if bucket == 0 else 2 ** ((bucket - 0.5) / BUCKETS_PER_DOUBLING)
+
+
+def percentiles(histogram: Dict[int, int], points=PERCENTILES) -> Dict[str, int]:
+    total = sum(histogram.values())
+    result = {}
+    if not total:
+        return {f"p{p}": 0 for p in points}
+    ordered = sorted(histogram.items())
+    for p in points:
+        rank, seen = math.ceil(p / 100 * total), 0
+        for bucket, count in ordered:
+            seen += count
+            if seen >= rank:
+                result[f"p{p}"] = round(bucket_value(bucket))
+                break
+    return result
+
+
+class GenerationRollups(Rollups):
+    """Generation counts, bytes and size histograms per day and provider, plus description counts.
+
+    ``apply`` is called with records as they are stored and writes the
+    deltas as ``$inc`` upserts, one document per (day, provider) in
+    ``rollups`` and one per description in ``descriptions``. Deltas that
+    could not be written stay pending, as in StatusRollups. Only finished
+    ("done") records are counted.
+    """
+
+    label = "generation rollup"
+
+    def __init__(self, rollups: Callable, descriptions: Callable, breaker: CircuitBreaker, flush_interval: float = 5.0):
+        super().__init__(breaker, flush_interval)
+        self.rollups = rollups
+        self.descriptions = descriptions
+        self._days: Dict[Tuple[str, str], Counter] = {}
+        self._descriptions: Counter = Counter()
+
+    @property
+    def pending(self) -> int:
+        return len(self._days) + len(self._descriptions)
+
+    def add(self, records: List[dict]):
+        for record in records:
+            if record.get("status", "done") != "done":
+                continue
+            key = (record["created_at"][:10], record.get("provider") or "auto")
+            delta = self._days.get(key)
+            if delta is None:
+                delta = self._days[key] = Counter()
+            size = int(record.get("size_bytes") or 0)
+            delta["count"] += 1
+            delta["bytes"] += size
+            delta[f"size_hist.{size_bucket(size)}"] += 1
+            self._descriptions[record["description"][:DESCRIPTION_KEY_CHARS]] += 1
+
+    async def flush(self):
+        async with self._lock:
+            days, self._days = self._days, {}
+            descriptions, self._descriptions = self._descriptions, Counter()
+            if days:
+                keys = list(days)
+                applied = await self._write(self.rollups, [
+                    mongo.UpdateOne(
+                        {"day": day, "provider": provider}, {"$inc": dict(days[(day, provider)])}, upsert=True,
+                    )
+                    for day, provider in keys
+                ])
+                for key in keys[applied:]:
+                    self._days.setdefault(key, Counter()).update(days[key])
+            if descriptions:
+                texts = list(descriptions)
+                applied = await self._write(self.descriptions, [
+                    mongo.UpdateOne({"description": text}, {"$inc": {"count": descriptions[text]}}, upsert=True)
+                    for text in texts
+                ])
+                for text in texts[applied:]:
+                    self._descriptions[text] += descriptions[text]
+
+
+async def summarize(db, days: int, top: int) -> dict:
+    """Analytics for the last ``days`` UTC days from the rollup documents; never reads generations."""
+    since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    docs = await db.generation_rollups.find({"day": {"$gte": since}}, {"_id": 0}).to_list(None)
+    top_docs = await db.generation_descriptions.find({}, {"_id": 0}).sort([("count", -1), ("description", 1)]).limit(top).to_list(top)
+    by_day: Dict[str, Counter] = {}
+    by_provider: Dict[str, Counter] = {}
+    histogram: Counter = Counter()
+    for doc in docs:
+        for group, key in ((by_day, doc["day"]), (by_provider, doc["provider"])):
+            group.setdefault(key, Counter()).update({"count": doc.get("count", 0), "bytes": doc.get("bytes", 0)})
+        histogram.update({int(b): n for b, n in (doc.get("size_hist") or {}).items()})
+    count = sum(c["count"] for c in by_day.values())
+    total_bytes = sum(c["bytes"] for c in by_day.values())
+    return {
+        "since": since,
+        "count": count,
+        "bytes": total_bytes,
+        "per_day": [{"day": d, "count": c["count"], "bytes": c["bytes"]} for d, c in sorted(by_day.items())],
+        "per_provider": [
+            {"provider": p, "count": c["count"], "bytes": c["bytes"]}
+            for p, c in sorted(by_provider.items(), key=lambda item: -item[1]["count"])
+        ],
+        "size_bytes": {"mean": round(total_bytes / count) if count else 0, **percentiles(histogram)},
+        "top_descriptions": [{"description": d["description"], "count": d["count"]} for d in top_docs],
+    }
+
+
+# -------- One-off backfill --------
+
+def backfill_pipelines() -> Tuple[list, list]:
+    """Aggregations computing, from generations, what GenerationRollups maintains incrementally."""
+    done = {"$match": {"$or": [{"status": "done"}, {"status": {"$exists": False}}]}}
+    bucket = {"$cond": [
+        {"$lt": ["$size_bytes", 1]},
+        0,
+        {"$add": [{"$floor": {"$multiply": [{"$log": ["$size_bytes", 2]}, BUCKETS_PER_DOUBLING]}}, 1]},
+    ]}
+    days = [done, {"$group": {
+        "_id": {"day": {"$substrBytes": ["$created_at", 0, 10]}, "provider": {"$ifNull": ["$provider", "auto"]}, "bucket": bucket},
+        "count": {"$sum": 1},
+        "bytes": {"$sum": "$size_bytes"},
+    }}]
+    descriptions = [done, {"$group": {"_id": "$description", "count": {"$sum": 1}}}]
+    return days, descriptions
+
+
+async def backfill(db) -> Tuple[int, int]:
+    """Rebuilds generation_rollups and generation_descriptions from the generations collection.
+
+    The groups are computed by the server; only one small document per (day,
+    provider, size bucket) and per description comes back. Rollup documents
+    are replaced, so the job can be re-run; updates applied by a running
+    server while it runs may be overwritten, so run it when writes are quiet.
+    """
+    days_pipeline, descriptions_pipeline = backfill_pipelines()
+    days: Dict[Tuple[str, str], dict] = {}
+    async for group in db.generations.aggregate(days_pipeline, allowDiskUse=True):
+        key = (group["_id"]["day"], group["_id"]["provider"])
+        doc = days.setdefault(key, {"day": key[0], "provider": key[1], "count": 0, "bytes": 0, "size_hist": {}})
+        doc["count"] += group["count"]
+        doc["bytes"] += group["bytes"]
+        doc["size_hist"][str(int(group["_id"]["bucket"]))] = group["count"]
+    descriptions: Counter = Counter()
+    async for group in db.generations.aggregate(descriptions_pipeline, allowDiskUse=True):
+        descriptions[(group["_id"] or "")[:DESCRIPTION_KEY_CHARS]] += group["count"]
+    if days:
+        await db.generation_rollups.bulk_write([
+            mongo.ReplaceOne({"day": d["day"], "provider": d["provider"]}, d, upsert=True) for d in days.values()
+        ], ordered=False)
+    if descriptions:
+        await db.generation_descriptions.bulk_write([
+            mongo.ReplaceOne({"description": text}, {"description": text, "count": n}, upsert=True)
+            for text, n in descriptions.items()
+        ], ordered=False)
+    return len(days), len(descriptions)
+
+
+if __name__ == "__main__":
+    # python analytics.py: one-off backfill against MONGO_URL / DB_NAME
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        try:
+            rollups, described = await backfill(client[os.environ.get("DB_NAME", "app_db")])
+            logger.info("Backfilled %d day/provider rollups and %d descriptions", rollups, described)
+        finally:
+            client.close()
+
+    asyncio.run(main())
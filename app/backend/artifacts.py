@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import logging
+import os
+import stat
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Temporary files older than this were left behind by a crashed writer
+STALE_TMP_SECONDS = 24 * 3600
+
+
+def artifact_etag(name: str) -> str:
+    # Artifacts never change once written, so the name stem (content digest, or the job id of older
+    # artifacts) is a valid strong validator
+    return f'"{Path(name).stem}"'
+
+
+class ArtifactWriter:
+    """Writes one artifact incrementally, hashing as it goes.
+
+    The file is named after its SHA-256 on ``commit``, so identical outputs
+    (cache hits, repeated builds) share one file. A failing disk never fails
+    the response being written: the artifact is abandoned and ``commit``
+    returns None.
+    """
+
+    def __init__(self, store: "ArtifactStore", suffix: str):
+        self.store = store
+        self.suffix = suffix
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._tmp = store.directory / f".{uuid.uuid4().hex}{suffix}.tmp"
+        self._fh = None
+        try:
+            self._fh = self._tmp.open("wb")
+        except OSError as e:
+            logger.warning("Not storing artifact: %s", e)
+
+    def write(self, data: bytes):
+        if self._fh is None:
+            return
+        try:
+            self._fh.write(data)
+        except OSError as e:
+            logger.warning("Not storing artifact: %s", e)
+            self.abort()
+            return
+        self._hash.update(data)
+        self.size += len(data)
+
+    def commit(self) -> Optional[str]:
+        if self._fh is None:
+            return None
+        try:
+            self._fh.close()
+            self._fh = None
+            name = f"{self._hash.hexdigest()}{self.suffix}"
+            path = self.store.path(name)
+            if path.exists():
+                self._tmp.unlink()
+                self.store.touch(name)
+            else:
+                os.replace(self._tmp, path)
+            return name
+        except OSError as e:
+            logger.warning("Not storing artifact: %s", e)
+            self.abort()
+            return None
+
+    def abort(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._tmp.unlink(missing_ok=True)
+
+    def tee(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        # Stored in the same thread that produces each chunk; abandoned if the client goes away
+        completed = False
+        try:
+            for chunk in chunks:
+                self.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if not completed:
+                self.abort()
+
+
+class ArtifactStore:
+    """Generated files kept on local disk, named by content digest.
+
+    Files are kept for ``max_age`` seconds after they were last written or
+    served, and the least recently used go first once the store holds more
+    than ``max_bytes``; 0 disables either limit. Both are enforced by
+    ``sweep``, run every ``sweep_interval`` seconds once ``start`` is called.
+    A record whose file was swept answers 410 on download.
+    """
+
+    def __init__(self, directory: str, max_age: float = 0, max_bytes: int = 0, sweep_interval: float = 300):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._task: Optional[asyncio.Task] = None
+        self.swept = 0
+
+    def path(self, name: str) -> Path:
+        # Names come from records, never from user input, but stay inside the store regardless
+        path = (self.directory / name).resolve()
+        if path.parent != self.directory.resolve():
+            raise ValueError(f"Invalid artifact name: {name}")
+        return path
+
+    def writer(self, suffix: str = ".xlsx") -> ArtifactWriter:
+        return ArtifactWriter(self, suffix)
+
+    def _write(self, data: bytes, suffix: str) -> Optional[str]:
+        name = f"{hashlib.sha256(data).hexdigest()}{suffix}"
+        path = self.path(name)
+        if path.exists():
+            self.touch(name)
+            return name
+        tmp = self.directory / f".{uuid.uuid4().hex}{suffix}.tmp"
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Not storing artifact: %s", e)
+            tmp.unlink(missing_ok=True)
+            return None
+        return name
+
+    async def save(self, data: bytes, suffix: str = ".xlsx") -> Optional[str]:
+        return await asyncio.to_thread(self._write, data, suffix)
+
+    def stat(self, name: Optional[str]) -> Optional[os.stat_result]:
+        if not name:
+            return None
+        try:
+            result = self.path(name).stat()
+        except (OSError, ValueError):
+            return None
+        return result if stat.S_ISREG(result.st_mode) else None
+
+    def exists(self, name: Optional[str]) -> bool:
+        return self.stat(name) is not None
+
+    async def delete(self, name: str):
+        await asyncio.to_thread(self.path(name).unlink, True)
+
+    def touch(self, name: Optional[str]):
+        # The modification time doubles as the last use, which retention goes by
+        if not name:
+            return
+        try:
+            os.utime(self.path(name))
+        except (OSError, ValueError):
+            pass
+
+    def _sweep(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            if entry.name.startswith("."):
+                if now - st.st_mtime > STALE_TMP_SECONDS:
+                    Path(entry.path).unlink(missing_ok=True)
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+        # Least recently used first; stops at the first file that is neither expired nor over the size limit
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            expired = self.max_age > 0 and now - mtime > self.max_age
+            if not expired and not (self.max_bytes > 0 and total > self.max_bytes):
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not remove artifact %s: %s", path, e)
+                continue
+            total -= size
+            removed += 1
+        self.swept += removed
+        return removed
+
+    async def sweep(self) -> int:
+        """Deletes expired files, then least recently used ones down to ``max_bytes``; returns the number removed."""
+        return await asyncio.to_thread(self._sweep)
+
+    async def _run(self):
+        while True:
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info("Removed %d artifacts past their retention", removed)
+            except Exception:
+                logger.exception("Artifact sweep failed")
+            await asyncio.sleep(self.sweep_interval)
+
+    def start(self):
+        if self._task is None and (self.max_age > 0 or self.max_bytes > 0):
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+
+class InvalidToken(Exception):
+    """Raised for a bearer token that is malformed, badly signed or expired."""
+
+
+class Principal(NamedTuple):
+    user_id: str
+    email: Optional[str] = None
+
+
+class TokenVerifier:
+    """Issues and verifies HS256 access tokens, remembering the ones already verified.
+
+    A verified token is kept with its claims in a bounded LRU keyed by the
+    token string, so repeat requests skip signature checking and claim
+    parsing. Entries are checked against their ``exp`` on every hit and
+    dropped once expired; tokens without ``exp`` or ``sub`` are rejected.
+
+    ``revoke`` refuses a token from then on, cached or not. Revocations are
+    held in memory by this verifier, until the token would have expired.
+    """
+
+    def __init__(self, secret: str, algorithm: str = "HS256", max_entries: int = 10_000):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self._verified: "OrderedDict[str, tuple]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}  # token -> exp
+        self.hits = 0
+        self.misses = 0
+
+    def issue(self, user_id: str, email: str, expires_minutes: float) -> str:
+        from jose import jwt
+
+        now = int(time.time())
+        payload = {"sub": user_id, "email": email, "iat": now, "exp": now + int(expires_minutes * 60)}
+        return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+    def verify(self, token: str) -> Principal:
+        if token in self._revoked:
+            raise InvalidToken("Token revoked")
+        entry = self._verified.get(token)
+        if entry is not None:
+            principal, expires = entry
+            if expires > time.time():
+                self._verified.move_to_end(token)
+                self.hits += 1
+                return principal
+            del self._verified[token]
+            raise InvalidToken("Token expired")
+        self.misses += 1
+        claims = self._decode(token)
+        principal = Principal(user_id=str(claims["sub"]), email=claims.get("email"))
+        if self.max_entries > 0:
+            self._verified[token] = (principal, claims["exp"])
+            if len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+        return principal
+
+    def revoke(self, token: str):
+        """Refuses ``token`` from now on; raises InvalidToken if it is not a valid token to begin with."""
+        claims = self._decode(token)
+        now = time.time()
+        # Expired tokens are refused anyway; their revocations are forgotten
+        self._revoked = {t: exp for t, exp in self._revoked.items() if exp > now}
+        self._revoked[token] = claims["exp"]
+        self._verified.pop(token, None)
+
+    def _decode(self, token: str) -> dict:
+        # jose is imported by the first token that is not in the cache
+        from jose import JWTError, jwt
+
+        try:
+            return jwt.decode(
+                token, self.secret, algorithms=[self.algorithm], options={"require_exp": True, "require_sub": True},
+            )
+        except JWTError as e:
+            raise InvalidToken(str(e)) from None
+
+    def stats(self) -> dict:
+        return {"entries": len(self._verified), "revoked": len(self._revoked), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+def cache_key(template_version: str, **params) -> str:
+    # Canonical JSON so logically equal requests hash the same regardless of field order
+    payload = json.dumps({"v": template_version, **params}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class WorkbookCache:
+    """Content-addressed cache of generated workbook bytes.
+
+    The memory tier is an LRU bounded by total bytes. The optional disk tier
+    keeps one file per key under ``directory`` and survives restarts.
+
+    Volatile cells: a cached workbook keeps the "Generated At" time of the build
+    that produced it. Entries older than ``ttl`` seconds are treated as misses,
+    so that timestamp is never more than ``ttl`` seconds stale.
+    """
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else None
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._puts = 0
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.directory is not None
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.xlsx"
+
+    def _remember(self, key: str, data: bytes, created: float):
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old[0])
+        self._entries[key] = (data, created)
+        self.current_bytes += len(data)
+        while self.current_bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.current_bytes -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[bytes, float]]:
+        path = self._path(key)
+        try:
+            created = path.stat().st_mtime
+            if self._expired(created):
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_bytes(), created
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        if self.ttl is None:
+            return
+        for path in self.directory.glob("*.xlsx"):
+            try:
+                if self._expired(path.stat().st_mtime):
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            data, created = entry
+            if not self._expired(created):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            del self._entries[key]
+            self.current_bytes -= len(data)
+        if self.directory is not None:
+            found = await asyncio.to_thread(self._read_disk, key)
+            if found is not None:
+                data, created = found
+                self._remember(key, data, created)
+                self.hits += 1
+                self.disk_hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        self._remember(key, data, time.time())
+        if self.directory is not None:
+            await asyncio.to_thread(self._write_disk, key, data)
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "disk": str(self.directory) if self.directory else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,87 @@
+import time
+from typing import Awaitable, Callable, Optional, Tuple, Type
+
+import mongo
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency that is known to be down."""
+
+
+class CircuitBreaker:
+    """Fails fast while a dependency is unhealthy.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and calls
+    are rejected with ``CircuitOpen`` without touching the dependency. Once
+    ``reset_timeout`` seconds have passed a single probe call is let through
+    (half-open); its outcome closes the circuit again or restarts the wait.
+    Failures are ``failures`` exceptions, pymongo's ConnectionFailure by default.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 10.0,
+        failures: Optional[Tuple[Type[BaseException], ...]] = None,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._failures = failures
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.rejected = 0
+
+    @property
+    def failures(self) -> Tuple[Type[BaseException], ...]:
+        # Looked up when a call fails, so that creating a breaker does not import pymongo
+        return self._failures if self._failures is not None else (mongo.ConnectionFailure,)
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+        self._probe_in_flight = False
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, fn: Callable[..., Awaitable], *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpen("circuit open")
+        try:
+            result = await fn(*args, **kwargs)
+        except self.failures:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Not a health signal (bad query, cancellation); just free the probe slot
+            self._probe_in_flight = False
+            raise
+        self.record_success()
+        return result
@@ -0,0 +1,127 @@
+import os
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import FileResponse, Response
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """True if ``etag`` is listed in an If-None-Match / If-Range header value.
+
+    If-None-Match uses the weak comparison (a W/ prefix is ignored); If-Range
+    requires strong validators, so weak tags never match there.
+    """
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return weak
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parses a single ``bytes=`` range into an inclusive (start, end).
+
+    Returns None when the whole file should be sent instead: no header, a
+    malformed one, another unit, or several ranges (serving the full body is
+    a valid answer to a multi-range request). Raises ValueError when the range
+    cannot be satisfied, which is a 416.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep or not (first or last) or not all(p.isdigit() for p in (first, last) if p):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError(f"range starts past the end of a {size} byte file")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class ArtifactResponse(FileResponse):
+    """FileResponse for an immutable stored file, optionally limited to one byte range.
+
+    Full bodies go through FileResponse unchanged, which hands the path to the
+    server (``http.response.pathsend``) when it supports that. A range is read
+    from the file in 1 MiB chunks starting at its offset.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        stat_result: os.stat_result,
+        etag: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        **kwargs,
+    ):
+        headers = {"etag": etag, "accept-ranges": "bytes", **(headers or {})}
+        self.byte_range = byte_range
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            # Set before FileResponse fills in the full size
+            headers["content-length"] = str(end - start + 1)
+        super().__init__(
+            path, status_code=200 if byte_range is None else 206, headers=headers, stat_result=stat_result, **kwargs,
+        )
+
+    async def __call__(self, scope, receive, send):
+        if self.byte_range is None:
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        start, end = self.byte_range
+        remaining = end - start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def artifact_response(
+    request, path: os.PathLike, stat_result: os.stat_result, etag: str, media_type: str, filename: str,
+) -> Response:
+    """Answers a GET/HEAD for a stored file: 304, 416, 206 or 200."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"etag": etag})
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # A stale If-Range (or a date, which we do not track) means send the whole current file
+    if if_range is None or etag_matches(if_range, etag, weak=False):
+        try:
+            byte_range = parse_range(request.headers.get("range"), stat_result.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={"content-range": f"bytes */{stat_result.st_size}"})
+    return ArtifactResponse(
+        path, stat_result, etag, byte_range, media_type=media_type, filename=filename,
+    )
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+
+class ExecutorSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class BoundedExecutor:
+    """Runs blocking callables off the event loop with a bounded backlog.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more may
+    wait for a worker; anything beyond that is rejected immediately with
+    ``ExecutorSaturated`` so callers can shed load instead of piling up.
+    A slot is only released once the underlying job really finishes, so jobs
+    that outlive their timeout keep counting against the capacity.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, timeout: Optional[float] = None, kind: str = "process"):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.kind = kind
+        self._executor = None
+        self._pending = 0
+        self._slot_waiters = deque()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def running(self) -> int:
+        return min(self._pending, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn keeps workers free of the parent's Motor threads and sockets
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _release(self, _future=None):
+        self._pending -= 1
+        self._wake_next()
+
+    def _wake_next(self):
+        while self._slot_waiters:
+            waiter = self._slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def _wait_for_slot(self):
+        loop = asyncio.get_running_loop()
+        while self._pending >= self.capacity:
+            waiter = loop.create_future()
+            self._slot_waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Woken for a free slot but cancelled before taking it; the next waiter gets it instead
+                    self._wake_next()
+                raise
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, wait: bool = False):
+        # wait=True queues for a free slot instead of failing fast (used by batch work)
+        if wait:
+            await self._wait_for_slot()
+        elif self._pending >= self.capacity:
+            raise ExecutorSaturated(f"{self._pending} jobs pending (capacity {self.capacity})")
+        loop = asyncio.get_running_loop()
+        try:
+            cf = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for this and later jobs
+            self._executor = None
+            cf = self._get_executor().submit(fn, *args)
+        self._pending += 1
+        cf.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(cf)), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Drops the job if it has not started yet; a running job finishes in the background
+            cf.cancel()
+            raise
+        except BrokenProcessPool:
+            self._executor = None
+            raise
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
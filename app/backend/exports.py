@@ -0,0 +1,71 @@
+import json
+import math
+from datetime import date, datetime
+from typing import List, Sequence
+
+from workbook import HEADER_STYLE, SHEET_DATA_ROWS
+from xlsx_writer import XlsxStreamWriter
+
+# Documents per cursor batch; two batches (one being written, one being fetched) are held at a time
+EXPORT_BATCH_SIZE = 5_000
+# Excel rejects cells longer than this
+MAX_CELL_CHARS = 32_767
+
+
+def cell_value(value):
+    """Maps a BSON value to something the sheet writer can store."""
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else str(value)
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str, ensure_ascii=False)
+    elif not isinstance(value, str):
+        value = str(value)
+    return value[:MAX_CELL_CHARS]
+
+
+class CollectionExport:
+    """Writes documents as rows of a write-only workbook, one batch at a time.
+
+    Each batch returns the ZIP bytes produced so far, so the caller can send
+    them while the next batch is fetched. A new sheet ("title (2)", ...)
+    starts whenever one reaches Excel's row limit. Values are never treated
+    as formulas.
+    """
+
+    def __init__(self, title: str, columns: Sequence[str], level: int):
+        self.title = title
+        self.columns = tuple(columns)
+        self.xw = XlsxStreamWriter(level)
+        self.sheets = 0
+        self.rows = 0
+        self._sheet = None
+        self._room = 0
+
+    def _next_sheet(self):
+        self.sheets += 1
+        title = self.title if self.sheets == 1 else f"{self.title} ({self.sheets})"
+        self._sheet = self.xw.add_sheet(title, formulas=False)
+        self._sheet.append(self.columns, style=HEADER_STYLE)
+        self._room = SHEET_DATA_ROWS
+
+    def write(self, docs: List[dict]) -> bytes:
+        columns = self.columns
+        rows = [[cell_value(doc.get(c)) for c in columns] for doc in docs]
+        while rows or self._sheet is None:
+            if self._sheet is None or self._room == 0:
+                self._next_sheet()
+            batch, rows = rows[:self._room], rows[self._room:]
+            self._sheet.extend(batch)
+            self._room -= len(batch)
+            self.rows += len(batch)
+        return self.xw.drain()
+
+    def close(self) -> bytes:
+        if self._sheet is None:
+            self._next_sheet()
+        self.xw.close()
+        return self.xw.drain()
@@ -0,0 +1,451 @@
+import graphlib
+import re
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+Cell = Tuple[int, int]  # (row, column), 1-based
+
+FUNCTIONS = ("SUM", "AVERAGE", "MIN", "MAX", "COUNT")
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<func>[A-Za-z][A-Za-z0-9.]*)\s*\(
+      | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?\$?[A-Za-z]{1,3}\$?[0-9]+(?::\$?[A-Za-z]{1,3}\$?[0-9]+)?)
+      | (?P<number>(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)
+      | (?P<op>[-+*/^(),])
+    )""",
+    re.VERBOSE,
+)
+_CELL = re.compile(r"(\$?)([A-Za-z]{1,3})(\$?)([0-9]+)")
+
+
+class FormulaError(ValueError):
+    """A formula the engine cannot parse or does not support."""
+
+
+class Ref(NamedTuple):
+    sheet: Optional[str]  # None: the sheet holding the formula
+    row: int
+    col: int
+    row_abs: bool = False
+    col_abs: bool = False
+
+
+class Range(NamedTuple):
+    sheet: Optional[str]
+    top: Ref
+    bottom: Ref
+
+
+# -------- Parsing --------
+
+def column_number(letters: str) -> int:
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _parse_cell(text: str, sheet: Optional[str]) -> Ref:
+    m = _CELL.fullmatch(text)
+    row = int(m.group(4))
+    if row < 1:
+        raise FormulaError(f"Invalid cell reference {text}")
+    return Ref(sheet, row, column_number(m.group(2)), bool(m.group(3)), bool(m.group(1)))
+
+
+def _parse_ref(text: str):
+    sheet = None
+    if "!" in text:
+        sheet, text = text.rsplit("!", 1)
+        if sheet.startswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
+    first, _, last = text.partition(":")
+    start = _parse_cell(first, sheet)
+    if not last:
+        return start
+    end = _parse_cell(last, sheet)
+    # Normalise so top is the upper-left corner whichever way the range was written
+    (r1, ra1), (r2, ra2) = sorted([(start.row, start.row_abs), (end.row, end.row_abs)])
+    (c1, ca1), (c2, ca2) = sorted([(start.col, start.col_abs), (end.col, end.col_abs)])
+    return Range(sheet, Ref(sheet, r1, c1, ra1, ca1), Ref(sheet, r2, c2, ra2, ca2))
+
+
+def tokenize(formula: str) -> List[Tuple[str, str]]:
+    tokens, pos, text = [], 0, formula.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None or m.end() == pos:
+            raise FormulaError(f"Unexpected {text[pos:]!r} in formula")
+        tokens.append((m.lastgroup, m.group(m.lastgroup)))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    # expr := term (+|- term)* ; term := power (*|/ power)* ; power := unary (^ unary)* ;
+    # unary := (-|+) unary | primary. As in Excel, negation binds tighter than ^.
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, op: str):
+        if self.take() != ("op", op):
+            raise FormulaError(f"Expected {op!r}")
+
+    def binary(self, operand, ops):
+        node = operand()
+        while self.peek()[0] == "op" and self.peek()[1] in ops:
+            op = self.take()[1]
+            node = ("op", op, node, operand())
+        return node
+
+    def expr(self):
+        return self.binary(self.term, "+-")
+
+    def term(self):
+        return self.binary(self.power, "*/")
+
+    def power(self):
+        return self.binary(self.unary, "^")
+
+    def unary(self):
+        kind, value = self.peek()
+        if kind == "op" and value in "+-":
+            self.take()
+            operand = self.unary()
+            return ("neg", operand) if value == "-" else operand
+        return self.primary()
+
+    def primary(self, allow_range: bool = False):
+        kind, value = self.take()
+        if kind == "number":
+            return float(value)
+        if kind == "ref":
+            node = _parse_ref(value)
+            if isinstance(node, Range) and not allow_range:
+                raise FormulaError(f"Range {value} is only supported as a function argument")
+            return node
+        if kind == "func":
+            name = value.upper()
+            if name not in FUNCTIONS:
+                raise FormulaError(f"Unsupported function {name}")
+            args = []
+            if self.peek() != ("op", ")"):
+                while True:
+                    args.append(self.argument())
+                    if self.peek() != ("op", ","):
+                        break
+                    self.take()
+            self.expect(")")
+            return ("call", name, tuple(args))
+        if (kind, value) == ("op", "("):
+            node = self.expr()
+            self.expect(")")
+            return node
+        raise FormulaError(f"Unexpected {value!r}" if value else "Formula ends too early")
+
+    def argument(self):
+        # A bare range is an argument; anything else is an ordinary expression
+        if self.peek()[0] == "ref" and ":" in self.peek()[1]:
+            save = self.pos
+            node = self.primary(allow_range=True)
+            if self.peek() in (("op", ","), ("op", ")")):
+                return node
+            self.pos = save
+        return self.expr()
+
+
+def parse(formula: str):
+    """Parses a formula (with or without the leading "=") into a small tuple AST."""
+    text = formula[1:] if formula.startswith("=") else formula
+    parser = _Parser(tokenize(text))
+    node = parser.expr()
+    if parser.pos != len(parser.tokens):
+        raise FormulaError(f"Unexpected {parser.peek()[1]!r} in formula")
+    return node
+
+
+# -------- Relative form and grouping --------
+
+def _relative(node, sheet: str, row: int, col: int):
+    """The AST with references made relative to the host cell (R1C1 style) and sheets filled in.
+
+    Cells whose formulas have the same relative form ("=B2-C2" in D2, "=B3-C3"
+    in D3) are evaluated together as one vector operation.
+    """
+    if isinstance(node, Ref):
+        return Ref(
+            node.sheet or sheet,
+            node.row if node.row_abs else node.row - row,
+            node.col if node.col_abs else node.col - col,
+            node.row_abs,
+            node.col_abs,
+        )
+    if isinstance(node, Range):
+        return Range(node.sheet or sheet, _relative(node.top, sheet, row, col), _relative(node.bottom, sheet, row, col))
+    if isinstance(node, tuple) and node[0] == "neg":
+        return ("neg", _relative(node[1], sheet, row, col))
+    if isinstance(node, tuple) and node[0] == "op":
+        return ("op", node[1], _relative(node[2], sheet, row, col), _relative(node[3], sheet, row, col))
+    if isinstance(node, tuple) and node[0] == "call":
+        return ("call", node[1], tuple(_relative(arg, sheet, row, col) for arg in node[2]))
+    return node
+
+
+class _Group(NamedTuple):
+    sheet: str
+    col: int
+    first: int  # first and last host row of the run
+    last: int
+    node: object  # relative AST
+
+    def cells(self):
+        return (self.sheet, self.first, self.last, self.col, self.col)
+
+    def split(self):
+        return [self._replace(first=r, last=r) for r in range(self.first, self.last + 1)]
+
+
+def _span(ref: Ref, first: int, last: int, col: int) -> Tuple[int, int, int]:
+    # Rows and column a relative reference touches over host rows first..last
+    if ref.row_abs:
+        rows = (ref.row, ref.row)
+    else:
+        rows = (first + ref.row, last + ref.row)
+    return rows[0], rows[1], ref.col if ref.col_abs else col + ref.col
+
+
+def _areas(node, group: _Group):
+    """Yields (sheet, top, bottom, left, right) for every cell area the group reads."""
+    if isinstance(node, Ref):
+        top, bottom, c = _span(node, group.first, group.last, group.col)
+        yield node.sheet, top, bottom, c, c
+    elif isinstance(node, Range):
+        top, _, left = _span(node.top, group.first, group.last, group.col)
+        _, bottom, right = _span(node.bottom, group.first, group.last, group.col)
+        yield node.sheet, top, bottom, left, right
+    elif isinstance(node, tuple) and node[0] in ("neg", "op", "call"):
+        children = node[1:] if node[0] == "neg" else node[2:] if node[0] == "op" else node[2]
+        for child in children:
+            yield from _areas(child, group)
+
+
+def _overlaps(a, b) -> bool:
+    return a[0] == b[0] and a[1] <= b[2] and b[1] <= a[2] and a[3] <= b[4] and b[3] <= a[4]
+
+
+# -------- Evaluation --------
+# numpy is imported by the first evaluation; parsing and dependency ordering do not need it
+
+class _Grid:
+    # values: numbers, NaN for text and errors; numeric: False for empty and text cells
+    def __init__(self, rows: int, cols: int):
+        import numpy as np
+
+        self.values = np.zeros((rows + 1, cols + 1))
+        self.numeric = np.zeros((rows + 1, cols + 1), dtype=bool)
+
+
+def _gather(grid: Optional[_Grid], rows, cols):
+    import numpy as np
+
+    if grid is None:
+        # Reference to a sheet that was not supplied: #REF!
+        shape = np.broadcast(rows, cols).shape
+        return np.full(shape, np.nan), np.ones(shape, dtype=bool)
+    return grid.values[rows, cols], grid.numeric[rows, cols]
+
+
+def _indexes(ref: Ref, hosts: "np.ndarray", col: int):
+    rows = ref.row if ref.row_abs else hosts + ref.row
+    return rows, ref.col if ref.col_abs else col + ref.col
+
+
+def _arguments(args, hosts, col, grids):
+    # Each argument becomes (values, numeric) of shape (hosts, items)
+    import numpy as np
+
+    n = len(hosts)
+    for arg in args:
+        if isinstance(arg, (Ref, Range)):
+            top, bottom = (arg, arg) if isinstance(arg, Ref) else (arg.top, arg.bottom)
+            top_rows, left = _indexes(top, hosts, col)
+            bottom_rows, right = _indexes(bottom, hosts, col)
+            top_rows, bottom_rows = np.broadcast_to(top_rows, (n,)), np.broadcast_to(bottom_rows, (n,))
+            # Mixed anchors ("$B$2:B5") give each host a different height; pad to the tallest and mask
+            height = max(1, int((bottom_rows - top_rows).max()) + 1)
+            rows = top_rows[:, None] + np.arange(height)
+            inside = (rows <= bottom_rows[:, None])[:, :, None]
+            rows = np.where(inside[:, :, 0], rows, top_rows[:, None])
+            cols = np.arange(left, right + 1)
+            values, numeric = _gather(grids.get(arg.sheet), rows[:, :, None], cols[None, None, :])
+            yield np.where(inside, values, 0.0).reshape(n, -1), (numeric & inside).reshape(n, -1)
+        else:
+            values = np.broadcast_to(_eval(arg, hosts, col, grids), (n,)).reshape(n, 1)
+            yield values, np.ones((n, 1), dtype=bool)
+
+
+def _call(name: str, args, hosts, col, grids):
+    import numpy as np
+
+    parts = list(_arguments(args, hosts, col, grids))
+    if not parts:
+        return np.zeros(len(hosts))
+    values = np.concatenate([v for v, _ in parts], axis=1)
+    numeric = np.concatenate([m for _, m in parts], axis=1)
+    count = numeric.sum(axis=1)
+    if name == "COUNT":
+        return count.astype(float)
+    total = np.where(numeric, values, 0.0).sum(axis=1)
+    if name == "SUM":
+        return total
+    if name == "AVERAGE":
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    # MIN and MAX of no numbers are 0, as in Excel
+    if name == "MIN":
+        return np.where(count > 0, np.where(numeric, values, np.inf).min(axis=1), 0.0)
+    return np.where(count > 0, np.where(numeric, values, -np.inf).max(axis=1), 0.0)
+
+
+_OPS = {"+": "add", "-": "subtract", "*": "multiply", "/": "divide", "^": "power"}
+
+
+def _eval(node, hosts: "np.ndarray", col: int, grids: Dict[str, _Grid]):
+    if isinstance(node, float):
+        return node
+    if isinstance(node, Ref):
+        # Empty cells read as 0; text is NaN, i.e. #VALUE!
+        return _gather(grids.get(node.sheet), *_indexes(node, hosts, col))[0]
+    if node[0] == "neg":
+        return -_eval(node[1], hosts, col, grids)
+    if node[0] == "op":
+        import numpy as np
+
+        return getattr(np, _OPS[node[1]])(_eval(node[2], hosts, col, grids), _eval(node[3], hosts, col, grids))
+    return _call(node[1], node[2], hosts, col, grids)
+
+
+def _order(groups: List[_Group]) -> Tuple[List[_Group], List[_Group]]:
+    """Topologically sorts groups; returns (evaluation order, circular cells).
+
+    A run that reads its own cells (running totals) or sits in a cycle with
+    other runs is split into single cells; cells still in a cycle after that
+    are circular references.
+    """
+    circular = []
+    while True:
+        ready = []
+        for group in groups:
+            if group.first != group.last and any(_overlaps(area, group.cells()) for area in _areas(group.node, group)):
+                ready.extend(group.split())
+            else:
+                ready.append(group)
+        groups = []
+        for group in ready:
+            if any(_overlaps(area, group.cells()) for area in _areas(group.node, group)):
+                circular.append(group)
+            else:
+                groups.append(group)
+        by_sheet: Dict[str, List[int]] = {}
+        for i, group in enumerate(groups):
+            by_sheet.setdefault(group.sheet, []).append(i)
+        graph = {}
+        for i, group in enumerate(groups):
+            deps = set()
+            for area in _areas(group.node, group):
+                deps.update(j for j in by_sheet.get(area[0], ()) if j != i and _overlaps(area, groups[j].cells()))
+            graph[i] = deps
+        try:
+            return [groups[i] for i in graphlib.TopologicalSorter(graph).static_order()], circular
+        except graphlib.CycleError as e:
+            cycle = set(e.args[1])
+            if all(groups[i].first == groups[i].last for i in cycle):
+                circular.extend(groups[i] for i in cycle)
+                groups = [g for i, g in enumerate(groups) if i not in cycle]
+            else:
+                groups = [part for i, g in enumerate(groups) for part in (g.split() if i in cycle else [g])]
+
+
+def evaluate(sheets: Mapping[str, Mapping[Cell, object]]) -> Dict[str, Dict[Cell, float]]:
+    """Computes every formula cell of a workbook.
+
+    ``sheets`` maps sheet titles to {(row, col): value}; strings starting with
+    "=" are formulas. Returns {title: {(row, col): result}} for the formulas
+    that evaluate to a finite number. Unsupported or failing formulas (and
+    the cells depending on them) are left out, so writers keep them without a
+    cached value. Sheets that no formula reads can be omitted.
+    """
+    import numpy as np
+
+    groups: List[_Group] = []
+    extents: Dict[str, List[int]] = {title: [1, 1] for title in sheets}
+    for title, cells in sheets.items():
+        formulas = sorted(
+            ((col, row), value) for (row, col), value in cells.items() if isinstance(value, str) and value.startswith("=")
+        )
+        for (col, row), formula in formulas:
+            try:
+                node = _relative(parse(formula), title, row, col)
+            except FormulaError:
+                # Stays NaN in the grid below, so it and its dependents get no cached value
+                continue
+            last = groups[-1] if groups else None
+            if last is not None and (last.sheet, last.col, last.last + 1, last.node) == (title, col, row, node):
+                groups[-1] = last._replace(last=row)
+            else:
+                groups.append(_Group(title, col, row, row, node))
+        for row, col in cells:
+            extent = extents[title]
+            extent[0], extent[1] = max(extent[0], row), max(extent[1], col)
+    for group in groups:
+        for sheet, _, bottom, _, right in _areas(group.node, group):
+            if sheet in extents:
+                extents[sheet][0] = max(extents[sheet][0], bottom)
+                extents[sheet][1] = max(extents[sheet][1], right)
+
+    grids = {title: _Grid(*extents[title]) for title in sheets}
+    for title, cells in sheets.items():
+        grid = grids[title]
+        for (row, col), value in cells.items():
+            if isinstance(value, str) and value.startswith("="):
+                # Not computed yet, or an error: NaN propagates through everything that reads it
+                grid.values[row, col] = np.nan
+                grid.numeric[row, col] = True
+            elif isinstance(value, (int, float)):
+                grid.values[row, col] = value
+                grid.numeric[row, col] = True
+            elif value is not None:
+                grid.values[row, col] = np.nan
+
+    order, _ = _order(groups)
+    with np.errstate(all="ignore"):
+        for group in order:
+            hosts = np.arange(group.first, group.last + 1)
+            result = np.broadcast_to(np.asarray(_eval(group.node, hosts, group.col, grids), dtype=float), hosts.shape)
+            grids[group.sheet].values[group.first:group.last + 1, group.col] = np.where(np.isfinite(result), result, np.nan)
+
+    results: Dict[str, Dict[Cell, float]] = {}
+    for group in order:
+        values = grids[group.sheet].values[group.first:group.last + 1, group.col]
+        out = results.setdefault(group.sheet, {})
+        for row, value in zip(range(group.first, group.last + 1), values.tolist()):
+            if value == value:
+                out[(row, group.col)] = int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+    return results
+
+
+def evaluate_rows(sheets: Mapping[str, Sequence[Sequence]]) -> Dict[str, Dict[Cell, float]]:
+    """``evaluate`` for sheets given as lists of rows, starting at A1."""
+    return evaluate({
+        title: {(r, c): value for r, row in enumerate(rows, start=1) for c, value in enumerate(row, start=1) if value is not None}
+        for title, rows in sheets.items()
+    })
@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when the pending job backlog is at capacity."""
+
+
+class JobQueue:
+    """Priority queue of background jobs drained by a fixed set of worker tasks.
+
+    Lower priority values run first; jobs with equal priority run in
+    submission order. ``handler`` is awaited once per job by one of
+    ``concurrency`` workers, so at most that many jobs run at a time.
+    """
+
+    def __init__(self, handler: Callable[..., Awaitable], concurrency: int, max_pending: int):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count()
+        self.active: Dict[str, object] = {}
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> int:
+        return len(self.active) - self.pending
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> list:
+        """Cancels the workers; returns the jobs that never started, which are no longer tracked.
+
+        Running jobs see the cancellation and clean up after themselves; the
+        ones still waiting never reach ``handler``, so the caller settles them.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        waiting = list(self.active.values())
+        self.active.clear()
+        self._queue = None
+        return waiting
+
+    def submit(self, job_id: str, job, priority: int = 0):
+        self.start()
+        if self.pending >= self.max_pending:
+            raise JobQueueFull(f"{self.pending} jobs waiting")
+        self.active[job_id] = job
+        self._queue.put_nowait((priority, next(self._seq), job_id))
+
+    def get(self, job_id: str):
+        return self.active.get(job_id)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.active.get(job_id)
+            try:
+                if job is not None:
+                    await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Background job %s crashed", job_id)
+            finally:
+                self.active.pop(job_id, None)
+                self._queue.task_done()
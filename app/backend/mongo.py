@@ -0,0 +1,145 @@
+import asyncio
+import importlib
+import threading
+from functools import lru_cache
+from typing import Callable, Sequence
+
+from metrics import Counter, Histogram
+
+# Index directions, with pymongo's values
+ASCENDING = 1
+DESCENDING = -1
+
+# pymongo and bson names available as attributes of this module, imported on first access so that
+# loading the modules that use them (mongo.ConnectionFailure in an except clause, mongo.UpdateOne
+# when writing) does not import the driver; it only happens once Mongo is actually used
+_DRIVER_NAMES = {
+    "BulkWriteError": "pymongo.errors",
+    "ConnectionFailure": "pymongo.errors",
+    "DuplicateKeyError": "pymongo.errors",
+    "PyMongoError": "pymongo.errors",
+    "ServerSelectionTimeoutError": "pymongo.errors",
+    "ReplaceOne": "pymongo",
+    "UpdateOne": "pymongo",
+    "json_util": "bson.json_util",
+}
+
+
+def __getattr__(name: str):
+    module = _DRIVER_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    imported = importlib.import_module(module)
+    value = imported if module.endswith(f".{name}") else getattr(imported, name)
+    globals()[name] = value
+    return value
+
+
+@lru_cache(maxsize=None)
+def _command_listener_type():
+    from pymongo import monitoring
+
+    class CommandListener(monitoring.CommandListener):
+        def __init__(self, metrics: "MongoCommandMetrics"):
+            self.metrics = metrics
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            self.metrics.observe(event, failed=False)
+
+        def failed(self, event):
+            self.metrics.observe(event, failed=True)
+
+    return CommandListener
+
+
+class MongoCommandMetrics:
+    """Observes the duration of every command the driver sends, by command name.
+
+    ``listener()`` returns the pymongo CommandListener to register; it is
+    only called when the client is created, since building it imports pymongo.
+    """
+
+    def __init__(self, histogram: Histogram, failures: Counter):
+        self.histogram = histogram
+        self.failures = failures
+
+    def observe(self, event, failed: bool):
+        self.histogram.observe(event.duration_micros / 1e6, event.command_name)
+        if failed:
+            self.failures.inc(event.command_name)
+
+    def listener(self):
+        return _command_listener_type()(self)
+
+
+class LazyMotorClient:
+    """An AsyncIOMotorClient that is created, and motor imported, on first use.
+
+    Constructing the client starts the driver's monitor threads, so doing it
+    at import time slows every cold start, even for workers that only answer
+    health checks at first. ``client[name]`` returns a LazyDatabase that can
+    be used wherever the Motor database would be. ``listeners`` build the
+    driver's event listeners when the client is created.
+    """
+
+    def __init__(self, url: str, listeners: Sequence[Callable] = (), **kwargs):
+        self.url = url
+        self.listeners = tuple(listeners)
+        self.kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._client is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from motor.motor_asyncio import AsyncIOMotorClient
+
+                    listeners = [build() for build in self.listeners]
+                    self._client = AsyncIOMotorClient(self.url, event_listeners=listeners, **self.kwargs)
+        return self._client
+
+    async def connect(self):
+        # Creates the client in a thread, keeping the import and driver setup off the event loop
+        if self._client is None:
+            await asyncio.to_thread(lambda: self.client)
+
+    def __getitem__(self, name: str) -> "LazyDatabase":
+        return LazyDatabase(self, name)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+class LazyDatabase:
+    """Stands in for a Motor database; attribute and item access go to the real one, created on first use."""
+
+    def __init__(self, client: LazyMotorClient, name: str):
+        self._lazy_client = client
+        self._name = name
+        self._database = None
+
+    def get(self):
+        if self._database is None:
+            self._database = self._lazy_client.client[self._name]
+        return self._database
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __getitem__(self, name: str):
+        return self.get()[name]
+
+    def __repr__(self) -> str:
+        return f"LazyDatabase({self._name!r}, started={self._lazy_client.started})"
@@ -0,0 +1,242 @@
+import asyncio
+import itertools
+import logging
+import os
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import mongo
+from circuit import CircuitBreaker, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindBuffer:
+    """Queues documents for insertion so callers never wait on Mongo.
+
+    A background task drains the queue with ``insert_many`` batches through the
+    circuit breaker, writing once ``batch_size`` documents are waiting or
+    ``flush_interval`` seconds after the first one arrived, whichever comes
+    first. While the database is down the documents stay queued and the task
+    retries every ``retry_interval`` seconds.
+
+    Memory holds at most ``max_items`` documents. When the queue is full and
+    the database is healthy, ``put`` waits up to ``backpressure_timeout`` for
+    the writer to make room. Past that, documents are appended to
+    ``spill_path`` (MongoDB extended JSON lines, so dates survive) when one is
+    configured, otherwise the oldest are dropped and counted.
+
+    With ``upsert_key`` set, each document replaces the stored one with the
+    same value in that field (inserting it if there is none) instead of being
+    inserted, so a buffer can also carry state updates.
+
+    ``after_write``, if given, is awaited with every batch once it is stored,
+    minus any documents the write rejected (duplicates count as stored).
+    """
+
+    def __init__(
+        self,
+        collection: Callable,
+        breaker: CircuitBreaker,
+        max_items: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.1,
+        retry_interval: float = 5.0,
+        backpressure_timeout: float = 1.0,
+        spill_path: Optional[str] = None,
+        after_write: Optional[Callable[[List[dict]], Awaitable]] = None,
+        upsert_key: Optional[str] = None,
+    ):
+        self.collection = collection
+        self.breaker = breaker
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.backpressure_timeout = backpressure_timeout
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.after_write = after_write
+        self.upsert_key = upsert_key
+        self._docs: deque = deque()
+        self._writing: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._batch_ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self.batches = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, docs: List[dict]):
+        for doc in docs:
+            if len(self._docs) < self.max_items:
+                self._docs.append(doc)
+            elif self.spill_path is not None:
+                self._spill([doc])
+            else:
+                self._docs.popleft()
+                self._docs.append(doc)
+                self.dropped += 1
+        if len(self._docs) >= self.batch_size:
+            self._batch_ready.set()
+        self._wakeup.set()
+        self.start()
+
+    async def put(self, docs: List[dict]):
+        # Backpressure only makes sense while the writer is draining; during an outage add() spills or drops
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.backpressure_timeout
+        while len(self._docs) + len(docs) > self.max_items and self.breaker.state == CircuitBreaker.CLOSED:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._room.clear()
+            self._batch_ready.set()
+            self.start()
+            try:
+                await asyncio.wait_for(self._room.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        self.add(docs)
+
+    def find(self, key: str, value) -> Optional[dict]:
+        # Lets a record be read back before its batch reaches Mongo; spilled documents are not searched
+        for doc in itertools.chain(reversed(self._docs), reversed(self._writing)):
+            if doc.get(key) == value:
+                return doc
+        return None
+
+    def _spill(self, docs: Iterable[dict]):
+        with self.spill_path.open("a", encoding="utf-8") as fh:
+            for doc in docs:
+                fh.write(mongo.json_util.dumps(doc) + "\n")
+                self.spilled += 1
+
+    def _load_spill(self):
+        # Move as many spilled documents into memory as fit; keep the rest on disk
+        if self.spill_path is None or not self.spill_path.exists():
+            return
+        room = self.max_items - len(self._docs)
+        with self.spill_path.open(encoding="utf-8") as fh:
+            lines = fh.readlines()
+        for line in lines[:room]:
+            self._docs.append(mongo.json_util.loads(line))
+        rest = lines[room:]
+        if rest:
+            tmp = self.spill_path.with_suffix(".tmp")
+            tmp.write_text("".join(rest), encoding="utf-8")
+            os.replace(tmp, self.spill_path)
+        else:
+            self.spill_path.unlink()
+
+    def _trim(self):
+        # A failed batch goes back in front of documents added meanwhile, which can overshoot max_items
+        overflow = len(self._docs) - self.max_items
+        if overflow <= 0:
+            return
+        if self.spill_path is not None:
+            self._spill(reversed([self._docs.pop() for _ in range(overflow)]))
+        else:
+            for _ in range(overflow):
+                self._docs.popleft()
+            self.dropped += overflow
+
+    async def flush(self) -> int:
+        written = 0
+        async with self._lock:
+            while True:
+                if not self._docs:
+                    await asyncio.to_thread(self._load_spill)
+                if not self._docs:
+                    break
+                batch = self._writing = [self._docs.popleft() for _ in range(min(self.batch_size, len(self._docs)))]
+                stored = batch
+                try:
+                    await self._write(batch)
+                except (CircuitOpen, mongo.ConnectionFailure):
+                    self._docs.extendleft(reversed(batch))
+                    await asyncio.to_thread(self._trim)
+                    break
+                except asyncio.CancelledError:
+                    self._docs.extendleft(reversed(batch))
+                    raise
+                except mongo.BulkWriteError as e:
+                    # Duplicates mean an earlier attempt landed after all; anything else is lost
+                    others = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+                    if others:
+                        logger.error("Dropped %d buffered documents: %s", len(others), others[0].get("errmsg"))
+                        # Error indexes follow the batch order, for inserts and upserts alike
+                        lost = {err["index"] for err in others}
+                        stored = [doc for i, doc in enumerate(batch) if i not in lost]
+                finally:
+                    self._writing = []
+                written += len(stored)
+                self.batches += 1
+                self._room.set()
+                if self.after_write is not None and stored:
+                    await self.after_write(stored)
+        self.flushed += written
+        return written
+
+    async def _write(self, batch: List[dict]):
+        if self.upsert_key is None:
+            await self.breaker.call(self.collection().insert_many, batch, ordered=False)
+        else:
+            key = self.upsert_key
+            ops = [mongo.ReplaceOne({key: doc[key]}, doc, upsert=True) for doc in batch]
+            await self.breaker.call(self.collection().bulk_write, ops, ordered=False)
+
+    def _pending(self) -> bool:
+        return bool(self._docs) or (self.spill_path is not None and self.spill_path.exists())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if len(self._docs) < self.batch_size and self.flush_interval > 0:
+                # Give other requests a moment to add to this batch
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+            if self._pending():
+                # Database unavailable; retry later rather than spinning
+                await asyncio.sleep(self.retry_interval)
+                self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._docs and self.spill_path is not None:
+            self._spill(list(self._docs))
+            self._docs.clear()
+        elif self._docs:
+            logger.warning("Discarding %d unflushed documents at shutdown", len(self._docs))
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._docs),
+            "spilled": self.spilled,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class QuotaExceeded(Exception):
+    """Raised when a caller is over its rate or concurrency quota."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``burst``.
+
+    The bucket never goes into debt: a request costing more than the burst
+    can never be taken and gets an infinite wait, so callers must refuse it
+    (or split it) rather than retry.
+    """
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None):
+        if rate > 0 and burst < 1:
+            raise ValueError(f"A token bucket needs a burst of at least 1, got {burst:g}")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, cost: float = 1.0, now: Optional[float] = None) -> float:
+        """Takes ``cost`` tokens and returns 0, or returns the seconds to wait (inf if never) and takes nothing."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if cost > self.burst:
+            return float("inf")
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def full(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class _Quota:
+    __slots__ = ("bucket", "active")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.active = 0
+
+
+class Lease:
+    """One concurrency slot, released once: call ``release()`` or use the lease as a context manager."""
+
+    __slots__ = ("_quotas", "_key", "_released")
+
+    def __init__(self, quotas: "Quotas", key: str):
+        self._quotas = quotas
+        self._key = key
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._quotas._release(self._key)
+
+    def __enter__(self) -> "Lease":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class Quotas:
+    """Per-caller rate (token bucket) and concurrency limits.
+
+    Callers are identified by an opaque key (a user id, or a client address
+    for anonymous requests); a rate or concurrency of 0 disables that limit.
+    State is kept for at most ``max_keys`` callers: the least recently seen
+    idle ones with a full bucket are forgotten first, which loses nothing
+    since a new caller starts the same way.
+    """
+
+    def __init__(self, rate: float, burst: float, concurrency: int, max_keys: int = 10_000):
+        if rate > 0 and burst < 1:
+            raise ValueError(f"A rate limit needs a burst of at least 1, got {burst:g}")
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_keys = max_keys
+        self._quotas: "OrderedDict[str, _Quota]" = OrderedDict()
+        self.rejected = {"rate": 0, "concurrency": 0}
+
+    def _quota(self, key: str) -> _Quota:
+        quota = self._quotas.get(key)
+        if quota is None:
+            self._evict(len(self._quotas) + 1 - self.max_keys)
+            quota = self._quotas[key] = _Quota(TokenBucket(self.rate, self.burst))
+        else:
+            self._quotas.move_to_end(key)
+        return quota
+
+    def _take(self, quota: _Quota, cost: float):
+        if self.rate > 0:
+            if cost > self.burst:
+                # Would never fit in the bucket; retrying cannot help
+                self.rejected["rate"] += 1
+                raise QuotaExceeded(f"Costs {cost:g}, more than the burst of {self.burst:g}", float("inf"))
+            wait = quota.bucket.take(cost)
+            if wait > 0:
+                self.rejected["rate"] += 1
+                raise QuotaExceeded("Rate limit exceeded", wait)
+
+    def charge(self, key: str, cost: float = 1.0):
+        """Charges ``cost`` against the caller's rate only, or raises QuotaExceeded."""
+        self._take(self._quota(key), cost)
+
+    def acquire(self, key: str, cost: float = 1.0) -> Lease:
+        """Charges ``cost`` against the caller's rate and takes a concurrency slot, or raises QuotaExceeded."""
+        quota = self._quota(key)
+        if self.concurrency > 0 and quota.active >= self.concurrency:
+            self.rejected["concurrency"] += 1
+            raise QuotaExceeded(f"At most {self.concurrency} concurrent generations per user", 1.0)
+        self._take(quota, cost)
+        quota.active += 1
+        return Lease(self, key)
+
+    def _release(self, key: str):
+        quota = self._quotas.get(key)
+        if quota is not None:
+            quota.active -= 1
+
+    def _evict(self, excess: int):
+        if excess <= 0:
+            return
+        now, idle = time.monotonic(), []
+        for key, quota in self._quotas.items():
+            if quota.active == 0 and quota.bucket.full(now):
+                idle.append(key)
+                if len(idle) == excess:
+                    break
+        for key in idle:
+            del self._quotas[key]
+
+    def stats(self) -> dict:
+        return {
+            "callers": len(self._quotas),
+            "active": sum(q.active for q in self._quotas.values()),
+            **{f"rejected_{k}": v for k, v in self.rejected.items()},
+        }
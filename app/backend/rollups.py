@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import mongo
+from circuit import CircuitBreaker, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+
+def minute_of(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+
+def as_utc(ts: datetime) -> datetime:
+    # Motor returns naive UTC datetimes unless the client is tz_aware
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def window_start(minutes: int, now: datetime) -> datetime:
+    """First minute bucket of a window of ``minutes`` that ends with the current, partial minute."""
+    return minute_of(now) - timedelta(minutes=minutes - 1)
+
+
+class Rollups:
+    """Pending ``$inc`` deltas for rollup documents, written with ordered bulk upserts.
+
+    Subclasses fold stored records into deltas in ``add`` and write them in
+    ``flush``. Deltas that could not be written stay pending and go out with
+    the next batch, or within ``flush_interval`` seconds once ``start`` has
+    been called, so a quiet period does not leave them unwritten.
+    """
+
+    label = "rollup"
+
+    def __init__(self, breaker: CircuitBreaker, flush_interval: float = 5.0):
+        self.breaker = breaker
+        self.flush_interval = flush_interval
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        raise NotImplementedError
+
+    def add(self, docs: List[dict]):
+        raise NotImplementedError
+
+    async def flush(self):
+        raise NotImplementedError
+
+    async def apply(self, docs: List[dict]):
+        self.add(docs)
+        await self.flush()
+
+    async def _write(self, collection: Callable, ops: list) -> int:
+        # Returns how many of ops were applied; they apply in order, so the rest are the ones to send again
+        try:
+            await self.breaker.call(collection().bulk_write, ops, ordered=True)
+        except (CircuitOpen, mongo.ConnectionFailure):
+            return 0
+        except mongo.BulkWriteError as e:
+            # Usually two upserts racing on one new key. The ops before it were applied and must not be
+            # counted twice; the failed op and the ones after it are retried.
+            details = e.details
+            return details.get("nInserted", 0) + details.get("nUpserted", 0) + details.get("nModified", 0)
+        return len(ops)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.pending:
+                try:
+                    # Shielded so close() never interrupts a write whose deltas are already taken off pending
+                    await asyncio.shield(self.flush())
+                except Exception:
+                    logger.exception("Periodic %s flush failed", self.label)
+
+    def start(self):
+        if self._task is None and self.flush_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self.pending:
+            logger.warning("Discarding %d unwritten %s updates at shutdown", self.pending, self.label)
+
+
+class StatusRollups(Rollups):
+    """Per-client, per-minute status check counts and last-seen times, kept up to date as checks are stored.
+
+    ``apply`` folds a stored batch into pending deltas and writes them with
+    one ordered bulk_write of upserts per collection: ``$inc`` on
+    ``{client_name, minute}`` buckets and ``$max``/``$inc`` on one document
+    per client. Queries then read a handful of small documents instead of
+    scanning raw checks.
+    """
+
+    label = "status rollup"
+
+    def __init__(self, buckets: Callable, clients: Callable, breaker: CircuitBreaker, flush_interval: float = 5.0):
+        super().__init__(breaker, flush_interval)
+        self.buckets = buckets
+        self.clients = clients
+        self._counts: Dict[Tuple[str, datetime], int] = {}
+        self._seen: Dict[str, List] = {}  # client_name -> [last_seen, count]
+
+    @property
+    def pending(self) -> int:
+        return len(self._counts) + len(self._seen)
+
+    def add(self, docs: List[dict]):
+        counts, seen = self._counts, self._seen
+        for doc in docs:
+            name, ts = doc["client_name"], as_utc(doc["ts"])
+            key = (name, minute_of(ts))
+            counts[key] = counts.get(key, 0) + 1
+            entry = seen.get(name)
+            if entry is None:
+                seen[name] = [ts, 1]
+            else:
+                entry[0] = max(entry[0], ts)
+                entry[1] += 1
+
+    async def flush(self):
+        async with self._lock:
+            counts, self._counts = self._counts, {}
+            seen, self._seen = self._seen, {}
+            if counts:
+                keys = list(counts)
+                applied = await self._write(self.buckets, [
+                    mongo.UpdateOne(
+                        {"client_name": name, "minute": minute}, {"$inc": {"count": counts[(name, minute)]}}, upsert=True,
+                    )
+                    for name, minute in keys
+                ])
+                for key in keys[applied:]:
+                    self._counts[key] = self._counts.get(key, 0) + counts[key]
+            if seen:
+                names = list(seen)
+                applied = await self._write(self.clients, [
+                    mongo.UpdateOne(
+                        {"client_name": name},
+                        {"$max": {"last_seen": seen[name][0]}, "$inc": {"count": seen[name][1]}},
+                        upsert=True,
+                    )
+                    for name in names
+                ])
+                for name in names[applied:]:
+                    entry = self._seen.get(name)
+                    if entry is None:
+                        self._seen[name] = seen[name]
+                    else:
+                        entry[0] = max(entry[0], seen[name][0])
+                        entry[1] += seen[name][1]
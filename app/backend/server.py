@@ -1,45 +1,361 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
-from fastapi.responses import StreamingResponse
+import time
+# Start of the import, for the startup report; heavy dependencies below are imported on first use
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from starlette.concurrency import iterate_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import sys
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import List, Literal, Optional, Tuple
 import uuid
+import asyncio
+import base64
+import importlib
+import json
+import math
+from collections import OrderedDict
 from datetime import datetime, timezone
-from passlib.context import CryptContext
-from jose import jwt
+from functools import lru_cache
 from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.chart import LineChart, Reference
-from openpyxl.styles import Font, PatternFill, Alignment
 from urllib.parse import urlencode
-from pymongo.errors import ServerSelectionTimeoutError
+from executor import BoundedExecutor, ExecutorSaturated
+from workbook import (
+    DEFAULT_ENGINE, ENGINES, TEMPLATE_VERSION, TRANSACTION_ROWS, XLSX_MEDIA_TYPE, build_workbook_artifact,
+    build_workbook_timed, iter_workbook, preload as preload_workbook, workbook_template,
+)
+from cache import WorkbookCache, cache_key
+from singleflight import SingleFlight
+from xlsx_writer import COMPRESSION_LEVELS, ZipStream
+from artifacts import ArtifactStore, artifact_etag
+from downloads import artifact_response
+from jobs import JobQueue, JobQueueFull
+from circuit import CircuitBreaker, CircuitOpen
+from persistence import WriteBehindBuffer
+from auth import InvalidToken, Principal, TokenVerifier
+from ratelimit import Lease, QuotaExceeded, Quotas
+from admission import AdmissionControl, AdmissionRule
+from rollups import StatusRollups, as_utc, window_start
+from analytics import GenerationRollups, summarize
+from exports import EXPORT_BATCH_SIZE, CollectionExport
+from tabular import FORMATS, ParquetUnavailable, check_parquet, iter_tabular, negotiate
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, RequestMetrics, observe_stages
+import mongo
+from mongo import ASCENDING, DESCENDING, LazyMotorClient, MongoCommandMetrics
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics, exposed in Prometheus text format at GET /api/metrics
+http_request_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body byte is sent", ("method", "route", "status"),
+)
+workbook_stage_seconds = REGISTRY.histogram(
+    "workbook_build_stage_seconds", "Workbook build time per stage, measured in the pool worker", ("engine", "stage"),
+)
+workbook_bytes = REGISTRY.counter("workbook_bytes_total", "Workbook bytes sent to clients or stored", ("mode",))
+mongo_command_seconds = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trip time", ("command",),
+)
+mongo_command_failures = REGISTRY.counter("mongodb_command_failures_total", "MongoDB commands that failed", ("command",))
+admission_rejections = REGISTRY.counter(
+    "admission_rejections_total", "Requests shed by admission control before any work", ("rule", "reason"),
+)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'app_db')]
 
-# Security setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Status checks: raw documents expire after STATUS_CHECK_TTL_SECONDS (TTL index on "ts"); per-client,
+# per-minute counts and last-seen times are maintained alongside for the /api/status/clients queries
+STATUS_CHECK_TTL_SECONDS = int(os.environ.get('STATUS_CHECK_TTL_SECONDS', 7 * 24 * 3600))
+STATUS_BATCH_MAX_ITEMS = int(os.environ.get('STATUS_BATCH_MAX_ITEMS', '10000'))
+
+
+# Security setup; passlib and bcrypt are loaded by the first register or login
+@lru_cache(maxsize=None)
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 JWT_SECRET = os.environ.get('JWT_SECRET', 'dev-secret-change')
 JWT_ALG = 'HS256'
+JWT_EXPIRES_MINUTES = float(os.environ.get('JWT_EXPIRES_MINUTES', '60'))
+bearer_scheme = HTTPBearer(auto_error=False)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', PASSWORD_HASH_WORKERS * 8))
 
 # OAuth envs (optional until configured)
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
 MICROSOFT_CLIENT_ID = os.environ.get('MICROSOFT_CLIENT_ID')
 MICROSOFT_TENANT_ID = os.environ.get('MICROSOFT_TENANT_ID', 'common')
 
-# Create the main app without a prefix
-app = FastAPI()
+# Workbook builds run in a process pool so they never block the event loop
+WORKBOOK_POOL_SIZE = int(os.environ.get('WORKBOOK_POOL_SIZE', os.cpu_count() or 1))
+WORKBOOK_QUEUE_SIZE = int(os.environ.get('WORKBOOK_QUEUE_SIZE', WORKBOOK_POOL_SIZE * 4))
+WORKBOOK_JOB_TIMEOUT = float(os.environ.get('WORKBOOK_JOB_TIMEOUT', '60'))
+# fast (default), the direct XML writer in xlsx_writer.py, which like streaming and jobs splices in the precompressed
+# Data and Summary sheets from workbook_template(); or openpyxl, which renders every cell on every build
+WORKBOOK_ENGINE = os.environ.get('WORKBOOK_ENGINE', DEFAULT_ENGINE)
+if WORKBOOK_ENGINE not in ENGINES:
+    raise RuntimeError(f"WORKBOOK_ENGINE must be one of {sorted(ENGINES)}, got {WORKBOOK_ENGINE!r}")
+# ZIP compression policy when a request does not pick one: stored|fast|default|max
+WORKBOOK_COMPRESSION = os.environ.get('WORKBOOK_COMPRESSION', 'default')
+if WORKBOOK_COMPRESSION not in COMPRESSION_LEVELS:
+    raise RuntimeError(f"WORKBOOK_COMPRESSION must be one of {sorted(COMPRESSION_LEVELS)}, got {WORKBOOK_COMPRESSION!r}")
+# Threads deflating blocks of one large sheet part (fast engine and streaming only). Every pool worker gets its own
+# threads, so the default splits the CPUs between the workers rather than giving each worker all of them
+WORKBOOK_COMPRESS_THREADS = int(
+    os.environ.get('WORKBOOK_COMPRESS_THREADS', max(1, min(4, (os.cpu_count() or 1) // max(1, WORKBOOK_POOL_SIZE))))
+)
+
+# Largest Transactions row count a request may ask for; big builds belong in stream or job mode
+GENERATION_MAX_ROWS = int(os.environ.get('GENERATION_MAX_ROWS', '5000000'))
+# Largest row count built in memory (the openpyxl engine takes ~10 s and ~275 MB per 100k rows). Buffered and
+# batch requests above it are refused; jobs above it are written by the streaming writer straight to disk.
+WORKBOOK_BUFFERED_MAX_ROWS = int(os.environ.get('WORKBOOK_BUFFERED_MAX_ROWS', '100000'))
+
+# Generated workbooks are cached by request content (0 bytes disables the memory tier)
+WORKBOOK_CACHE_MAX_BYTES = int(os.environ.get('WORKBOOK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+WORKBOOK_CACHE_TTL = float(os.environ.get('WORKBOOK_CACHE_TTL', '300'))
+# Artifact names remembered for cached workbooks, so a cache hit is not hashed and written again
+WORKBOOK_ARTIFACT_NAMES = 10_000
+# Upper bound on workbooks per /api/generate/batch call
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '500'))
+
+# Per-caller limits on /api/generate and /api/generate/batch: a token bucket (one token per workbook) and
+# concurrent generations, each held until its workbook is built, its stream is sent or its job finishes.
+# Anonymous callers are limited by client address unless GENERATE_REQUIRE_AUTH makes a bearer token mandatory.
+GENERATE_REQUIRE_AUTH = os.environ.get('GENERATE_REQUIRE_AUTH', '').lower() in ('1', 'true', 'yes')
+
+
+def admission_rule(name: str, prefixes, methods=("POST",), **limits) -> AdmissionRule:
+    # Each default is overridable as ADMISSION_<NAME>_<LIMIT>, e.g. ADMISSION_GENERATE_IP_RATE=10
+    limits = {k: type(v)(os.environ.get(f'ADMISSION_{name.upper()}_{k.upper()}', v)) for k, v in limits.items()}
+    return AdmissionRule(name, prefixes, methods=methods, **limits)
+
+
+# Background generation jobs (POST /api/generate with "job": true)
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', WORKBOOK_POOL_SIZE))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '1000'))
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', '600'))
+# Generated files are kept in ARTIFACT_DIR for the download routes, see ArtifactStore for the retention settings
+ARTIFACT_MEDIA_TYPES = {f".{ext}": media_type for media_type, ext in FORMATS.values()}
+
+# Libraries imported on first use instead of at startup; the startup log line says which are loaded already
+LAZY_MODULES = ("numpy", "pymongo", "bson", "motor", "openpyxl", "passlib", "jose")
+# Optional background warm-up once the app has started, comma-separated: "imports" loads the libraries
+# above in a thread, "pool" starts the workbook worker processes and loads openpyxl in each. Default: none.
+PREWARM = {name.strip() for name in os.environ.get('PREWARM', '').split(',') if name.strip()}
+if not PREWARM <= {"imports", "pool"}:
+    raise RuntimeError(f"PREWARM may contain imports and pool, got {sorted(PREWARM)}")
+
+
+# -------- Shared state --------
+
+def init_state():
+    """Creates the database client, queues, pools, caches and limits the routes share; called by create_app.
+
+    Nothing here connects or imports the heavy libraries: the Mongo client,
+    the pools and the write-behind tasks all start on first use.
+    """
+    global client, db, db_breaker, generation_rollups, generation_writes, job_states, status_rollups, status_writes
+    global token_verifier, password_executor, workbook_executor, workbook_cache, generation_quotas, admission_rules
+    global generation_jobs, artifact_store, workbook_flights, workbook_artifacts, background_tasks
+    # Created (and motor imported) on first use, off the event loop at startup. The driver default
+    # server selection timeout (30 s) would hold every request that touches Mongo during an outage.
+    client = LazyMotorClient(
+        mongo_url,
+        serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        listeners=[MongoCommandMetrics(mongo_command_seconds, mongo_command_failures).listener],
+    )
+    db = client[os.environ.get('DB_NAME', 'app_db')]
+
+    # Once Mongo is known to be down, generation paths skip it instead of waiting on the driver
+    db_breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get('DB_BREAKER_FAILURES', '3')),
+        reset_timeout=float(os.environ.get('DB_BREAKER_RESET_SECONDS', '10')),
+    )
+    # Per-day/provider counts, size histograms and description counts behind GET /api/generations/analytics;
+    # updated as records are stored (python analytics.py rebuilds them from the generations collection)
+    generation_rollups = GenerationRollups(
+        lambda: db.generation_rollups,
+        lambda: db.generation_descriptions,
+        db_breaker,
+        flush_interval=float(os.environ.get('ROLLUP_FLUSH_SECONDS', '5')),
+    )
+    # Generation records are written behind the response in batches and held here while Mongo is down
+    generation_writes = WriteBehindBuffer(
+        lambda: db.generations,
+        db_breaker,
+        max_items=int(os.environ.get('WRITE_BEHIND_MAX_ITEMS', '10000')),
+        batch_size=int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '500')),
+        flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', '0.1')),
+        retry_interval=float(os.environ.get('WRITE_BEHIND_RETRY_SECONDS', '5')),
+        backpressure_timeout=float(os.environ.get('WRITE_BEHIND_BACKPRESSURE_SECONDS', '1')),
+        spill_path=os.environ.get('WRITE_BEHIND_SPILL_PATH') or None,
+        after_write=generation_rollups.apply,
+    )
+    # Final states of background jobs, upserted by id. A job that ends while Mongo is down stays readable from
+    # here (GET /api/jobs/{id}) and is stored once Mongo is back, instead of being lost with its artifact.
+    job_states = WriteBehindBuffer(
+        lambda: db.generations,
+        db_breaker,
+        max_items=int(os.environ.get('JOB_STATE_MAX_ITEMS', '10000')),
+        batch_size=int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '500')),
+        flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', '0.1')),
+        retry_interval=float(os.environ.get('WRITE_BEHIND_RETRY_SECONDS', '5')),
+        backpressure_timeout=float(os.environ.get('WRITE_BEHIND_BACKPRESSURE_SECONDS', '1')),
+        spill_path=os.environ.get('JOB_STATE_SPILL_PATH') or None,
+        after_write=generation_rollups.apply,
+        upsert_key="id",
+    )
+
+    # Deltas a failed write left pending are retried with the next batch or after ROLLUP_FLUSH_SECONDS
+    status_rollups = StatusRollups(
+        lambda: db.status_rollups,
+        lambda: db.status_clients,
+        db_breaker,
+        flush_interval=float(os.environ.get('ROLLUP_FLUSH_SECONDS', '5')),
+    )
+    # Heartbeats are written behind the response like generation records, in larger batches
+    status_writes = WriteBehindBuffer(
+        lambda: db.status_checks,
+        db_breaker,
+        max_items=int(os.environ.get('STATUS_WRITE_BEHIND_MAX_ITEMS', '100000')),
+        batch_size=int(os.environ.get('STATUS_WRITE_BEHIND_BATCH_SIZE', '1000')),
+        flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', '0.1')),
+        retry_interval=float(os.environ.get('WRITE_BEHIND_RETRY_SECONDS', '5')),
+        backpressure_timeout=float(os.environ.get('WRITE_BEHIND_BACKPRESSURE_SECONDS', '1')),
+        spill_path=os.environ.get('STATUS_WRITE_BEHIND_SPILL_PATH') or None,
+        after_write=status_rollups.apply,
+    )
+
+    # Tokens already verified are remembered (until they expire), so authenticated requests skip the HMAC check
+    token_verifier = TokenVerifier(JWT_SECRET, JWT_ALG, max_entries=int(os.environ.get('JWT_CACHE_SIZE', '10000')))
+
+    # bcrypt runs in threads so hashing never blocks the event loop
+    password_executor = BoundedExecutor(
+        max_workers=PASSWORD_HASH_WORKERS,
+        max_queue=PASSWORD_HASH_QUEUE,
+        timeout=float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10')),
+        kind="thread",
+    )
+
+    workbook_executor = BoundedExecutor(
+        max_workers=WORKBOOK_POOL_SIZE,
+        max_queue=WORKBOOK_QUEUE_SIZE,
+        timeout=WORKBOOK_JOB_TIMEOUT,
+        kind="process",
+    )
+
+    workbook_cache = WorkbookCache(
+        max_bytes=WORKBOOK_CACHE_MAX_BYTES,
+        ttl=WORKBOOK_CACHE_TTL,
+        directory=os.environ.get('WORKBOOK_CACHE_DIR') or None,
+    )
+    # cache key -> artifact name of the bytes cached under it, least recently used first
+    workbook_artifacts = OrderedDict()
+
+    generation_quotas = Quotas(
+        rate=float(os.environ.get('GENERATION_RATE_PER_SECOND', '2')),
+        burst=float(os.environ.get('GENERATION_RATE_BURST', '20')),
+        concurrency=int(os.environ.get('GENERATION_CONCURRENCY_PER_USER', '2')),
+        max_keys=int(os.environ.get('GENERATION_QUOTA_MAX_CALLERS', '10000')),
+    )
+
+    # Admission control for expensive routes (the generate and auth POSTs, and collection exports, which scan a
+    # whole collection), applied before the request body is read: per-address and per-route
+    # token buckets (requests per second, burst), then at most CONCURRENCY requests in progress with up to QUEUE
+    # more waiting QUEUE_TIMEOUT seconds each. Shed requests get 429/503 with Retry-After. 0 disables a limit.
+    admission_rules = [
+        admission_rule(
+            "generate", ("/api/generate",), ip_rate=5.0, ip_burst=20.0, rate=50.0, burst=100.0,
+            concurrency=WORKBOOK_POOL_SIZE * 4, max_queue=WORKBOOK_POOL_SIZE * 8, queue_timeout=2.0,
+        ),
+        admission_rule(
+            "auth", ("/api/auth/",), ip_rate=1.0, ip_burst=10.0, rate=0.0, burst=0.0,
+            concurrency=PASSWORD_HASH_WORKERS * 2, max_queue=PASSWORD_HASH_QUEUE, queue_timeout=2.0,
+        ),
+        # An export holds its slot until the last byte is sent, so a few at a time keep Mongo and the loop free
+        admission_rule(
+            "export", ("/api/export/",), methods=("GET",), ip_rate=0.1, ip_burst=3.0, rate=0.0, burst=0.0,
+            concurrency=2, max_queue=4, queue_timeout=5.0,
+        ),
+    ]
+
+    # Background generation jobs (POST /api/generate with "job": true)
+    generation_jobs = JobQueue(run_generation_job, concurrency=JOB_CONCURRENCY, max_pending=JOB_QUEUE_SIZE)
+
+    # Every generated file is kept here, named by content digest, for GET /api/generations/{id}/download, until it
+    # has gone unused for ARTIFACT_MAX_AGE_SECONDS or is among the least recently used past ARTIFACT_MAX_BYTES
+    artifact_store = ArtifactStore(
+        os.environ.get('ARTIFACT_DIR') or str(ROOT_DIR / 'artifacts'),
+        max_age=float(os.environ.get('ARTIFACT_MAX_AGE_SECONDS', 7 * 24 * 3600)),
+        max_bytes=int(os.environ.get('ARTIFACT_MAX_BYTES', 10 * 1024 ** 3)),
+        sweep_interval=float(os.environ.get('ARTIFACT_SWEEP_SECONDS', '300')),
+    )
+
+    # Concurrent identical generations share one build
+    workbook_flights = SingleFlight()
+
+    # Tasks started at startup, kept referenced until they finish and cancelled at shutdown
+    background_tasks = set()
+
+
+# Point-in-time values, read when /api/metrics is scraped
+REGISTRY.gauge(
+    "executor_queued_tasks", "Tasks waiting for a free worker",
+    lambda: {("workbook",): workbook_executor.queued, ("password",): password_executor.queued}, ("pool",),
+)
+REGISTRY.gauge(
+    "executor_running_tasks", "Tasks currently running in a worker",
+    lambda: {("workbook",): workbook_executor.running, ("password",): password_executor.running}, ("pool",),
+)
+REGISTRY.gauge(
+    "generation_jobs", "Background generation jobs by state",
+    lambda: {("queued",): generation_jobs.pending, ("running",): generation_jobs.running}, ("state",),
+)
+REGISTRY.gauge(
+    "workbook_cache_events", "Workbook cache lookups and current size (cumulative counts)",
+    lambda: {(k,): v for k, v in workbook_cache.stats().items() if k in ("entries", "bytes", "hits", "disk_hits", "misses")},
+    ("kind",),
+)
+REGISTRY.gauge(
+    "generation_write_queue", "Generation record write-behind queue (buffered now, other counts cumulative)",
+    lambda: {(k,): v for k, v in generation_writes.stats().items()}, ("kind",),
+)
+REGISTRY.gauge(
+    "job_state_write_queue", "Final job state write-behind queue (buffered now, other counts cumulative)",
+    lambda: {(k,): v for k, v in job_states.stats().items()}, ("kind",),
+)
+REGISTRY.gauge(
+    "status_write_queue", "Status check write-behind queue (buffered now, other counts cumulative)",
+    lambda: {(k,): v for k, v in status_writes.stats().items()}, ("kind",),
+)
+REGISTRY.gauge(
+    "generation_quota", "Callers tracked, generations in flight and quota rejections (cumulative)",
+    lambda: {(k,): v for k, v in generation_quotas.stats().items()}, ("kind",),
+)
+REGISTRY.gauge(
+    "admission_requests", "Requests admitted and in progress, and waiting for admission, per rule",
+    lambda: {(rule.name, k): v for rule in admission_rules for k, v in rule.stats().items()}, ("rule", "state"),
+)
+REGISTRY.gauge(
+    "auth_token_cache", "Verified and revoked bearer tokens remembered, and lookups (cumulative)",
+    lambda: {(k,): v for k, v in token_verifier.stats().items()}, ("kind",),
+)
+REGISTRY.gauge(
+    "mongodb_circuit_open", "1 while the MongoDB circuit breaker rejects calls",
+    lambda: {(): int(db_breaker.state != CircuitBreaker.CLOSED)},
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -51,6 +367,18 @@ def now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 
+def encode_cursor(created_at: str, record_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, record_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), str(record_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 def prepare_for_mongo(data: dict) -> dict:
     # Ensure dates are ISO strings
     for k, v in list(data.items()):
@@ -70,9 +398,39 @@ class StatusCheckCreate(BaseModel):
     client_name: str
 
 
+class StatusCheckBatch(BaseModel):
+    checks: List[StatusCheckCreate]
+
+
+class ClientSeen(BaseModel):
+    client_name: str
+    last_seen: str
+    total: int  # checks received since the client was first seen
+
+
+class ClientStatus(ClientSeen):
+    window_minutes: int
+    count: int  # checks in the last window_minutes, the current minute included
+
+
 class GenerationRequest(BaseModel):
     description: str
     provider: Optional[str] = Field(default="auto")  # openai|anthropic|gemini|auto
+    rows: int = Field(default=TRANSACTION_ROWS, ge=1, le=GENERATION_MAX_ROWS)  # Transactions rows, split across sheets past Excel's limit
+    stream: bool = False  # write-only build, bytes are sent while rows are still being written
+    job: bool = False  # queue a background job and return its id immediately
+    priority: int = Field(default=5, ge=0, le=9)  # job mode only, lower runs first
+    compression: Optional[Literal["stored", "fast", "default", "max"]] = None  # defaults to WORKBOOK_COMPRESSION
+    format: Optional[Literal["xlsx", "csv", "ndjson", "parquet"]] = None  # overrides the Accept header; default xlsx
+    sheet: Literal["transactions", "data"] = "transactions"  # the sheet exported by csv, ndjson and parquet
+
+    @property
+    def compression_policy(self) -> str:
+        return self.compression or WORKBOOK_COMPRESSION
+
+
+class BatchGenerationRequest(BaseModel):
+    requests: List[GenerationRequest]
 
 
 class GenerationRecord(BaseModel):
@@ -82,6 +440,15 @@ class GenerationRecord(BaseModel):
     filename: str
     size_bytes: int
     created_at: str = Field(default_factory=now_iso)
+    # Job state; records of synchronous generations are born "done"
+    status: str = "done"  # queued|running|done|failed
+    progress: float = 1.0
+    queued_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+    artifact: Optional[str] = None  # file name inside ARTIFACT_DIR, served by /api/generations/{id}/download
+    user_id: Optional[str] = None  # from the bearer token, when the request carried one
 
 
 class RegisterRequest(BaseModel):
@@ -97,6 +464,7 @@ class LoginRequest(BaseModel):
 class LoginResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    expires_in: int  # seconds
 
 
 # ====== Routes ======
@@ -105,36 +473,114 @@ async def root():
     return {"message": "Hello World"}
 
 
+@api_router.get("/health")
+async def health():
+    # Liveness only: no database round trip and nothing to import, so a new worker passes at once
+    return {"status": "ok"}
+
+
+def status_documents(inputs: List[StatusCheckCreate]):
+    # "ts" is the BSON date the TTL index and rollups use; "timestamp" keeps the API's ISO string
+    ts = datetime.now(timezone.utc)
+    checks = [StatusCheck(client_name=item.client_name, timestamp=ts.isoformat()) for item in inputs]
+    return checks, [{**check.model_dump(), "ts": ts} for check in checks]
+
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_obj = StatusCheck(client_name=input.client_name)
-    await db.status_checks.insert_one(status_obj.model_dump())
-    return status_obj
+    checks, docs = status_documents([input])
+    await status_writes.put(docs)
+    return checks[0]
+
+
+@api_router.post("/status/batch", status_code=202)
+async def create_status_checks(req: StatusCheckBatch):
+    if len(req.checks) > STATUS_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {STATUS_BATCH_MAX_ITEMS} checks")
+    _, docs = status_documents(req.checks)
+    await status_writes.put(docs)
+    return {"accepted": len(docs)}
 
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    # Pydantic ignores _id
-    return [StatusCheck(**{k: v for k, v in sc.items() if k != "_id"}) for sc in status_checks]
+async def get_status_checks(limit: int = Query(default=1000, ge=1, le=1000)):
+    # Newest first from the TTL index; documents go out as stored, without a model per row
+    try:
+        checks = await db_breaker.call(
+            db.status_checks.find({}, {"_id": 0, "ts": 0}).sort("ts", DESCENDING).limit(limit).to_list, limit,
+        )
+    except (CircuitOpen, mongo.ConnectionFailure):
+        raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
+    return JSONResponse(content=checks)
+
+
+@api_router.get("/status/clients", response_model=List[ClientSeen])
+async def list_client_status(limit: int = Query(default=100, ge=1, le=1000)):
+    """Most recently seen clients, from the per-client rollup documents."""
+    try:
+        docs = await db_breaker.call(
+            db.status_clients.find({}, {"_id": 0}).sort("last_seen", DESCENDING).limit(limit).to_list, limit,
+        )
+    except (CircuitOpen, mongo.ConnectionFailure):
+        raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
+    return JSONResponse(content=[
+        {"client_name": d["client_name"], "last_seen": as_utc(d["last_seen"]).isoformat(), "total": d.get("count", 0)}
+        for d in docs
+    ])
+
+
+@api_router.get("/status/clients/{client_name}", response_model=ClientStatus)
+async def get_client_status(
+    client_name: str,
+    window_minutes: int = Query(default=60, ge=1, le=7 * 24 * 60),
+):
+    # One document for last seen, at most window_minutes buckets for the count; raw checks are never scanned
+    since = window_start(window_minutes, datetime.now(timezone.utc))
+    try:
+        client_doc = await db_breaker.call(db.status_clients.find_one, {"client_name": client_name}, {"_id": 0})
+        if client_doc is None:
+            raise HTTPException(status_code=404, detail="Client not seen")
+        totals = await db_breaker.call(db.status_rollups.aggregate([
+            {"$match": {"client_name": client_name, "minute": {"$gte": since}}},
+            {"$group": {"_id": None, "count": {"$sum": "$count"}}},
+        ]).to_list, 1)
+    except (CircuitOpen, mongo.ConnectionFailure):
+        raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
+    return ClientStatus(
+        client_name=client_name,
+        last_seen=as_utc(client_doc["last_seen"]).isoformat(),
+        total=client_doc.get("count", 0),
+        window_minutes=window_minutes,
+        count=totals[0]["count"] if totals else 0,
+    )
 
 
 # -------- Auth (minimal, optional) --------
+async def run_password_job(fn, *args):
+    # bcrypt is CPU-bound; it runs in its own small pool so logins never stall the event loop
+    try:
+        return await password_executor.run(fn, *args)
+    except (ExecutorSaturated, asyncio.TimeoutError):
+        raise HTTPException(status_code=503, detail="Authentication busy, retry shortly", headers={"Retry-After": "1"})
+
+
 @api_router.post("/auth/register")
 async def register(req: RegisterRequest):
     try:
-        existing = await db.users.find_one({"email": req.email})
-        if existing:
+        # Cheap check before spending a bcrypt hash; the unique index on users.email catches concurrent registrations
+        if await db.users.find_one({"email": req.email}, {"_id": 1}):
             raise HTTPException(status_code=400, detail="Email already registered")
         user = {
             "id": str(uuid.uuid4()),
             "email": req.email,
-            "password_hash": pwd_context.hash(req.password),
+            "password_hash": await run_password_job(password_context().hash, req.password),
             "created_at": now_iso(),
         }
         await db.users.insert_one(user)
         return {"ok": True}
-    except ServerSelectionTimeoutError:
+    except mongo.DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    except mongo.ServerSelectionTimeoutError:
         raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
     except Exception as e:
         raise
@@ -144,17 +590,51 @@ async def register(req: RegisterRequest):
 async def login(req: LoginRequest):
     try:
         user = await db.users.find_one({"email": req.email})
-        if not user or not pwd_context.verify(req.password, user.get("password_hash", "")):
+        if not user or not await run_password_job(password_context().verify, req.password, user.get("password_hash", "")):
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        payload = {"sub": user["id"], "email": user["email"], "iat": int(datetime.now(timezone.utc).timestamp())}
-        token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
-        return LoginResponse(access_token=token)
-    except ServerSelectionTimeoutError:
+        token = token_verifier.issue(user["id"], user["email"], JWT_EXPIRES_MINUTES)
+        return LoginResponse(access_token=token, expires_in=int(JWT_EXPIRES_MINUTES * 60))
+    except mongo.ServerSelectionTimeoutError:
         raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
     except Exception as e:
         raise
 
 
+async def current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[Principal]:
+    # No Authorization header means anonymous; a token that is present must be valid
+    if credentials is None:
+        return None
+    try:
+        return token_verifier.verify(credentials.credentials)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}", headers={"WWW-Authenticate": "Bearer"})
+
+
+async def require_user(user: Optional[Principal] = Depends(current_user)) -> Principal:
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+@api_router.get("/auth/me")
+async def me(user: Principal = Depends(require_user)):
+    return {"id": user.user_id, "email": user.email}
+
+
+@api_router.post("/auth/logout")
+async def logout(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    # The presented token is refused from now on, even though it has not expired
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        token_verifier.revoke(credentials.credentials)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}", headers={"WWW-Authenticate": "Bearer"})
+    return {"ok": True}
+
+
 # --- OAuth: Login URL helpers (stubs until creds provided) ---
 @api_router.get("/auth/google/login")
 async def google_login(request: Request):
@@ -202,139 +682,508 @@ async def microsoft_callback():
 
 # -------- Spreadsheet Generation (non-AI stub) --------
 
-def build_workbook(description: str) -> BytesIO:
-    wb = Workbook()
-    ws_info = wb.active
-    ws_info.title = "README"
-
-    title_font = Font(bold=True, size=14)
-    subtle = PatternFill(start_color="FFF5F5F7", end_color="FFF5F5F7", fill_type="solid")
-
-    ws_info["A1"] = "Generated Spreadsheet"
-    ws_info["A1"].font = title_font
-    ws_info["A2"] = f"Description: {description}"
-    ws_info["A3"] = f"Generated At: {datetime.now(timezone.utc).isoformat()}"
-    ws_info["A5"] = "This is an instant stub (no AI yet). We'll use AI in the next step."
-    ws_info.column_dimensions['A'].width = 90
-    for r in range(1, 7):
-        ws_info[f"A{r}"].alignment = Alignment(wrap_text=True)
-    ws_info["A1"].fill = subtle
-
-    # Simple model based on keywords
-    ws = wb.create_sheet("Data")
-    ws["A1"], ws["B1"], ws["C1"], ws["D1"] = ("Month", "Revenue", "Costs", "Profit")
-    for cell in ("A1", "B1", "C1", "D1"):
-        ws[cell].font = Font(bold=True)
-    months = [
-        "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"
-    ]
-    base_rev = 18000
-    base_cost = 12000
-    for i, m in enumerate(months, start=2):
-        ws[f"A{i}"] = m
-        ws[f"B{i}"] = base_rev + (i - 2) * 1000
-        ws[f"C{i}"] = base_cost + (i - 2) * 600
-        ws[f"D{i}"] = f"=B{i}-C{i}"
-    ws.auto_filter.ref = f"A1:D{len(months)+1}"
-
-    # Summary sheet with totals and a chart
-    ws_sum = wb.create_sheet("Summary")
-    ws_sum["A1"].value = "KPI Summary"
-    ws_sum["A1"].font = title_font
-    ws_sum["A3"].value = "Total Revenue"
-    ws_sum["B3"].value = f"=SUM(Data!B2:B{len(months)+1})"
-    ws_sum["A4"].value = "Total Costs"
-    ws_sum["B4"].value = f"=SUM(Data!C2:C{len(months)+1})"
-    ws_sum["A5"].value = "Total Profit"
-    ws_sum["B5"].value = f"=SUM(Data!D2:D{len(months)+1})"
-
-    chart = LineChart()
-    chart.title = "Revenue vs Costs vs Profit"
-    data = Reference(ws, min_col=2, min_row=1, max_col=4, max_row=len(months)+1)
-    cats = Reference(ws, min_col=1, min_row=2, max_row=len(months)+1)
-    chart.add_data(data, titles_from_data=True)
-    chart.set_categories(cats)
-    chart.height = 12
-    chart.width = 24
-    ws_sum.add_chart(chart, "A7")
-
-    # Additional sheet to increase richness and file size for testing
-    ws_tx = wb.create_sheet("Transactions")
-    ws_tx["A1"], ws_tx["B1"], ws_tx["C1"], ws_tx["D1"], ws_tx["E1"], ws_tx["F1"] = ("Date", "Category", "Amount", "Note", "Reference", "Description")
-    for cell in ("A1", "B1", "C1", "D1", "E1", "F1"):
-        ws_tx[cell].font = Font(bold=True)
-    cats = ["Sales", "Ops", "Marketing", "R&D", "Other", "Support", "Finance", "Legal", "HR", "IT"]
-    from datetime import timedelta
-    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
-    # Increased to 800 rows with more columns to ensure file size > 20000 bytes
-    for i in range(1, 801):
-        d = start + timedelta(days=i % 365)
-        ws_tx[f"A{i+1}"] = d.date().isoformat()
-        ws_tx[f"B{i+1}"] = cats[i % len(cats)]
-        ws_tx[f"C{i+1}"] = (i * 7) % 900 + 50
-        ws_tx[f"D{i+1}"] = f"Auto-generated transaction row {i} with detailed description"
-        ws_tx[f"E{i+1}"] = f"REF-{i:06d}"
-        ws_tx[f"F{i+1}"] = f"Detailed description for transaction {i} including additional context and information to increase file size"
-
-    # Save to bytes
-    bytes_io = BytesIO()
-    wb.save(bytes_io)
-    bytes_io.seek(0)
-    return bytes_io
+async def run_workbook_job(fn, *args, wait: bool = False, timeout: Optional[float] = None):
+    try:
+        return await workbook_executor.run(fn, *args, wait=wait, timeout=timeout)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Spreadsheet builder busy, retry shortly", headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Spreadsheet generation timed out")
 
 
-@api_router.post("/generate")
-async def generate_spreadsheet(req: GenerationRequest):
-    # Build workbook instantly (no external AI)
-    xlsx_stream = build_workbook(req.description)
+async def save_generation_record(record: GenerationRecord):
+    # Queued for a background insert_many; file streaming never waits on the DB
+    await generation_writes.put([prepare_for_mongo(record.model_dump())])
+
+
+async def save_generation_records(records: List[GenerationRecord]):
+    await generation_writes.put([prepare_for_mongo(r.model_dump()) for r in records])
+
+
+def remember_artifact(key: str, name: Optional[str]):
+    if name is None or not workbook_cache.enabled:
+        return
+    workbook_artifacts[key] = name
+    workbook_artifacts.move_to_end(key)
+    if len(workbook_artifacts) > WORKBOOK_ARTIFACT_NAMES:
+        workbook_artifacts.popitem(last=False)
+
+
+async def build_and_cache(key: str, req: GenerationRequest, wait: bool = False) -> Tuple[bytes, Optional[str]]:
+    # Build workbook instantly (no external AI), off the event loop
+    xlsx_bytes, stages = await run_workbook_job(
+        build_workbook_timed, req.description, WORKBOOK_ENGINE, req.rows, req.compression_policy, WORKBOOK_COMPRESS_THREADS,
+        wait=wait,
+    )
+    observe_stages(workbook_stage_seconds, stages, WORKBOOK_ENGINE)
+    # Stored once per build, and remembered before the bytes are cached, so every hit finds the name of its bytes
+    artifact = await artifact_store.save(xlsx_bytes)
+    remember_artifact(key, artifact)
+    if workbook_cache.enabled:
+        await workbook_cache.put(key, xlsx_bytes)
+    return xlsx_bytes, artifact
+
+
+async def cached_artifact(key: str, xlsx_bytes: bytes) -> Optional[str]:
+    name = workbook_artifacts.get(key)
+    if name is not None and artifact_store.exists(name):
+        workbook_artifacts.move_to_end(key)
+        artifact_store.touch(name)
+        return name
+    # Read back from the disk tier after a restart, or the artifact was swept: stored again
+    name = await artifact_store.save(xlsx_bytes)
+    remember_artifact(key, name)
+    return name
+
+
+async def get_workbook_bytes(req: GenerationRequest, wait: bool = False) -> Tuple[bytes, Optional[str], bool]:
+    # Returns the bytes, their artifact name (None when it could not be stored) and whether they came from the cache.
+    # Output depends only on the request fields below (plus the Generated At cell, see cache.py)
+    key = cache_key(
+        TEMPLATE_VERSION, description=req.description, rows=req.rows, engine=WORKBOOK_ENGINE,
+        compression=req.compression_policy,
+    )
+    xlsx_bytes = await workbook_cache.get(key) if workbook_cache.enabled else None
+    if xlsx_bytes is not None:
+        return xlsx_bytes, await cached_artifact(key, xlsx_bytes), True
+    xlsx_bytes, artifact = await workbook_flights.do(key, lambda: build_and_cache(key, req, wait))
+    return xlsx_bytes, artifact, False
+
+
+async def stream_workbook(req: GenerationRequest, record: GenerationRecord):
+    # Each chunk is produced and stored in the threadpool; the record is saved once the last byte is out
+    artifact = artifact_store.writer(".xlsx")
+    chunks = iter_workbook(
+        req.description, req.rows, compression=req.compression_policy, threads=WORKBOOK_COMPRESS_THREADS,
+    )
+    async for chunk in iterate_in_threadpool(artifact.tee(chunks)):
+        record.size_bytes += len(chunk)
+        yield chunk
+    workbook_bytes.inc("stream", amount=record.size_bytes)
+    record.artifact = await asyncio.to_thread(artifact.commit)
+    await save_generation_record(record)
+
+
+async def save_job_state(record: GenerationRecord):
+    # Progress updates are best effort; the final state goes through job_states (see run_generation)
+    try:
+        await db_breaker.call(db.generations.replace_one, {"id": record.id}, prepare_for_mongo(record.model_dump()), upsert=True)
+    except (CircuitOpen, mongo.ConnectionFailure):
+        logger.warning("MongoDB unavailable while saving state of job %s", record.id)
+
+
+async def run_generation_job(job):
+    record, req, lease = job
+    with lease:
+        await run_generation(record, req)
+
+
+async def run_generation(record: GenerationRecord, req: GenerationRequest):
+    record.status = "running"
+    record.started_at = now_iso()
+    record.progress = 0.1
+    await save_job_state(record)
+    try:
+        if req.rows > WORKBOOK_BUFFERED_MAX_ROWS:
+            # Too large to build in memory; the pool worker streams it into the artifact store
+            record.artifact, record.size_bytes, stages = await run_workbook_job(
+                build_workbook_artifact, str(artifact_store.directory), req.description, req.rows, req.compression_policy,
+                WORKBOOK_COMPRESS_THREADS, wait=True, timeout=JOB_TIMEOUT,
+            )
+            observe_stages(workbook_stage_seconds, stages, "stream")
+        else:
+            xlsx_bytes, stages = await run_workbook_job(
+                build_workbook_timed, req.description, WORKBOOK_ENGINE, req.rows, req.compression_policy,
+                WORKBOOK_COMPRESS_THREADS, wait=True, timeout=JOB_TIMEOUT,
+            )
+            observe_stages(workbook_stage_seconds, stages, WORKBOOK_ENGINE)
+            record.progress = 0.8
+            record.artifact = await artifact_store.save(xlsx_bytes)
+            record.size_bytes = len(xlsx_bytes)
+        workbook_bytes.inc("job", amount=record.size_bytes)
+        if record.artifact is None:
+            record.status, record.error = "failed", "Could not store the generated file"
+        else:
+            record.status = "done"
+            record.progress = 1.0
+    except HTTPException as e:
+        record.status, record.error = "failed", e.detail
+    except asyncio.CancelledError:
+        # Shutdown; stored as failed (job_states is flushed after the job queue stops) rather than left running
+        record.status, record.error, record.finished_at = "failed", "Interrupted by server shutdown", now_iso()
+        job_states.add([prepare_for_mongo(record.model_dump())])
+        raise
+    except Exception as e:
+        logger.exception("Generation job %s failed", record.id)
+        record.status, record.error = "failed", str(e) or e.__class__.__name__
+    record.finished_at = now_iso()
+    # Queued before the job leaves generation_jobs, so the record is never unreadable; rollups count it once stored
+    await job_states.put([prepare_for_mongo(record.model_dump())])
 
-    # Persist a generation record (non-blocking feel, but awaited here)
-    filename = f"spreadsheet_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.xlsx"
-    size_bytes = len(xlsx_stream.getbuffer())
+
+async def enqueue_generation_job(req: GenerationRequest, filename: str, user_id: Optional[str], lease: Lease):
+    # The job owns the caller's concurrency slot until it finishes
     record = GenerationRecord(
         description=req.description,
         provider=(req.provider or "auto"),
         filename=filename,
-        size_bytes=size_bytes,
+        size_bytes=0,
+        status="queued",
+        progress=0.0,
+        queued_at=now_iso(),
+        user_id=user_id,
+    )
+    try:
+        generation_jobs.submit(record.id, (record, req, lease), priority=req.priority)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Job queue full, retry shortly", headers={"Retry-After": "5"})
+    await save_job_state(record)
+    return JSONResponse(status_code=202, content={
+        "job_id": record.id,
+        "status": record.status,
+        "status_url": f"/api/jobs/{record.id}",
+        "download_url": f"/api/jobs/{record.id}/download",
+    })
+
+
+async def find_generation(generation_id: str) -> GenerationRecord:
+    job = generation_jobs.get(generation_id)
+    if job is not None:
+        return job[0]
+    # A finished job whose final state has not reached Mongo yet; Mongo may still hold an older state
+    doc = job_states.find("id", generation_id)
+    if doc is None:
+        try:
+            doc = await db_breaker.call(db.generations.find_one, {"id": generation_id}, {"_id": 0})
+        except (CircuitOpen, mongo.ConnectionFailure):
+            doc = generation_writes.find("id", generation_id)
+            if doc is None:
+                raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
+        # A record answered from the write-behind queue has not reached Mongo yet
+        doc = doc or generation_writes.find("id", generation_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return GenerationRecord(**{k: v for k, v in doc.items() if k != "_id"})
+
+
+def download_artifact(record: GenerationRecord, request: Request):
+    if record.status != "done":
+        raise HTTPException(status_code=409, detail=f"Generation is {record.status}")
+    stat_result = artifact_store.stat(record.artifact)
+    if stat_result is None:
+        raise HTTPException(status_code=410, detail="Generated file no longer available")
+    artifact_store.touch(record.artifact)
+    media_type = ARTIFACT_MEDIA_TYPES.get(Path(record.artifact).suffix, "application/octet-stream")
+    return artifact_response(
+        request, artifact_store.path(record.artifact), stat_result, artifact_etag(record.artifact), media_type,
+        record.filename,
     )
-    # Try to persist record, but don't fail generation if DB is unavailable
+
+
+@api_router.get("/jobs/{job_id}", response_model=GenerationRecord)
+async def get_job(job_id: str):
+    return await find_generation(job_id)
+
+
+@api_router.api_route("/jobs/{job_id}/download", methods=["GET", "HEAD"])
+async def download_job(job_id: str, request: Request):
+    return download_artifact(await find_generation(job_id), request)
+
+
+@api_router.api_route("/generations/{generation_id}/download", methods=["GET", "HEAD"])
+async def download_generation(generation_id: str, request: Request):
+    # Strong ETag, If-None-Match (304) and single byte ranges (206), so interrupted downloads resume
+    return download_artifact(await find_generation(generation_id), request)
+
+
+async def stream_tabular(req: GenerationRequest, fmt: str, record: GenerationRecord):
+    # Straight from the NumPy columns; no workbook is built
+    artifact = artifact_store.writer(f".{FORMATS[fmt][1]}")
+    async for chunk in iterate_in_threadpool(artifact.tee(iter_tabular(fmt, req.sheet, req.rows))):
+        record.size_bytes += len(chunk)
+        yield chunk
+    workbook_bytes.inc(fmt, amount=record.size_bytes)
+    record.artifact = await asyncio.to_thread(artifact.commit)
+    await save_generation_record(record)
+
+
+def take_generation_quota(request: Request, user: Optional[Principal], cost: int = 1) -> Lease:
+    if user is None and GENERATE_REQUIRE_AUTH:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    key = f"user:{user.user_id}" if user else f"ip:{request.client.host if request.client else 'unknown'}"
     try:
-        await db.generations.insert_one(prepare_for_mongo(record.model_dump()))
-    except ServerSelectionTimeoutError:
-        # Log and continue; file streaming should not be blocked by DB
-        logger.warning("MongoDB unavailable during insert of generation record; continuing without persistence")
+        return generation_quotas.acquire(key, cost)
+    except QuotaExceeded as e:
+        if math.isinf(e.retry_after):
+            # Costs more than the burst: no wait makes it fit
+            raise HTTPException(status_code=413, detail=f"At most {generation_quotas.burst:g} workbooks per request")
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+
+def check_buffered_rows(items: List[GenerationRequest]):
+    if any(item.rows > WORKBOOK_BUFFERED_MAX_ROWS for item in items):
+        raise HTTPException(
+            status_code=413,
+            detail=f"Workbooks over {WORKBOOK_BUFFERED_MAX_ROWS} rows are only built with stream or job set",
+        )
+
+
+class HoldingResponse(StreamingResponse):
+    """Holds the caller's concurrency slot until the body has been sent, or the client has gone away.
 
+    The lease is released by the response itself, so a body that is never
+    iterated (the client left before it started) gives the slot back too.
+    """
+
+    def __init__(self, lease: Lease, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.lease = lease
+
+    async def __call__(self, scope, receive, send):
+        with self.lease:
+            await super().__call__(scope, receive, send)
+
+
+@api_router.post("/generate")
+async def generate_spreadsheet(
+    req: GenerationRequest, request: Request, user: Optional[Principal] = Depends(current_user),
+):
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+    fmt = req.format or negotiate(request.headers.get("accept")) or "xlsx"
+    if fmt != "xlsx":
+        if req.job:
+            raise HTTPException(status_code=400, detail="Background jobs only produce xlsx")
+        if fmt == "parquet":
+            try:
+                check_parquet()
+            except ParquetUnavailable as e:
+                raise HTTPException(status_code=501, detail=str(e))
+    user_id = user.user_id if user else None
+    lease = take_generation_quota(request, user)
+    if fmt != "xlsx":
+        media_type, ext = FORMATS[fmt]
+        record = GenerationRecord(
+            description=req.description, provider=(req.provider or "auto"),
+            filename=f"spreadsheet_{stamp}_{req.sheet}.{ext}", size_bytes=0, user_id=user_id,
+        )
+        headers = {
+            'Content-Disposition': f'attachment; filename="{record.filename}"',
+            'Vary': 'Accept',
+            'X-Generation-Id': record.id,
+        }
+        return HoldingResponse(lease, stream_tabular(req, fmt, record), media_type=media_type, headers=headers)
+
+    filename = f"spreadsheet_{stamp}.xlsx"
+    if req.job:
+        try:
+            return await enqueue_generation_job(req, filename, user_id, lease)
+        except HTTPException:
+            lease.release()
+            raise
+    record = GenerationRecord(
+        description=req.description,
+        provider=(req.provider or "auto"),
+        filename=filename,
+        size_bytes=0,
+        user_id=user_id,
+    )
     headers = {
-        'Content-Disposition': f'attachment; filename="{filename}"'
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Vary': 'Accept',
+        # Re-download (resumable) from /api/generations/{id}/download
+        'X-Generation-Id': record.id,
     }
-    return StreamingResponse(xlsx_stream, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', headers=headers)
+    if req.stream:
+        return HoldingResponse(lease, stream_workbook(req, record), media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+    with lease:
+        check_buffered_rows([req])
+        xlsx_bytes, artifact, cached = await get_workbook_bytes(req)
+    headers['X-Cache'] = 'HIT' if cached else 'MISS'
+    xlsx_stream = BytesIO(xlsx_bytes)
+
+    # The artifact is written before the response starts; the record is only queued for generation_writes
+    record.size_bytes = len(xlsx_stream.getbuffer())
+    workbook_bytes.inc("buffered", amount=record.size_bytes)
+    record.artifact = artifact
+    await save_generation_record(record)
+
+    return StreamingResponse(xlsx_stream, media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+
+async def stream_batch(items: List[GenerationRequest], stamp: str, user_id: Optional[str]):
+    # Workbooks enter the archive in completion order; each batch keeps at most
+    # WORKBOOK_POOL_SIZE builds in the pool and waits (rather than fails) for slots
+    limit = asyncio.Semaphore(WORKBOOK_POOL_SIZE)
+
+    async def build(index: int, item: GenerationRequest):
+        async with limit:
+            try:
+                xlsx_bytes, artifact, _ = await get_workbook_bytes(item, wait=True)
+                return index, item, xlsx_bytes, artifact, None
+            except HTTPException as e:
+                return index, item, None, None, e.detail
+
+    archive = ZipStream()
+    records = []
+    tasks = [asyncio.ensure_future(build(i, item)) for i, item in enumerate(items, start=1)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, item, xlsx_bytes, artifact, error = await next_done
+            if error is not None:
+                archive.writestr(f"{index:03d}_error.txt", f"{item.description}\n{error}\n".encode("utf-8"))
+            else:
+                filename = f"spreadsheet_{stamp}_{index:03d}.xlsx"
+                archive.writestr(filename, xlsx_bytes, compress=False)
+                workbook_bytes.inc("batch", amount=len(xlsx_bytes))
+                records.append(GenerationRecord(
+                    description=item.description,
+                    provider=(item.provider or "auto"),
+                    filename=filename,
+                    size_bytes=len(xlsx_bytes),
+                    artifact=artifact,
+                    user_id=user_id,
+                ))
+            yield archive.drain()
+        archive.close()
+        yield archive.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Workbooks already sent are recorded even if the client went away before the end
+        await save_generation_records(records)
+
+
+@api_router.post("/generate/batch")
+async def generate_batch(
+    req: BatchGenerationRequest, request: Request, user: Optional[Principal] = Depends(current_user),
+):
+    if not req.requests:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(req.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} requests")
+    if any(item.format not in (None, "xlsx") for item in req.requests):
+        raise HTTPException(status_code=400, detail="Batches only contain xlsx workbooks")
+    check_buffered_rows(req.requests)
+    # One token per workbook, so a batch larger than the rate burst is refused (413); the whole batch
+    # counts as one concurrent generation
+    lease = take_generation_quota(request, user, cost=len(req.requests))
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+    headers = {
+        'Content-Disposition': f'attachment; filename="spreadsheets_{stamp}.zip"'
+    }
+    body = stream_batch(req.requests, stamp, user.user_id if user else None)
+    return HoldingResponse(lease, body, media_type='application/zip', headers=headers)
+
+
+@api_router.get("/generate/cache")
+async def workbook_cache_stats():
+    return {**workbook_cache.stats(), "coalesced": workbook_flights.coalesced, "in_flight": workbook_flights.in_flight}
+
+
+@api_router.get("/metrics")
+async def get_metrics():
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+async def stream_export(cursor, docs: List[dict], export: CollectionExport):
+    # The next batch is fetched while the previous one is rendered and compressed in a thread
+    fetch = None
+    size_bytes = 0
+    try:
+        while docs:
+            fetch = asyncio.ensure_future(cursor.to_list(EXPORT_BATCH_SIZE))
+            chunk = await asyncio.to_thread(export.write, docs)
+            if chunk:
+                size_bytes += len(chunk)
+                yield chunk
+            docs = await fetch
+        chunk = await asyncio.to_thread(export.close)
+        size_bytes += len(chunk)
+        yield chunk
+    except mongo.PyMongoError:
+        # Headers are already sent; the client sees a truncated download
+        logger.exception("Export of %s failed after %d rows", export.title, export.rows)
+        raise
+    finally:
+        if fetch is not None:
+            fetch.cancel()
+        await cursor.close()
+        workbook_bytes.inc("export", amount=size_bytes)
+
+
+@api_router.get("/export/{collection}")
+async def export_collection(collection: str, compression: Optional[Literal["stored", "fast", "default", "max"]] = None):
+    if collection not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export, expected one of {', '.join(EXPORTS)}")
+    columns, order = EXPORTS[collection]
+    cursor = db[collection].find({}, {"_id": 0}, batch_size=EXPORT_BATCH_SIZE).sort(order)
+    # The first batch is read before answering, so an unavailable database is a 503 rather than a broken file
+    try:
+        docs = await db_breaker.call(cursor.to_list, EXPORT_BATCH_SIZE)
+    except (CircuitOpen, mongo.ConnectionFailure):
+        raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
+    export = CollectionExport(collection, columns, COMPRESSION_LEVELS[compression or WORKBOOK_COMPRESSION])
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+    headers = {'Content-Disposition': f'attachment; filename="{collection}_{stamp}.xlsx"'}
+    return StreamingResponse(stream_export(cursor, docs, export), media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+
+@api_router.get("/generations/analytics")
+async def generation_analytics(
+    days: int = Query(default=30, ge=1, le=366),
+    top: int = Query(default=10, ge=1, le=100),
+):
+    """Per-day and per-provider counts, size_bytes percentiles and the most common descriptions.
+
+    Read from rollup documents (at most ``days`` x providers plus ``top``), so
+    it is cheap enough to poll. Percentiles are estimated from a log-scale
+    histogram and are accurate to within about 10%; top descriptions are all-time.
+    """
+    try:
+        return await db_breaker.call(summarize, db, days, top)
+    except (CircuitOpen, mongo.ConnectionFailure):
+        raise HTTPException(status_code=503, detail="Database unavailable - MongoDB not running")
 
 
 @api_router.get("/generations", response_model=List[GenerationRecord])
-async def list_generations():
+async def list_generations(
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(default=None, description="Comma-separated GenerationRecord fields"),
+):
+    # Keyset pagination on (created_at, id), newest first; served by the compound index
+    query = {}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": last_id}},
+        ]}
+    projection = {"_id": 0}
+    if fields:
+        wanted = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = wanted - set(GenerationRecord.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection.update({f: 1 for f in wanted | {"created_at", "id"}})
     try:
-        gens = await db.generations.find().sort("created_at", -1).to_list(100)
-        cleaned = []
-        for g in gens:
-            g.pop("_id", None)
-            cleaned.append(GenerationRecord(**g))
-        return cleaned
-    except ServerSelectionTimeoutError:
+        gens = await db_breaker.call(db.generations.find(query, projection).sort(GENERATIONS_ORDER).limit(limit).to_list, limit)
+    except (CircuitOpen, mongo.ConnectionFailure):
         # Graceful degradation when DB is offline
         logger.warning("MongoDB unavailable when listing generations; returning empty list")
         return []
 
+    # Documents go out as stored; rebuilding each one as a model costs more than the query
+    headers = {}
+    if len(gens) == limit:
+        next_cursor = encode_cursor(gens[-1]["created_at"], gens[-1]["id"])
+        params = {"limit": limit, "cursor": next_cursor, **({"fields": fields} if fields else {})}
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.path}?{urlencode(params)}>; rel="next"'
+    return JSONResponse(content=gens, headers=headers)
 
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 # Configure logging
 logging.basicConfig(
@@ -344,6 +1193,178 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-@app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await generation_writes.close()
+    await job_states.close()
+    await status_writes.close()
+    await status_rollups.close()
+    await generation_rollups.close()
+    client.close()
+
+
+async def start_generation_jobs():
+    generation_jobs.start()
+    generation_writes.start()
+    job_states.start()
+    status_writes.start()
+    status_rollups.start()
+    generation_rollups.start()
+    artifact_store.start()
+
+
+GENERATIONS_ORDER = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+# (collection, keys, options); created in the background so startup never waits on Mongo
+INDEXES = [
+    ("generations", GENERATIONS_ORDER, {"name": "created_at_id"}),
+    ("generations", [("id", ASCENDING)], {"name": "id", "unique": True}),
+    ("users", [("email", ASCENDING)], {"name": "email", "unique": True}),
+    # Raw checks and minute buckets expire after the same retention
+    ("status_checks", [("ts", ASCENDING)], {"name": "ts_ttl", "expireAfterSeconds": STATUS_CHECK_TTL_SECONDS}),
+    ("status_rollups", [("client_name", ASCENDING), ("minute", ASCENDING)], {"name": "client_minute", "unique": True}),
+    ("status_rollups", [("minute", ASCENDING)], {"name": "minute_ttl", "expireAfterSeconds": STATUS_CHECK_TTL_SECONDS}),
+    ("status_clients", [("client_name", ASCENDING)], {"name": "client_name", "unique": True}),
+    ("status_clients", [("last_seen", DESCENDING)], {"name": "last_seen"}),
+    ("generation_rollups", [("day", ASCENDING), ("provider", ASCENDING)], {"name": "day_provider", "unique": True}),
+    ("generation_descriptions", [("description", ASCENDING)], {"name": "description", "unique": True}),
+    ("generation_descriptions", [("count", DESCENDING), ("description", ASCENDING)], {"name": "count_description"}),
+]
+
+# GET /api/export/{collection}: collection -> (columns, sort order); both orders are served by an index
+EXPORTS = {
+    "generations": (tuple(GenerationRecord.model_fields), GENERATIONS_ORDER),
+    "status_checks": (tuple(StatusCheck.model_fields), [("_id", ASCENDING)]),
+}
+
+
+INDEX_RETRY_MAX_SECONDS = 60
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def ensure_indexes():
+    # Retried until every index exists: the unique ones back duplicate checks (users.email) and upserts
+    await client.connect()
+    pending, delay = list(INDEXES), 1.0
+    while True:
+        failed = []
+        for collection, keys, options in pending:
+            try:
+                await db[collection].create_index(keys, **options)
+            except mongo.PyMongoError as e:
+                logger.warning("Could not create index %s on %s, will retry: %s", options.get("name"), collection, e)
+                failed.append((collection, keys, options))
+        if not failed:
+            return
+        pending = failed
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, INDEX_RETRY_MAX_SECONDS)
+
+
+async def create_indexes():
+    run_in_background(ensure_indexes())
+
+
+async def shutdown_workbook_executor():
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    for record, _, lease in await generation_jobs.stop():
+        # Never started; stored as failed like the interrupted ones, instead of staying queued
+        lease.release()
+        record.status, record.error, record.finished_at = "failed", "Interrupted by server shutdown", now_iso()
+        job_states.add([prepare_for_mongo(record.model_dump())])
+    await artifact_store.close()
+    workbook_executor.shutdown(wait=False)
+    password_executor.shutdown(wait=False)
+
+
+def preload_libraries():
+    for name in LAZY_MODULES:
+        importlib.import_module(name)
+    import motor.motor_asyncio  # noqa: F401
+    import openpyxl.chart  # noqa: F401
+    import openpyxl.writer.excel  # noqa: F401
+    password_context().handler().get_backend()  # loads bcrypt
+    import jose.jwt  # noqa: F401
+
+
+async def prewarm():
+    started = time.perf_counter()
+    if "imports" in PREWARM:
+        await asyncio.to_thread(preload_libraries)
+    if "pool" in PREWARM:
+        # One task per worker makes the pool start every process; each then imports workbook and openpyxl
+        # and renders the workbook template
+        level = COMPRESSION_LEVELS[WORKBOOK_COMPRESSION]
+        results = await asyncio.gather(
+            *(workbook_executor.run(preload_workbook, level, wait=True) for _ in range(WORKBOOK_POOL_SIZE)),
+            return_exceptions=True,
+        )
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            logger.warning("Workbook pool prewarm failed: %r", failed[0])
+    logger.info("Prewarmed %s in %.0f ms", ", ".join(sorted(PREWARM)), (time.perf_counter() - started) * 1000)
+
+
+async def warm_workbook_template():
+    # Streamed workbooks are built in this process; render their Data and Summary sheets in the background
+    # so the first stream does not pay for it (this loads numpy)
+    run_in_background(asyncio.to_thread(workbook_template, COMPRESSION_LEVELS[WORKBOOK_COMPRESSION]))
+
+
+async def report_startup():
+    # Import-time report; python -X importtime or benchmarks/bench_startup.py break it down by module
+    loaded = [m for m in LAZY_MODULES if m in sys.modules]
+    logger.info(
+        "Ready %.0f ms after server import began, %d modules loaded; heavy libraries loaded: %s; not yet: %s",
+        (time.perf_counter() - IMPORT_STARTED) * 1000, len(sys.modules), ", ".join(loaded) or "none",
+        ", ".join(m for m in LAZY_MODULES if m not in loaded) or "none",
+    )
+    if PREWARM:
+        run_in_background(prewarm())
+
+
+def create_app() -> FastAPI:
+    """Builds the ASGI app and fresh shared state for it (uvicorn server:create_app --factory).
+
+    Nothing here connects to MongoDB or loads the heavy libraries; they are
+    imported by the first request that needs them, or by PREWARM. The state
+    is module-global, so one app is served per process.
+    """
+    init_state()
+    app = FastAPI()
+    app.include_router(api_router)
+
+    # Inside CORS so that shed responses still carry CORS headers for browsers
+    app.add_middleware(AdmissionControl, rules=admission_rules, rejections=admission_rejections)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Outermost, so the timing covers CORS handling and the full response body
+    app.add_middleware(RequestMetrics, histogram=http_request_seconds)
+
+    # The template is warmed after the report, which lists the libraries loaded by startup itself
+    for handler in (start_generation_jobs, create_indexes, report_startup, warm_workbook_template):
+        app.add_event_handler("startup", handler)
+    # Jobs and pool work stop first, so what they leave in the write-behind buffers is flushed before the client closes
+    for handler in (shutdown_workbook_executor, shutdown_db_client):
+        app.add_event_handler("shutdown", handler)
+    return app
+
+
+def __getattr__(name: str):
+    # uvicorn server:app; importing this module builds nothing until the app is asked for
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,147 @@
+import csv
+import importlib.util
+import io
+import json
+from typing import Iterator, Optional
+
+from workbook import (
+    DATA_HEADERS, ROW_BATCH, TRANSACTION_HEADERS, XLSX_MEDIA_TYPE, data_rows, transaction_arrays, transaction_columns,
+)
+
+# format -> (media type, file extension)
+FORMATS = {
+    "xlsx": (XLSX_MEDIA_TYPE, "xlsx"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+ACCEPT_TYPES = {
+    XLSX_MEDIA_TYPE: "xlsx",
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonlines": "ndjson",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+PARQUET_ROW_GROUP = 100_000
+
+
+class ParquetUnavailable(RuntimeError):
+    """pyarrow is not installed, so pandas cannot write Parquet."""
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """Picks the most preferred supported format from an Accept header, or None."""
+    best, best_q = None, 0.0
+    for item in (accept or "").split(","):
+        media, _, params = item.strip().partition(";")
+        fmt = ACCEPT_TYPES.get(media.strip().lower())
+        if fmt is None:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = fmt, q
+    return best
+
+
+def check_parquet():
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ParquetUnavailable("Parquet output needs pyarrow, which is not installed")
+
+
+def sheet_batches(sheet: str, rows: int, batch_size: int = ROW_BATCH, arrays: bool = False):
+    """Yields (headers, columns) batches for one sheet; Transactions is not split at Excel's row limit."""
+    if sheet == "data":
+        yield DATA_HEADERS, [list(col) for col in zip(*data_rows())]
+        return
+    columns = transaction_arrays if arrays else transaction_columns
+    for first in range(1, rows + 1, batch_size):
+        yield TRANSACTION_HEADERS, columns(first, min(first + batch_size - 1, rows))
+
+
+def iter_csv(sheet: str, rows: int, batch_size: int = ROW_BATCH) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\r\n")
+    header_done = False
+    for headers, columns in sheet_batches(sheet, rows, batch_size):
+        if not header_done:
+            writer.writerow(headers)
+            header_done = True
+        writer.writerows(zip(*columns))
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+
+
+def iter_ndjson(sheet: str, rows: int, batch_size: int = ROW_BATCH) -> Iterator[bytes]:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for headers, columns in sheet_batches(sheet, rows, batch_size):
+        yield "".join([dumps(dict(zip(headers, row))) + "\n" for row in zip(*columns)]).encode("utf-8")
+
+
+class _ChunkSink:
+    # Write-only file object for pyarrow; each row group can be drained as soon as it is written
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_parquet(sheet: str, rows: int, row_group: int = PARQUET_ROW_GROUP) -> Iterator[bytes]:
+    # Imported here: pandas and pyarrow are heavy and only this format needs them
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for headers, columns in sheet_batches(sheet, rows, row_group, arrays=True):
+        frame = pd.DataFrame({h: np.asarray(c) for h, c in zip(headers, columns)})
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            # pandas has no date dtype; store calendar dates as date32 rather than midnight timestamps
+            schema = pa.schema([
+                pa.field(f.name, pa.date32()) if pa.types.is_timestamp(f.type) else f for f in table.schema
+            ])
+            writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        writer.write_table(table.cast(schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+ITERATORS = {"csv": iter_csv, "ndjson": iter_ndjson, "parquet": iter_parquet}
+
+
+def iter_tabular(fmt: str, sheet: str, rows: int) -> Iterator[bytes]:
+    return ITERATORS[fmt](sheet, rows)
@@ -0,0 +1,464 @@
+import os
+import re
+from io import BytesIO
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+from artifacts import ArtifactStore
+from formulas import evaluate_rows
+from metrics import StageTimer
+from xlsx_writer import (
+    COMPRESSION_LEVELS, DEFAULT_COMPRESSION, CompiledSheet, Formula, LineChartSpec, SheetStream, Style, XlsxStreamWriter,
+)
+
+# Bump whenever the generated layout or content changes; cached workbooks are keyed on it
+TEMPLATE_VERSION = "2"
+TRANSACTION_ROWS = 800
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+CATEGORIES = ["Sales", "Ops", "Marketing", "R&D", "Other", "Support", "Finance", "Legal", "HR", "IT"]
+DATA_HEADERS = ("Month", "Revenue", "Costs", "Profit")
+TRANSACTION_HEADERS = ("Date", "Category", "Amount", "Note", "Reference", "Description")
+TRANSACTION_START = "2025-01-01"
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+STUB_NOTE = "This is an instant stub (no AI yet). We'll use AI in the next step."
+
+# Excel's hard limit is 1,048,576 rows per sheet; one goes to the header
+MAX_SHEET_ROWS = 1_048_576
+SHEET_DATA_ROWS = MAX_SHEET_ROWS - 1
+ROW_BATCH = 10_000
+
+
+def transaction_arrays(first: int, last: int) -> list:
+    """Column arrays for transaction rows first..last (inclusive); dates stay datetime64[D]."""
+    # numpy is imported by the first build, not with this module
+    import numpy as np
+
+    i = np.arange(first, last + 1, dtype=np.int64)
+    n = i.astype(str)
+    dates = np.datetime64(TRANSACTION_START) + (i % 365)
+    categories = np.asarray(CATEGORIES)[i % len(CATEGORIES)]
+    amounts = (i * 7) % 900 + 50
+    notes = np.char.add(np.char.add("Auto-generated transaction row ", n), " with detailed description")
+    refs = np.char.add("REF-", np.char.zfill(n, 6))
+    details = np.char.add(
+        np.char.add("Detailed description for transaction ", n),
+        " including additional context and information to increase file size",
+    )
+    return [dates, categories, amounts, notes, refs, details]
+
+
+def transaction_columns(first: int, last: int) -> list:
+    # tolist() hands the writers plain Python str/int values; dates are written as ISO text
+    dates, *rest = transaction_arrays(first, last)
+    return [dates.astype(str).tolist()] + [col.tolist() for col in rest]
+
+
+def data_sheet_rows() -> list:
+    """Data sheet rows from A1, header included, with Profit as a formula."""
+    return [DATA_HEADERS] + [
+        (m, 18000 + (i - 2) * 1000, 12000 + (i - 2) * 600, f"=B{i}-C{i}") for i, m in enumerate(MONTHS, start=2)
+    ]
+
+
+def summary_sheet_rows() -> list:
+    last = len(MONTHS) + 1
+    return [
+        ("KPI Summary",),
+        (),
+        ("Total Revenue", f"=SUM(Data!B2:B{last})"),
+        ("Total Costs", f"=SUM(Data!C2:C{last})"),
+        ("Total Profit", f"=SUM(Data!D2:D{last})"),
+    ]
+
+
+@lru_cache(maxsize=None)
+def formula_values() -> Dict[str, dict]:
+    """Results of the Data and Summary formulas, {sheet: {(row, col): value}}; they never change, so once per process."""
+    return evaluate_rows({"Data": data_sheet_rows(), "Summary": summary_sheet_rows()})
+
+
+def with_cached_values(row, r: int, values: dict) -> list:
+    # Formula strings become Formula cells carrying their computed result
+    return [
+        Formula(v[1:], values.get((r, c))) if isinstance(v, str) and v.startswith("=") else v
+        for c, v in enumerate(row, start=1)
+    ]
+
+
+def data_rows() -> list:
+    """Data sheet rows with Profit evaluated, for outputs that cannot hold formulas."""
+    values = formula_values()["Data"]
+    return [
+        tuple(cell.value if isinstance(cell, Formula) else cell for cell in with_cached_values(row, r, values))
+        for r, row in enumerate(data_sheet_rows()[1:], start=2)
+    ]
+
+
+def transaction_batches(first: int, last: int, batch_size: int = ROW_BATCH):
+    for start in range(first, last + 1, batch_size):
+        yield list(zip(*transaction_columns(start, min(start + batch_size - 1, last))))
+
+
+def transaction_sheets(rows: int):
+    """Yields (title, first, last) per Transactions sheet, continuing past Excel's row limit."""
+    if rows <= 0:
+        yield "Transactions", 1, 0
+        return
+    for k, first in enumerate(range(1, rows + 1, SHEET_DATA_ROWS)):
+        title = "Transactions" if k == 0 else f"Transactions ({k + 1})"
+        yield title, first, min(first + SHEET_DATA_ROWS - 1, rows)
+
+
+def build_workbook_openpyxl(
+    description: str,
+    rows: int = TRANSACTION_ROWS,
+    timer: Optional[StageTimer] = None,
+    compression: str = DEFAULT_COMPRESSION,
+    threads: int = 1,
+) -> BytesIO:
+    # threads is accepted for a uniform engine signature; zipfile compresses on one thread. Every sheet is
+    # built cell by cell here: workbook_template() only serves the fast engine, streaming and artifact builds
+    # openpyxl is imported on first use: the fast engine, streaming and exports never load it
+    from openpyxl import Workbook
+    from openpyxl.chart import LineChart, Reference
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.writer.excel import ExcelWriter
+
+    timer = timer or StageTimer()
+    wb = Workbook()
+    ws_info = wb.active
+    ws_info.title = "README"
+
+    title_font = Font(bold=True, size=14)
+    subtle = PatternFill(start_color="FFF5F5F7", end_color="FFF5F5F7", fill_type="solid")
+
+    ws_info["A1"] = "Generated Spreadsheet"
+    ws_info["A1"].font = title_font
+    ws_info["A2"] = f"Description: {description}"
+    ws_info["A3"] = f"Generated At: {datetime.now(timezone.utc).isoformat()}"
+    ws_info["A5"] = STUB_NOTE
+    ws_info.column_dimensions['A'].width = 90
+    for r in range(1, 7):
+        ws_info[f"A{r}"].alignment = Alignment(wrap_text=True)
+    ws_info["A1"].fill = subtle
+
+    # Simple model based on keywords
+    ws = wb.create_sheet("Data")
+    ws["A1"], ws["B1"], ws["C1"], ws["D1"] = DATA_HEADERS
+    for cell in ("A1", "B1", "C1", "D1"):
+        ws[cell].font = Font(bold=True)
+    months = MONTHS
+    base_rev = 18000
+    base_cost = 12000
+    for i, m in enumerate(months, start=2):
+        ws[f"A{i}"] = m
+        ws[f"B{i}"] = base_rev + (i - 2) * 1000
+        ws[f"C{i}"] = base_cost + (i - 2) * 600
+        ws[f"D{i}"] = f"=B{i}-C{i}"
+    ws.auto_filter.ref = f"A1:D{len(months)+1}"
+
+    # Summary sheet with totals and a chart
+    ws_sum = wb.create_sheet("Summary")
+    ws_sum["A1"].value = "KPI Summary"
+    ws_sum["A1"].font = title_font
+    ws_sum["A3"].value = "Total Revenue"
+    ws_sum["B3"].value = f"=SUM(Data!B2:B{len(months)+1})"
+    ws_sum["A4"].value = "Total Costs"
+    ws_sum["B4"].value = f"=SUM(Data!C2:C{len(months)+1})"
+    ws_sum["A5"].value = "Total Profit"
+    ws_sum["B5"].value = f"=SUM(Data!D2:D{len(months)+1})"
+    timer.lap("cells")
+
+    chart = LineChart()
+    chart.title = "Revenue vs Costs vs Profit"
+    data = Reference(ws, min_col=2, min_row=1, max_col=4, max_row=len(months)+1)
+    cats = Reference(ws, min_col=1, min_row=2, max_row=len(months)+1)
+    chart.add_data(data, titles_from_data=True)
+    chart.set_categories(cats)
+    chart.height = 12
+    chart.width = 24
+    ws_sum.add_chart(chart, "A7")
+    timer.lap("chart")
+
+    # Additional sheet to increase richness and file size for testing
+    # (800 rows by default, with more columns to ensure file size > 20000 bytes)
+    for title, first, last in transaction_sheets(rows):
+        ws_tx = wb.create_sheet(title)
+        ws_tx.append(TRANSACTION_HEADERS)
+        for cell in ws_tx[1]:
+            cell.font = Font(bold=True)
+        for batch in transaction_batches(first, last):
+            for row in batch:
+                ws_tx.append(row)
+    timer.lap("transactions")
+
+    # Save to bytes; what wb.save does, with the archive's compression under our control
+    level = COMPRESSION_LEVELS[compression]
+    bytes_io = BytesIO()
+    wb.properties.modified = datetime.now(timezone.utc).replace(tzinfo=None)
+    if level == 0:
+        archive = ZipFile(bytes_io, "w", ZIP_STORED, allowZip64=True)
+    else:
+        archive = ZipFile(bytes_io, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=level)
+    values = formula_values()
+    parts = {f"xl/worksheets/sheet{n}.xml": values[ws.title] for n, ws in enumerate(wb.worksheets, start=1) if ws.title in values}
+    ExcelWriter(wb, _CachedValueArchive(archive, parts)).save()
+    bytes_io.seek(0)
+    timer.lap("save")
+    return bytes_io
+
+
+_EMPTY_FORMULA_VALUE = re.compile(rb'(<c r="([A-Z]+)([0-9]+)"[^>]*><f>[^<]*</f>)<v ?/>')
+
+
+def fill_cached_values(xml: bytes, values: dict) -> bytes:
+    """Writes computed results into the empty <v/> openpyxl leaves after each formula."""
+    from openpyxl.utils import column_index_from_string
+
+    def cached(m):
+        value = values.get((int(m.group(3)), column_index_from_string(m.group(2).decode())))
+        return m.group(0) if value is None else m.group(1) + f"<v>{value}</v>".encode()
+    return _EMPTY_FORMULA_VALUE.sub(cached, xml)
+
+
+class _CachedValueArchive:
+    """ZipFile wrapper for ExcelWriter that post-processes the named worksheet parts with fill_cached_values.
+
+    Only the small Data and Summary parts are rewritten; Transactions parts go
+    straight from openpyxl's temp file into the archive.
+    """
+
+    def __init__(self, archive: ZipFile, parts: Dict[str, dict]):
+        self._archive = archive
+        self._parts = parts
+
+    def write(self, filename, arcname=None, *args, **kwargs):
+        values = self._parts.get(arcname)
+        if values is None:
+            return self._archive.write(filename, arcname, *args, **kwargs)
+        with open(filename, "rb") as fh:
+            self._archive.writestr(arcname, fill_cached_values(fh.read(), values))
+
+    def __getattr__(self, name):
+        return getattr(self._archive, name)
+
+
+# -------- Write-only streaming build --------
+
+TITLE_STYLE = Style(bold=True, size=14)
+HEADER_STYLE = Style(bold=True)
+WRAP_STYLE = Style(wrap=True)
+README_TITLE_STYLE = Style(bold=True, size=14, fill="FFF5F5F7", wrap=True)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+DATA_LAST_ROW = len(MONTHS) + 1
+SUMMARY_CHART = LineChartSpec(
+    "Revenue vs Costs vs Profit", "Data", cat_col=1, min_col=2, max_col=4,
+    header_row=1, last_row=DATA_LAST_ROW, anchor_col=0, anchor_row=6, width_cm=24, height_cm=12,
+)
+
+
+def fill_data_sheet(data: SheetStream):
+    values = formula_values()["Data"]
+    header, *rows = data_sheet_rows()
+    data.append(header, style=HEADER_STYLE)
+    for r, row in enumerate(rows, start=2):
+        data.append(with_cached_values(row, r, values))
+
+
+def fill_summary_sheet(summary: SheetStream):
+    values = formula_values()["Summary"]
+    title, *rows = summary_sheet_rows()
+    summary.append(title, style=TITLE_STYLE)
+    for r, row in enumerate(rows, start=2):
+        if row:
+            summary.append(with_cached_values(row, r, values))
+        else:
+            summary.skip()
+
+
+class WorkbookTemplate(NamedTuple):
+    data: CompiledSheet
+    summary: CompiledSheet
+
+
+@lru_cache(maxsize=None)
+def workbook_template(level: int = COMPRESSION_LEVELS[DEFAULT_COMPRESSION]) -> WorkbookTemplate:
+    """The Data and Summary sheets, identical in every workbook, rendered and deflated once per process and level."""
+    xw = XlsxStreamWriter(level)
+    # Index styles in the order write_workbook first uses them so the baked-in indexes line up
+    for style in (README_TITLE_STYLE, WRAP_STYLE):
+        xw.styles.index(style)
+    data = xw.compile_sheet("Data", fill_data_sheet, autofilter=f"A1:D{DATA_LAST_ROW}")
+    summary = xw.compile_sheet("Summary", fill_summary_sheet, chart=SUMMARY_CHART)
+    return WorkbookTemplate(data, summary)
+
+
+def write_workbook(
+    xw: XlsxStreamWriter,
+    description: str,
+    rows: int = TRANSACTION_ROWS,
+    timer: Optional[StageTimer] = None,
+    precompiled: bool = True,
+):
+    """Writes the same layout as build_workbook through a write-only writer.
+
+    Only README and Transactions are rendered here; Data and Summary come
+    precompressed from workbook_template(), or are rendered like the rest
+    with ``precompiled`` off (the reference the template must match).
+    Yields after every few rows so the caller can drain output in between; a
+    True value marks a sheet boundary, where draining is always worthwhile.
+    Stage laps include the caller's draining, i.e. compression of that part.
+    """
+    timer = timer or StageTimer()
+    template = workbook_template(xw.zip.level) if precompiled else None
+    info = xw.add_sheet("README", col_widths={1: 90})
+    info.append(["Generated Spreadsheet"], style=README_TITLE_STYLE)
+    info.append([f"Description: {description}"], style=WRAP_STYLE)
+    info.append([f"Generated At: {datetime.now(timezone.utc).isoformat()}"], style=WRAP_STYLE)
+    info.append([None], style=WRAP_STYLE)
+    info.append([STUB_NOTE], style=WRAP_STYLE)
+    info.append([None], style=WRAP_STYLE)
+    yield True
+
+    if template is not None:
+        xw.add_compiled_sheet(template.data)
+        xw.add_compiled_sheet(template.summary)
+    else:
+        fill_data_sheet(xw.add_sheet("Data"))
+        xw.set_autofilter(f"A1:D{DATA_LAST_ROW}")
+        fill_summary_sheet(xw.add_sheet("Summary"))
+        xw.add_line_chart(SUMMARY_CHART)
+    timer.lap("cells")
+    yield True
+
+    for title, first, last in transaction_sheets(rows):
+        tx = xw.add_sheet(title)
+        tx.append(TRANSACTION_HEADERS, style=HEADER_STYLE)
+        for batch in transaction_batches(first, last, batch_size=1_000):
+            tx.extend(batch)
+            yield False
+        yield True
+    timer.lap("transactions")
+
+
+def iter_workbook(
+    description: str,
+    rows: int = TRANSACTION_ROWS,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    compression: str = DEFAULT_COMPRESSION,
+    threads: int = 1,
+    timer: Optional[StageTimer] = None,
+):
+    # Peak memory is bounded by chunk_size plus compressor state, whatever the row count
+    xw = XlsxStreamWriter(COMPRESSION_LEVELS[compression], threads=threads)
+    for boundary in write_workbook(xw, description, rows, timer):
+        if xw.buffered >= chunk_size or (boundary and xw.buffered):
+            yield xw.drain()
+    xw.close()
+    yield xw.drain()
+
+
+def build_workbook_fast(
+    description: str,
+    rows: int = TRANSACTION_ROWS,
+    timer: Optional[StageTimer] = None,
+    compression: str = DEFAULT_COMPRESSION,
+    threads: int = 1,
+) -> BytesIO:
+    # Same layout as build_workbook_openpyxl, serialized straight to XML with shared strings
+    timer = timer or StageTimer()
+    xw = XlsxStreamWriter(COMPRESSION_LEVELS[compression], shared_strings=True, threads=threads)
+    bytes_io = BytesIO()
+    for _ in write_workbook(xw, description, rows, timer):
+        if xw.buffered >= STREAM_CHUNK_SIZE:
+            bytes_io.write(xw.drain())
+    xw.close()
+    bytes_io.write(xw.drain())
+    bytes_io.seek(0)
+    timer.lap("save")
+    return bytes_io
+
+
+def build_workbook_artifact(
+    directory: str,
+    description: str,
+    rows: int = TRANSACTION_ROWS,
+    compression: str = DEFAULT_COMPRESSION,
+    threads: int = 1,
+):
+    """Streams a workbook straight into the artifact store in ``directory``, for builds too large to hold in memory.
+
+    Entry point for the process pool like build_workbook_timed; returns the
+    artifact name (None if it could not be stored), its size and the stage
+    seconds.
+    """
+    timer = StageTimer()
+    artifact = ArtifactStore(directory).writer(".xlsx")
+    for _ in artifact.tee(iter_workbook(description, rows, compression=compression, threads=threads, timer=timer)):
+        pass
+    name = artifact.commit()
+    timer.lap("save")
+    return name, artifact.size, timer.stages
+
+
+def preload(level: Optional[int] = None) -> int:
+    """Imports what the openpyxl engine loads on first use; run in pool workers by PREWARM=pool.
+
+    With ``level``, also renders workbook_template() for it, which the fast
+    engine and artifact builds would otherwise do on their first workbook.
+    """
+    import numpy  # noqa: F401
+    import openpyxl.chart  # noqa: F401
+    import openpyxl.styles  # noqa: F401
+    import openpyxl.writer.excel  # noqa: F401
+    if level is not None:
+        workbook_template(level)
+    return os.getpid()
+
+
+# -------- Engine switch --------
+
+ENGINES = {
+    "openpyxl": build_workbook_openpyxl,
+    "fast": build_workbook_fast,
+}
+# fast reuses the precompiled Data and Summary sheets; openpyxl renders every cell of every build
+DEFAULT_ENGINE = "fast"
+
+
+def build_workbook(
+    description: str,
+    engine: str = DEFAULT_ENGINE,
+    rows: int = TRANSACTION_ROWS,
+    timer: Optional[StageTimer] = None,
+    compression: str = DEFAULT_COMPRESSION,
+    threads: int = 1,
+) -> BytesIO:
+    try:
+        builder = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown workbook engine: {engine}")
+    if compression not in COMPRESSION_LEVELS:
+        raise ValueError(f"Unknown compression: {compression}")
+    return builder(description, rows, timer, compression, threads)
+
+
+def build_workbook_bytes(
+    description: str, engine: str = DEFAULT_ENGINE, rows: int = TRANSACTION_ROWS, compression: str = DEFAULT_COMPRESSION,
+) -> bytes:
+    return build_workbook(description, engine, rows, compression=compression).getvalue()
+
+
+def build_workbook_timed(
+    description: str,
+    engine: str = DEFAULT_ENGINE,
+    rows: int = TRANSACTION_ROWS,
+    compression: str = DEFAULT_COMPRESSION,
+    threads: int = 1,
+):
+    # Entry point for the process pool: plain bytes and a dict of stage seconds pickle cheaply
+    timer = StageTimer()
+    data = build_workbook(description, engine, rows, timer, compression, threads).getvalue()
+    return data, timer.stages
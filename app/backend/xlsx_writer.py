@@ -0,0 +1,713 @@
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# ====== ZIP container ======
+
+ZIP_STORED = 0  # method id for uncompressed members
+
+# Compression policies. "stored" is deflate level 0: members keep the DEFLATE method
+# (plain stored blocks) because streamed members cannot declare STORED sizes up front
+COMPRESSION_LEVELS = {"stored": 0, "fast": 1, "default": 6, "max": 9}
+DEFAULT_COMPRESSION = "default"
+
+# Members larger than this are split into blocks deflated on separate threads
+PARALLEL_BLOCK_SIZE = 1024 * 1024
+_WINDOW = 32 * 1024
+_deflate_pool: Optional[ThreadPoolExecutor] = None
+_deflate_pool_size = 0
+_deflate_pool_lock = threading.Lock()
+
+
+def _get_deflate_pool(threads: int) -> ThreadPoolExecutor:
+    global _deflate_pool, _deflate_pool_size
+    with _deflate_pool_lock:
+        if _deflate_pool is None or _deflate_pool_size < threads:
+            # A larger pool replaces the old one; its queued blocks still finish, then its threads exit
+            if _deflate_pool is not None:
+                _deflate_pool.shutdown(wait=False)
+            _deflate_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="deflate")
+            _deflate_pool_size = threads
+        return _deflate_pool
+
+
+def _deflate_block(data: bytes, level: int, zdict: bytes, final: bool) -> bytes:
+    # zlib releases the GIL while compressing. Priming with the previous block's
+    # tail keeps the ratio close to a single stream. A sync flush ends each block
+    # on a byte boundary without the final bit, so the blocks simply concatenate.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+        zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompiledPart(NamedTuple):
+    """A member body deflated ahead of time, for ``ZipStream.write_compiled``."""
+
+    data: bytes
+    crc: int
+    size: int
+
+
+def compile_part(payload: bytes, level: int = zlib.Z_DEFAULT_COMPRESSION) -> CompiledPart:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return CompiledPart(compressor.compress(payload) + compressor.flush(), zlib.crc32(payload), len(payload))
+
+
+class _ZipEntry:
+    def __init__(self, name: str, offset: int, method: int, flags: int):
+        self.name = name.encode("utf-8")
+        self.offset = offset
+        self.method = method
+        self.flags = flags
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+
+class ZipStream:
+    """Write-only ZIP archive that never seeks.
+
+    Each member uses a trailing data descriptor, so its header can be emitted
+    before the content is known and bytes can be handed to the client as soon
+    as they are compressed. Output accumulates in an internal buffer that the
+    caller empties with ``drain()``.
+
+    With ``threads`` > 1, members are cut into PARALLEL_BLOCK_SIZE blocks that
+    are deflated concurrently and emitted in order; small members never fill a
+    block and are compressed inline as before.
+    """
+
+    def __init__(self, level: int = zlib.Z_DEFAULT_COMPRESSION, threads: int = 1):
+        self.level = level
+        self.threads = threads if level != 0 else 1
+        self._block = bytearray()
+        self._blocks: deque = deque()
+        self._zdict = b""
+        self._buf = bytearray()
+        self._offset = 0
+        self._entries: List[_ZipEntry] = []
+        self._current: Optional[_ZipEntry] = None
+        self._compressor = None
+        t = time.localtime()
+        self._dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        self._dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf)
+
+    @property
+    def bytes_written(self) -> int:
+        return self._offset + len(self._buf)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._offset += len(data)
+        self._buf.clear()
+        return data
+
+    def _emit(self, data: bytes):
+        self._buf += data
+        if self._current is not None:
+            self._current.compressed_size += len(data)
+
+    def open(self, name: str):
+        if self._current is not None:
+            raise RuntimeError(f"ZIP member {self._current.name!r} is still open")
+        # flag 0x08: sizes and CRC follow in a data descriptor; 0x800: UTF-8 names
+        entry = _ZipEntry(name, self.bytes_written, zlib.DEFLATED, 0x0808)
+        self._local_header(entry)
+        self._current = entry
+        if self.threads > 1:
+            self._zdict = b""
+        else:
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+
+    def _local_header(self, entry: _ZipEntry):
+        self._buf += struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 20, entry.flags, entry.method,
+            self._dos_time, self._dos_date, entry.crc, entry.compressed_size, entry.size,
+            len(entry.name), 0,
+        ) + entry.name
+
+    def write(self, data: bytes):
+        entry = self._current
+        entry.crc = zlib.crc32(data, entry.crc)
+        entry.size += len(data)
+        if self.threads > 1:
+            self._block += data
+            if len(self._block) >= PARALLEL_BLOCK_SIZE:
+                self._submit_block(final=False)
+            return
+        out = self._compressor.compress(data)
+        if out:
+            self._emit(out)
+
+    def _submit_block(self, final: bool):
+        block = bytes(self._block)
+        self._block.clear()
+        pool = _get_deflate_pool(self.threads)
+        self._blocks.append(pool.submit(_deflate_block, block, self.level, self._zdict, final))
+        self._zdict = block[-_WINDOW:]
+        # Emit finished blocks in order; cap the blocks in flight so memory stays bounded
+        while self._blocks and (self._blocks[0].done() or len(self._blocks) > self.threads * 2):
+            self._emit(self._blocks.popleft().result())
+
+    def close_entry(self):
+        entry = self._current
+        if self.threads > 1:
+            if self._blocks:
+                self._submit_block(final=True)
+                while self._blocks:
+                    self._emit(self._blocks.popleft().result())
+            else:
+                # Earlier blocks may all be emitted already; the last one is still primed with their tail
+                self._emit(_deflate_block(bytes(self._block), self.level, self._zdict, True))
+                self._block.clear()
+        else:
+            self._emit(self._compressor.flush())
+        self._current = None
+        self._compressor = None
+        if entry.size > 0xFFFFFFFF or entry.compressed_size > 0xFFFFFFFF:
+            raise ValueError(f"ZIP member {entry.name!r} exceeds 4 GiB")
+        self._buf += struct.pack("<IIII", 0x08074B50, entry.crc, entry.compressed_size, entry.size)
+        self._entries.append(entry)
+
+    def writestr(self, name: str, data: bytes, compress: bool = True):
+        if compress:
+            self.open(name)
+            self.write(data)
+            self.close_entry()
+            return
+        # Stored members (already-compressed payloads) have known sizes up front
+        self._write_sized(name, ZIP_STORED, data, zlib.crc32(data), len(data))
+
+    def write_compiled(self, name: str, part: CompiledPart):
+        # Splices in a body deflated once by compile_part; no compression work per archive
+        self._write_sized(name, zlib.DEFLATED, part.data, part.crc, part.size)
+
+    def _write_sized(self, name: str, method: int, data: bytes, crc: int, size: int):
+        if self._current is not None:
+            raise RuntimeError(f"ZIP member {self._current.name!r} is still open")
+        if len(data) > 0xFFFFFFFF or size > 0xFFFFFFFF:
+            raise ValueError(f"ZIP member {name!r} exceeds 4 GiB")
+        entry = _ZipEntry(name, self.bytes_written, method, 0x0800)
+        entry.crc = crc
+        entry.compressed_size = len(data)
+        entry.size = size
+        self._local_header(entry)
+        self._buf += data
+        self._entries.append(entry)
+
+    def close(self):
+        start = self.bytes_written
+        for e in self._entries:
+            self._buf += struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, e.flags, e.method,
+                self._dos_time, self._dos_date, e.crc, e.compressed_size, e.size,
+                len(e.name), 0, 0, 0, 0, 0, e.offset,
+            ) + e.name
+        size = self.bytes_written - start
+        if start > 0xFFFFFFFF:
+            raise ValueError("ZIP archive exceeds 4 GiB")
+        self._buf += struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(self._entries), len(self._entries), size, start, 0,
+        )
+
+
+# ====== Cells and styles ======
+
+class Style(NamedTuple):
+    bold: bool = False
+    size: Optional[float] = None
+    fill: Optional[str] = None  # ARGB, e.g. "FFF5F5F7"
+    wrap: bool = False
+
+
+DEFAULT_STYLE = Style()
+
+
+class Formula(NamedTuple):
+    """A formula cell with its cached result, which readers see without recalculating."""
+
+    text: str  # without the leading "="
+    value: Optional[float] = None
+
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def xml_escape(value: str) -> str:
+    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return _ILLEGAL_XML.sub("", value)
+
+
+def column_letter(idx: int) -> str:
+    # 1-based column index to A, B, ..., Z, AA, ...
+    letters = ""
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+_COLUMNS = [column_letter(i) for i in range(1, 65)]
+
+
+class StyleTable:
+    """Deduplicates cell formats into the fonts/fills/cellXfs lists of styles.xml."""
+
+    def __init__(self):
+        self._fonts: Dict[Tuple[bool, Optional[float]], int] = {(False, None): 0}
+        self._fills: Dict[Optional[str], int] = {None: 0, "gray125": 1}
+        self._xfs: Dict[Tuple[int, int, bool], int] = {(0, 0, False): 0}
+        self._cache: Dict[Style, int] = {DEFAULT_STYLE: 0}
+
+    def index(self, style: Style) -> int:
+        idx = self._cache.get(style)
+        if idx is None:
+            font = self._fonts.setdefault((style.bold, style.size), len(self._fonts))
+            fill = self._fills.setdefault(style.fill, len(self._fills))
+            idx = self._xfs.setdefault((font, fill, style.wrap), len(self._xfs))
+            self._cache[style] = idx
+        return idx
+
+    def indexes(self) -> Tuple[Tuple[Style, int], ...]:
+        return tuple(self._cache.items())
+
+    def to_xml(self) -> bytes:
+        fonts = []
+        for bold, size in self._fonts:
+            if (bold, size) == (False, None):
+                fonts.append('<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>')
+            else:
+                fonts.append(
+                    "<font>" + ('<b val="1"/>' if bold else "") + f'<sz val="{size or 11}"/>'
+                    '<name val="Calibri"/><family val="2"/></font>'
+                )
+        fills = []
+        for fill in self._fills:
+            if fill is None:
+                fills.append('<fill><patternFill patternType="none"/></fill>')
+            elif fill == "gray125":
+                fills.append('<fill><patternFill patternType="gray125"/></fill>')
+            else:
+                fills.append(
+                    f'<fill><patternFill patternType="solid"><fgColor rgb="{fill}"/>'
+                    f'<bgColor rgb="{fill}"/></patternFill></fill>'
+                )
+        xfs = []
+        for font, fill, wrap in self._xfs:
+            attrs = f'numFmtId="0" fontId="{font}" fillId="{fill}" borderId="0" xfId="0"'
+            if font:
+                attrs += ' applyFont="1"'
+            if fill:
+                attrs += ' applyFill="1"'
+            if wrap:
+                xfs.append(f'<xf {attrs} applyAlignment="1"><alignment wrapText="1"/></xf>')
+            else:
+                xfs.append(f"<xf {attrs}/>")
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<fonts count="{len(fonts)}">{"".join(fonts)}</fonts>'
+            f'<fills count="{len(fills)}">{"".join(fills)}</fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            f'<cellXfs count="{len(xfs)}">{"".join(xfs)}</cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            "</styleSheet>"
+        ).encode("utf-8")
+
+
+# ====== Workbook package ======
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_PREFIX = "application/vnd.openxmlformats-officedocument"
+XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+class LineChartSpec(NamedTuple):
+    title: str
+    source_sheet: str
+    cat_col: int  # categories, one-based column
+    min_col: int  # first series column
+    max_col: int  # last series column
+    header_row: int  # series titles; values follow down to last_row
+    last_row: int
+    anchor_col: int = 0  # zero-based
+    anchor_row: int = 0  # zero-based
+    width_cm: float = 15.0
+    height_cm: float = 7.5
+
+
+class _SheetInfo(NamedTuple):
+    name: str
+    autofilter: Optional[str]
+    chart: Optional[int]
+
+
+class CompiledSheet(NamedTuple):
+    """A worksheet rendered and deflated once, added to any number of workbooks."""
+
+    name: str
+    part: CompiledPart
+    autofilter: Optional[str]
+    chart: Optional[LineChartSpec]
+    # Style indexes baked into the XML; the target writer must assign the same ones
+    styles: Tuple[Tuple[Style, int], ...]
+
+
+def _inline_string_cell(ref: str, s_attr: str, value: str) -> str:
+    space = ' xml:space="preserve"' if value != value.strip() else ""
+    return f'<c r="{ref}"{s_attr} t="inlineStr"><is><t{space}>{xml_escape(value)}</t></is></c>'
+
+
+class SheetStream:
+    """Appends rows to one worksheet part of an ``XlsxStreamWriter``."""
+
+    def __init__(
+        self,
+        writer: "XlsxStreamWriter",
+        name: str,
+        write: Optional[Callable[[bytes], None]] = None,
+        formulas: bool = True,
+    ):
+        self._writer = writer
+        self._write = write or writer.zip.write
+        # Compiled sheets outlive any one shared-strings table, so they keep strings inline
+        self._string_cell = writer._string_cell if write is None else _inline_string_cell
+        self.name = name
+        # Off for untrusted text, so a value like "=HYPERLINK(...)" stays a string
+        self.formulas = formulas
+        self.row_count = 0
+
+    def append(self, values: Sequence, styles: Optional[Sequence[Optional[Style]]] = None, style: Optional[Style] = None):
+        self._write(self._row_xml(values, styles, style).encode("utf-8"))
+
+    def extend(self, rows: Iterable[Sequence], style: Optional[Style] = None):
+        # One compressor call per batch instead of per row
+        self._write("".join([self._row_xml(values, None, style) for values in rows]).encode("utf-8"))
+
+    def _row_xml(self, values: Sequence, styles: Optional[Sequence[Optional[Style]]], style: Optional[Style]) -> str:
+        self.row_count += 1
+        r = self.row_count
+        parts = [f'<row r="{r}">']
+        style_index = self._writer.styles.index
+        default_s = style_index(style) if style else 0
+        for i, value in enumerate(values):
+            cell_style = styles[i] if styles is not None and i < len(styles) else None
+            s = style_index(cell_style) if cell_style else default_s
+            s_attr = f' s="{s}"' if s else ""
+            ref = (_COLUMNS[i] if i < 64 else column_letter(i + 1)) + str(r)
+            if value is None:
+                if s:
+                    parts.append(f'<c r="{ref}"{s_attr}/>')
+            elif isinstance(value, bool):
+                parts.append(f'<c r="{ref}"{s_attr} t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float)):
+                parts.append(f'<c r="{ref}"{s_attr}><v>{value}</v></c>')
+            elif self.formulas and isinstance(value, str) and value.startswith("="):
+                parts.append(f'<c r="{ref}"{s_attr}><f>{xml_escape(value[1:])}</f></c>')
+            elif type(value) is Formula:
+                cached = "" if value.value is None else f"<v>{value.value}</v>"
+                parts.append(f'<c r="{ref}"{s_attr}><f>{xml_escape(value.text)}</f>{cached}</c>')
+            else:
+                parts.append(self._string_cell(ref, s_attr, str(value)))
+        parts.append("</row>")
+        return "".join(parts)
+
+    def skip(self, count: int = 1):
+        self.row_count += count
+
+
+class XlsxStreamWriter:
+    """Write-only XLSX writer that emits ZIP bytes while rows are produced.
+
+    Sheets are written one after another; only the open sheet's compressor
+    state and the not-yet-drained output are held in memory, so memory use does
+    not grow with the row count. Strings are written inline unless
+    ``shared_strings`` is set; the table then holds at most
+    ``max_shared_strings`` distinct strings, and strings first seen after it
+    is full are written inline.
+    """
+
+    def __init__(
+        self,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        shared_strings: bool = False,
+        threads: int = 1,
+        max_shared_strings: int = 100_000,
+    ):
+        self.zip = ZipStream(level, threads)
+        self.styles = StyleTable()
+        # A shared-strings table shrinks repetitive text but grows with the number
+        # of distinct strings, so streaming callers keep strings inline
+        self._sst: Optional[Dict[str, int]] = {} if shared_strings else None
+        self.max_shared_strings = max_shared_strings
+        self._sst_refs = 0
+        self._sheets: List[_SheetInfo] = []
+        self._charts: List[LineChartSpec] = []
+        self._open: Optional[SheetStream] = None
+        self._autofilter: Optional[str] = None
+        self._chart: Optional[int] = None
+
+    @property
+    def buffered(self) -> int:
+        return self.zip.buffered
+
+    def drain(self) -> bytes:
+        return self.zip.drain()
+
+    def _string_cell(self, ref: str, s_attr: str, value: str) -> str:
+        if self._sst is not None:
+            idx = self._sst.get(value)
+            if idx is None and len(self._sst) < self.max_shared_strings:
+                idx = self._sst[value] = len(self._sst)
+            if idx is not None:
+                self._sst_refs += 1
+                return f'<c r="{ref}"{s_attr} t="s"><v>{idx}</v></c>'
+        return _inline_string_cell(ref, s_attr, value)
+
+    def add_sheet(self, name: str, col_widths: Optional[Dict[int, float]] = None, formulas: bool = True) -> SheetStream:
+        if self._open is not None:
+            self.close_sheet()
+        index = len(self._sheets) + 1
+        self.zip.open(f"xl/worksheets/sheet{index}.xml")
+        self.zip.write(_sheet_head(col_widths))
+        self._open = SheetStream(self, name, formulas=formulas)
+        self._autofilter = None
+        self._chart = None
+        return self._open
+
+    def compile_sheet(
+        self,
+        name: str,
+        fill: Callable[[SheetStream], None],
+        col_widths: Optional[Dict[int, float]] = None,
+        autofilter: Optional[str] = None,
+        chart: Optional[LineChartSpec] = None,
+    ) -> CompiledSheet:
+        """Renders a sheet whose content never changes, for ``add_compiled_sheet``.
+
+        ``fill`` appends the rows. Styles are indexed in this writer's table,
+        so compile against a writer that has seen the same styles, in the same
+        order, as the writers the sheet will be added to.
+        """
+        chunks = [_sheet_head(col_widths)]
+        fill(SheetStream(self, name, write=chunks.append))
+        chunks.append(_sheet_tail(autofilter, chart is not None))
+        return CompiledSheet(name, compile_part(b"".join(chunks), self.zip.level), autofilter, chart, self.styles.indexes())
+
+    def add_compiled_sheet(self, sheet: CompiledSheet):
+        if self._open is not None:
+            self.close_sheet()
+        if any(self.styles.index(style) != idx for style, idx in sheet.styles):
+            raise ValueError(f"Compiled sheet {sheet.name!r} was built against a different style table")
+        chart = None
+        if sheet.chart is not None:
+            self._charts.append(sheet.chart)
+            chart = len(self._charts)
+        self.zip.write_compiled(f"xl/worksheets/sheet{len(self._sheets) + 1}.xml", sheet.part)
+        self._sheets.append(_SheetInfo(sheet.name, sheet.autofilter, chart))
+
+    def set_autofilter(self, ref: str):
+        self._autofilter = ref
+
+    def add_line_chart(self, spec: LineChartSpec):
+        self._charts.append(spec)
+        self._chart = len(self._charts)
+
+    def close_sheet(self):
+        sheet = self._open
+        self.zip.write(_sheet_tail(self._autofilter, bool(self._chart)))
+        self.zip.close_entry()
+        self._sheets.append(_SheetInfo(sheet.name, self._autofilter, self._chart))
+        self._open = None
+
+    def close(self):
+        if self._open is not None:
+            self.close_sheet()
+        # Everything below but sharedStrings depends only on the layout, so it is
+        # deflated once per distinct payload and spliced in afterwards
+        for n, sheet in enumerate(self._sheets, start=1):
+            if sheet.chart:
+                self._write_static(
+                    f"xl/worksheets/_rels/sheet{n}.xml.rels",
+                    _relationships([(f"{NS_REL}/drawing", f"../drawings/drawing{sheet.chart}.xml")]),
+                )
+        for n, spec in enumerate(self._charts, start=1):
+            self._write_static(f"xl/drawings/drawing{n}.xml", _drawing_xml(spec))
+            self._write_static(
+                f"xl/drawings/_rels/drawing{n}.xml.rels",
+                _relationships([(f"{NS_REL}/chart", f"../charts/chart{n}.xml")]),
+            )
+            self._write_static(f"xl/charts/chart{n}.xml", _chart_xml(spec))
+        if self._sst is not None:
+            self.zip.writestr("xl/sharedStrings.xml", self._shared_strings_xml())
+        self._write_static("xl/styles.xml", self.styles.to_xml())
+        self._write_static("xl/workbook.xml", self._workbook_xml())
+        rels = [(f"{NS_REL}/worksheet", f"worksheets/sheet{n}.xml") for n in range(1, len(self._sheets) + 1)]
+        rels.append((f"{NS_REL}/styles", "styles.xml"))
+        if self._sst is not None:
+            rels.append((f"{NS_REL}/sharedStrings", "sharedStrings.xml"))
+        self._write_static("xl/_rels/workbook.xml.rels", _relationships(rels))
+        self._write_static("_rels/.rels", _relationships([(f"{NS_REL}/officeDocument", "xl/workbook.xml")]))
+        self._write_static("[Content_Types].xml", self._content_types())
+        self.zip.close()
+
+    def _write_static(self, name: str, payload: bytes):
+        key = (payload, self.zip.level)
+        part = _STATIC_PARTS.get(key)
+        if part is None:
+            if len(_STATIC_PARTS) >= STATIC_PARTS_MAX:
+                _STATIC_PARTS.clear()
+            part = _STATIC_PARTS[key] = compile_part(payload, self.zip.level)
+        self.zip.write_compiled(name, part)
+
+    def _shared_strings_xml(self) -> bytes:
+        items = []
+        for value in self._sst:
+            space = ' xml:space="preserve"' if value != value.strip() else ""
+            items.append(f"<si><t{space}>{xml_escape(value)}</t></si>")
+        return (
+            f'{XML_DECL}<sst xmlns="{NS_MAIN}" count="{self._sst_refs}" uniqueCount="{len(self._sst)}">'
+            f'{"".join(items)}</sst>'
+        ).encode("utf-8")
+
+    def _workbook_xml(self) -> bytes:
+        sheets = "".join(
+            f'<sheet name="{xml_escape(s.name)}" sheetId="{n}" r:id="rId{n}"/>'
+            for n, s in enumerate(self._sheets, start=1)
+        )
+        names = "".join(
+            f'<definedName name="_xlnm._FilterDatabase" localSheetId="{n}" hidden="1">'
+            f"{_quote_sheet(s.name)}!{_absolute(s.autofilter)}</definedName>"
+            for n, s in enumerate(self._sheets) if s.autofilter
+        )
+        return (
+            f'{XML_DECL}<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><sheets>{sheets}</sheets>'
+            + (f"<definedNames>{names}</definedNames>" if names else "")
+            + '<calcPr calcId="124519" fullCalcOnLoad="1"/></workbook>'
+        ).encode("utf-8")
+
+    def _content_types(self) -> bytes:
+        overrides = [("/xl/workbook.xml", f"{CT_PREFIX}.spreadsheetml.sheet.main+xml"),
+                     ("/xl/styles.xml", f"{CT_PREFIX}.spreadsheetml.styles+xml")]
+        overrides += [(f"/xl/worksheets/sheet{n}.xml", f"{CT_PREFIX}.spreadsheetml.worksheet+xml")
+                      for n in range(1, len(self._sheets) + 1)]
+        if self._sst is not None:
+            overrides.append(("/xl/sharedStrings.xml", f"{CT_PREFIX}.spreadsheetml.sharedStrings+xml"))
+        for n in range(1, len(self._charts) + 1):
+            overrides.append((f"/xl/drawings/drawing{n}.xml", f"{CT_PREFIX}.drawing+xml"))
+            overrides.append((f"/xl/charts/chart{n}.xml", f"{CT_PREFIX}.drawingml.chart+xml"))
+        body = "".join(f'<Override PartName="{p}" ContentType="{ct}"/>' for p, ct in overrides)
+        return (
+            f'{XML_DECL}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Default Extension="xml" ContentType="application/xml"/>{body}</Types>'
+        ).encode("utf-8")
+
+
+# Deflated package parts keyed by (payload, level); a handful per distinct layout
+STATIC_PARTS_MAX = 256
+_STATIC_PARTS: Dict[Tuple[bytes, int], CompiledPart] = {}
+
+
+def _sheet_head(col_widths: Optional[Dict[int, float]]) -> bytes:
+    head = [XML_DECL, f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">']
+    if col_widths:
+        head.append("<cols>")
+        for col, width in sorted(col_widths.items()):
+            head.append(f'<col min="{col}" max="{col}" width="{width}" customWidth="1"/>')
+        head.append("</cols>")
+    head.append("<sheetData>")
+    return "".join(head).encode("utf-8")
+
+
+def _sheet_tail(autofilter: Optional[str], chart: bool) -> bytes:
+    tail = ["</sheetData>"]
+    if autofilter:
+        tail.append(f'<autoFilter ref="{autofilter}"/>')
+    tail.append('<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>')
+    if chart:
+        tail.append('<drawing r:id="rId1"/>')
+    tail.append("</worksheet>")
+    return "".join(tail).encode("utf-8")
+
+
+def _relationships(rels: List[Tuple[str, str]]) -> bytes:
+    body = "".join(
+        f'<Relationship Id="rId{n}" Type="{kind}" Target="{target}"/>'
+        for n, (kind, target) in enumerate(rels, start=1)
+    )
+    return f'{XML_DECL}<Relationships xmlns="{NS_PKG_REL}">{body}</Relationships>'.encode("utf-8")
+
+
+def _quote_sheet(name: str) -> str:
+    return "'" + name.replace("'", "''") + "'"
+
+
+def _absolute(ref: str) -> str:
+    return ":".join(re.sub(r"([A-Z]+)(\d+)", r"$\1$\2", part) for part in ref.split(":"))
+
+
+def _drawing_xml(spec: LineChartSpec) -> bytes:
+    cx, cy = int(spec.width_cm * 360000), int(spec.height_cm * 360000)
+    return (
+        f'{XML_DECL}<xdr:wsDr xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing" '
+        'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+        'xmlns:c="http://schemas.openxmlformats.org/drawingml/2006/chart" '
+        f'xmlns:r="{NS_REL}"><xdr:oneCellAnchor>'
+        f"<xdr:from><xdr:col>{spec.anchor_col}</xdr:col><xdr:colOff>0</xdr:colOff>"
+        f"<xdr:row>{spec.anchor_row}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>"
+        f'<xdr:ext cx="{cx}" cy="{cy}"/><xdr:graphicFrame macro="">'
+        '<xdr:nvGraphicFramePr><xdr:cNvPr id="1" name="Chart 1"/><xdr:cNvGraphicFramePr/></xdr:nvGraphicFramePr>'
+        '<xdr:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/></xdr:xfrm><a:graphic>'
+        '<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/chart">'
+        '<c:chart r:id="rId1"/></a:graphicData></a:graphic></xdr:graphicFrame>'
+        "<xdr:clientData/></xdr:oneCellAnchor></xdr:wsDr>"
+    ).encode("utf-8")
+
+
+def _chart_xml(spec: LineChartSpec) -> bytes:
+    src = _quote_sheet(spec.source_sheet)
+    first, last = spec.header_row + 1, spec.last_row
+    cat_col = column_letter(spec.cat_col)
+    series = []
+    for n, col in enumerate(range(spec.min_col, spec.max_col + 1)):
+        letter = column_letter(col)
+        series.append(
+            f'<c:ser><c:idx val="{n}"/><c:order val="{n}"/>'
+            f"<c:tx><c:strRef><c:f>{src}!${letter}${spec.header_row}</c:f></c:strRef></c:tx>"
+            '<c:marker><c:symbol val="none"/></c:marker>'
+            f"<c:cat><c:strRef><c:f>{src}!${cat_col}${first}:${cat_col}${last}</c:f></c:strRef></c:cat>"
+            f"<c:val><c:numRef><c:f>{src}!${letter}${first}:${letter}${last}</c:f></c:numRef></c:val>"
+            '<c:smooth val="0"/></c:ser>'
+        )
+    return (
+        f'{XML_DECL}<c:chartSpace xmlns:c="http://schemas.openxmlformats.org/drawingml/2006/chart" '
+        f'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" xmlns:r="{NS_REL}"><c:chart>'
+        "<c:title><c:tx><c:rich><a:bodyPr/><a:p><a:pPr><a:defRPr/></a:pPr>"
+        f"<a:r><a:t>{xml_escape(spec.title)}</a:t></a:r></a:p></c:rich></c:tx>"
+        '<c:overlay val="0"/></c:title><c:autoTitleDeleted val="0"/><c:plotArea><c:layout/>'
+        f'<c:lineChart><c:grouping val="standard"/><c:varyColors val="0"/>{"".join(series)}'
+        '<c:marker val="1"/><c:axId val="10"/><c:axId val="100"/></c:lineChart>'
+        '<c:catAx><c:axId val="10"/><c:scaling><c:orientation val="minMax"/></c:scaling>'
+        '<c:delete val="0"/><c:axPos val="b"/><c:majorTickMark val="none"/><c:minorTickMark val="none"/>'
+        '<c:tickLblPos val="nextTo"/><c:crossAx val="100"/><c:crosses val="autoZero"/>'
+        '<c:auto val="1"/><c:lblAlgn val="ctr"/><c:lblOffset val="100"/></c:catAx>'
+        '<c:valAx><c:axId val="100"/><c:scaling><c:orientation val="minMax"/></c:scaling>'
+        '<c:delete val="0"/><c:axPos val="l"/><c:majorGridlines/><c:numFmt formatCode="General" sourceLinked="1"/>'
+        '<c:majorTickMark val="none"/><c:minorTickMark val="none"/><c:tickLblPos val="nextTo"/>'
+        '<c:crossAx val="10"/><c:crosses val="autoZero"/><c:crossBetween val="between"/></c:valAx>'
+        '</c:plotArea><c:legend><c:legendPos val="r"/><c:overlay val="0"/></c:legend>'
+        '<c:plotVisOnly val="1"/><c:dispBlanksAs val="gap"/></c:chart></c:chartSpace>'
+    ).encode("utf-8")
@@ -0,0 +1,91 @@
+"""Measure backend cold start: server import time, first health check, and where the import time goes.
+
+Each run is a fresh interpreter, as for a new worker. The report lists the
+median import and first-health-check times, which lazily imported libraries
+were loaded anyway, and the top-level packages with the most import time
+(from python -X importtime).
+
+    python benchmarks/bench_startup.py --runs 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Runs in the child; prints one JSON line
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+loaded = [m for m in server.LAZY_MODULES if m in sys.modules]
+
+async def first_health():
+    import httpx
+    await server.app.router.startup()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        response = await client.get("/api/health")
+    ready = time.perf_counter()
+    await server.app.router.shutdown()
+    return response.status_code, ready
+
+status, ready = asyncio.run(first_health())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "health_ms": (ready - started) * 1000,
+    "health_status": status,
+    "loaded_at_import": loaded,
+}))
+"""
+
+
+def run_child(importtime: bool = False) -> subprocess.CompletedProcess:
+    env = {**os.environ, "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017")}
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", CHILD]
+    return subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(stderr: str) -> dict:
+    """Self time in ms per top-level package, from -X importtime output."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1000
+    return dict(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="packages to list by import time")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    runs = [json.loads(run_child().stdout.splitlines()[-1]) for _ in range(args.runs)]
+    packages = import_times(run_child(importtime=True).stderr)
+    result = {
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "health_ms": round(statistics.median(r["health_ms"] for r in runs), 1),
+        "loaded_at_import": runs[-1]["loaded_at_import"],
+        "packages_ms": {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]},
+    }
+    print(f"import server        {result['import_ms']:>8.1f} ms (median of {args.runs})")
+    print(f"first /api/health    {result['health_ms']:>8.1f} ms after the import began")
+    print(f"lazy libraries loaded at import: {', '.join(result['loaded_at_import']) or 'none'}")
+    for name, ms in result["packages_ms"].items():
+        print(f"  {name:<24} {ms:>8.1f} ms")
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
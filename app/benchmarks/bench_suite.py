@@ -0,0 +1,224 @@
+"""Offline benchmark and load suite for the backend.
+
+Runs workbook build micro-benchmarks and concurrent load against the FastAPI
+app in-process (httpx ASGI transport, mongomock-motor in place of MongoDB),
+writes the results as JSON and, given a baseline, fails on regressions.
+
+    pip install -r backend/requirements.txt -r benchmarks/requirements.txt
+    python benchmarks/bench_suite.py --output bench.json
+    python benchmarks/bench_suite.py --baseline bench.json --threshold 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+# server.py requires MONGO_URL; the client is never used because db is swapped for a mock
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+# All load comes from one client address and no user; per-caller limits would turn it into 429s
+for limit in (
+    "GENERATION_RATE_PER_SECOND", "GENERATION_CONCURRENCY_PER_USER", "ADMISSION_GENERATE_IP_RATE", "ADMISSION_AUTH_IP_RATE",
+):
+    os.environ.setdefault(limit, "0")
+
+# Lower is better for every compared metric
+REGRESSION_METRICS = ("median_s", "peak_alloc_bytes", "p50_ms", "p90_ms")
+
+
+def rss_high_water_kb() -> int:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+# -------- Micro-benchmarks --------
+
+def bench_build(engine: str, rows: int, repeat: int) -> dict:
+    from workbook import build_workbook
+
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(build_workbook("benchmark", engine, rows).getbuffer())
+        timings.append(time.perf_counter() - start)
+    # Allocation peak from a separate run; tracemalloc would distort the timings
+    tracemalloc.start()
+    build_workbook("benchmark", engine, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_s": round(statistics.median(timings), 5),
+        "min_s": round(min(timings), 5),
+        "bytes": size,
+        "peak_alloc_bytes": peak,
+    }
+
+
+# -------- Endpoint load --------
+
+async def load(client, make_request, requests: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with limit:
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    ms = [t * 1000 for t in latencies]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        # 503s are load shedding by the bounded pools, not failures of the suite
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "rps": round(requests / elapsed, 2),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p90_ms": round(percentile(ms, 90), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+        "rss_high_water_kb": rss_high_water_kb(),
+    }
+
+
+async def bench_endpoints(requests: int, concurrency: int, rows: int) -> dict:
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    app = server.create_app()
+    # After create_app, which creates the real (unused) database handle
+    server.db = AsyncMongoMockClient()["bench"]
+    await app.router.startup()
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            # Warm the process pool so worker start-up is not billed to the first requests
+            await client.post("/api/generate", json={"description": "warm-up", "rows": rows})
+
+            async def generate(c, i):
+                # Unique descriptions keep every request a cache miss
+                return await c.post("/api/generate", json={"description": f"bench {uuid.uuid4()}", "rows": rows})
+
+            async def generate_cached(c, i):
+                return await c.post("/api/generate", json={"description": "warm-up", "rows": rows})
+
+            results["http/generate"] = await load(client, generate, requests, concurrency)
+            results["http/generate_cached"] = await load(client, generate_cached, requests, concurrency)
+
+            email, password = "bench@example.com", "bench-password"
+            await client.post("/api/auth/register", json={"email": email, "password": password})
+
+            async def login(c, i):
+                return await c.post("/api/auth/login", json={"email": email, "password": password})
+
+            # bcrypt is deliberately slow; fewer logins keep the run short
+            results["http/login"] = await load(client, login, max(1, requests // 4), concurrency)
+
+            now = datetime.now(timezone.utc)
+            await server.db.generations.insert_many([{
+                "id": str(uuid.uuid4()), "description": f"seed {i}", "provider": "auto",
+                "filename": f"seed_{i}.xlsx", "size_bytes": 40_000, "status": "done", "progress": 1.0,
+                "created_at": now.replace(microsecond=i % 1_000_000).isoformat(),
+            } for i in range(1_000)])
+
+            async def generations(c, i):
+                return await c.get("/api/generations", params={"limit": 100})
+
+            results["http/generations"] = await load(client, generations, requests, concurrency)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+# -------- Regression check --------
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in REGRESSION_METRICS:
+            if metric in current and before.get(metric):
+                ratio = current[metric] / before[metric]
+                if ratio > 1 + threshold:
+                    regressions.append(f"{name} {metric}: {before[metric]} -> {current[metric]} (+{(ratio - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[800, 10000, 100000])
+    parser.add_argument("--engines", nargs="+", default=["openpyxl", "fast"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint benchmark")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--http-rows", type=int, default=800, help="Transactions rows per /api/generate request")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {}
+    for rows in args.rows:
+        for engine in args.engines:
+            name = f"build/{engine}/{rows}"
+            results[name] = bench_build(engine, rows, args.repeat)
+            print(f"{name:<28} {results[name]['median_s']:>9.4f}s  peak {results[name]['peak_alloc_bytes'] / 1e6:.1f} MB")
+    if not args.skip_http:
+        for name, r in asyncio.run(bench_endpoints(args.requests, args.concurrency, args.http_rows)).items():
+            results[name] = r
+            print(f"{name:<28} {r['rps']:>9.1f} req/s  p50 {r['p50_ms']:.1f} ms  p99 {r['p99_ms']:.1f} ms  errors {r['errors']}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text())["results"], args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
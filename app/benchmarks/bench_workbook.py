@@ -0,0 +1,52 @@
+"""Compare workbook engines and compression policies on build time and output size.
+
+    python benchmarks/bench_workbook.py --rows 800 10000 100000 --repeat 3
+    python benchmarks/bench_workbook.py --rows 100000 --compression stored fast default max --threads 1 4
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from workbook import ENGINES, build_workbook  # noqa: E402
+from xlsx_writer import COMPRESSION_LEVELS, DEFAULT_COMPRESSION  # noqa: E402
+
+
+def bench(engine: str, rows: int, repeat: int, compression: str = DEFAULT_COMPRESSION, threads: int = 1):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(build_workbook("benchmark", engine, rows, compression=compression, threads=threads).getbuffer())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[800, 10000, 100000])
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--compression", nargs="+", default=[DEFAULT_COMPRESSION], choices=list(COMPRESSION_LEVELS))
+    parser.add_argument("--threads", type=int, nargs="+", default=[1], help="deflate threads (fast engine only)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'engine':<10}{'compression':<13}{'threads':>7}{'median s':>10}{'bytes':>12}{'speedup':>9}")
+    for rows in args.rows:
+        baseline = None
+        for engine in args.engines:
+            for compression in args.compression:
+                for threads in args.threads if engine == "fast" else [1]:
+                    seconds, size = bench(engine, rows, args.repeat, compression, threads)
+                    baseline = baseline or seconds
+                    print(
+                        f"{rows:>8}  {engine:<10}{compression:<13}{threads:>7}"
+                        f"{seconds:>10.3f}{size:>12}{baseline / seconds:>8.1f}x"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# The backend is run from its own directory (uvicorn server:app), so its modules import each other top-level
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+# server reads these at import; nothing connects until a request needs Mongo
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+
+@pytest.fixture
+def new_app(monkeypatch, tmp_path):
+    """Builds the app with fresh shared state on an in-memory database; keyword arguments are set as env vars."""
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    def create(**env):
+        monkeypatch.setenv("ARTIFACT_DIR", str(tmp_path / "artifacts"))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        app = server.create_app()
+        monkeypatch.setattr(server, "db", AsyncMongoMockClient()["test"])
+        return app
+
+    return create
+
+
+@pytest.fixture
+def api():
+    """An httpx client for an ASGI app, used as ``async with api(app) as client``."""
+    return lambda app: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
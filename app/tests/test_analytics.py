@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import analytics
+from analytics import GenerationRollups, backfill, backfill_pipelines, bucket_value, percentiles, size_bucket, summarize
+from circuit import CircuitBreaker
+
+
+def record(day: str, provider, size: int, description: str = "sales", status: str = "done") -> dict:
+    return {
+        "id": f"{day}-{provider}-{size}-{description}-{status}",
+        "created_at": f"{day}T10:00:00+00:00",
+        "provider": provider,
+        "size_bytes": size,
+        "description": description,
+        "status": status,
+    }
+
+
+RECORDS = [
+    record("2025-01-01", "openai", 0),
+    record("2025-01-01", "openai", 1_000),
+    record("2025-01-01", "openai", 1_000_000, "inventory"),
+    record("2025-01-02", None, 5_000),
+    record("2025-01-02", "anthropic", 70_000, "inventory"),
+    record("2025-01-02", "anthropic", 9_999, status="failed"),
+]
+
+
+def test_size_buckets_are_about_19_percent_wide():
+    assert size_bucket(0) == 0
+    assert size_bucket(1) == 1
+    for size in (3, 1_000, 123_456_789):
+        assert size / 1.2 < bucket_value(size_bucket(size)) < size * 1.2
+
+
+def test_percentiles_pick_the_bucket_holding_the_rank():
+    histogram = {size_bucket(100): 50, size_bucket(1_000): 40, size_bucket(10_000): 10}
+    result = percentiles(histogram)
+    assert result == {
+        "p50": round(bucket_value(size_bucket(100))),
+        "p90": round(bucket_value(size_bucket(1_000))),
+        "p99": round(bucket_value(size_bucket(10_000))),
+    }
+    assert percentiles({}) == {"p50": 0, "p90": 0, "p99": 0}
+    only = round(bucket_value(size_bucket(1_000)))
+    assert percentiles({size_bucket(1_000): 1}, points=(1, 100)) == {"p1": only, "p100": only}
+
+
+@pytest.fixture
+def db():
+    from mongomock_motor import AsyncMongoMockClient
+
+    return AsyncMongoMockClient()["test"]
+
+
+async def rollup_docs(db) -> tuple:
+    days = await db.generation_rollups.find({}, {"_id": 0}).sort([("day", 1), ("provider", 1)]).to_list(None)
+    descriptions = await db.generation_descriptions.find({}, {"_id": 0}).sort("description", 1).to_list(None)
+    return days, descriptions
+
+
+def mongomock_pipelines() -> tuple:
+    # mongomock implements $substrBytes only under its older name, $substr, which MongoDB treats the same way
+    def rename(value):
+        if isinstance(value, dict):
+            return {("$substr" if key == "$substrBytes" else key): rename(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [rename(item) for item in value]
+        return value
+
+    return tuple(rename(pipeline) for pipeline in backfill_pipelines())
+
+
+def test_backfill_matches_the_live_rollups(db, monkeypatch):
+    monkeypatch.setattr(analytics, "backfill_pipelines", mongomock_pipelines)
+    rollups = GenerationRollups(lambda: db.generation_rollups, lambda: db.generation_descriptions, CircuitBreaker())
+
+    async def main():
+        await rollups.apply(RECORDS[:2])
+        await rollups.apply(RECORDS[2:])
+        live = await rollup_docs(db)
+        await db.generation_rollups.delete_many({})
+        await db.generation_descriptions.delete_many({})
+        await db.generations.insert_many([dict(r) for r in RECORDS])
+        counts = await backfill(db)
+        return live, counts, await rollup_docs(db)
+
+    live, counts, backfilled = asyncio.run(main())
+    assert counts == (3, 2)
+    assert backfilled == live
+    days, descriptions = live
+    assert [(d["day"], d["provider"], d["count"], d["bytes"]) for d in days] == [
+        ("2025-01-01", "openai", 3, 1_001_000),
+        ("2025-01-02", "anthropic", 1, 70_000),
+        ("2025-01-02", "auto", 1, 5_000),
+    ]
+    assert days[0]["size_hist"] == {"0": 1, str(size_bucket(1_000)): 1, str(size_bucket(1_000_000)): 1}
+    # The failed generation is not counted
+    assert descriptions == [{"description": "inventory", "count": 2}, {"description": "sales", "count": 3}]
+
+
+def test_summarize_reads_the_rollups(db, monkeypatch):
+    class Day(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2025, 1, 2, 12, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(analytics, "datetime", Day)
+    rollups = GenerationRollups(lambda: db.generation_rollups, lambda: db.generation_descriptions, CircuitBreaker())
+
+    async def main():
+        await rollups.apply(RECORDS)
+        return await summarize(db, days=1, top=1)
+
+    summary = asyncio.run(main())
+    assert summary["since"] == "2025-01-02"
+    assert (summary["count"], summary["bytes"]) == (2, 75_000)
+    assert sorted(summary["per_provider"], key=lambda p: p["provider"]) == [
+        {"provider": "anthropic", "count": 1, "bytes": 70_000}, {"provider": "auto", "count": 1, "bytes": 5_000},
+    ]
+    assert summary["size_bytes"]["mean"] == 37_500
+    assert summary["top_descriptions"] == [{"description": "sales", "count": 3}]
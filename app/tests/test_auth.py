@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+
+import auth
+from auth import InvalidToken, Principal, TokenVerifier
+
+SECRET = "test-secret"
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth.time, "time", clock.time)
+    return clock
+
+
+def test_verified_tokens_are_cached(clock):
+    verifier = TokenVerifier(SECRET)
+    token = verifier.issue("u1", "ada@example.com", expires_minutes=1)
+    for _ in range(3):
+        assert verifier.verify(token) == Principal("u1", "ada@example.com")
+    assert verifier.stats() == {"entries": 1, "revoked": 0, "hits": 2, "misses": 1}
+
+
+def test_cached_token_is_refused_once_expired(clock):
+    verifier = TokenVerifier(SECRET)
+    token = verifier.issue("u1", "ada@example.com", expires_minutes=1)
+    verifier.verify(token)
+    clock.now += 61
+    with pytest.raises(InvalidToken, match="expired"):
+        verifier.verify(token)
+    assert verifier.stats()["entries"] == 0
+
+
+def test_cache_is_bounded():
+    verifier = TokenVerifier(SECRET, max_entries=2)
+    tokens = [verifier.issue(f"u{n}", None, expires_minutes=1) for n in range(3)]
+    for token in tokens + tokens[2:]:
+        verifier.verify(token)
+    assert verifier.stats() == {"entries": 2, "revoked": 0, "hits": 1, "misses": 3}
+
+
+@pytest.mark.parametrize("claims", [{"sub": "u1"}, {"exp": int(time.time()) + 60}])
+def test_tokens_need_exp_and_sub(claims):
+    with pytest.raises(InvalidToken):
+        TokenVerifier(SECRET).verify(jwt.encode(claims, SECRET, algorithm="HS256"))
+
+
+def test_bad_signature_is_refused():
+    token = TokenVerifier("other-secret").issue("u1", None, expires_minutes=1)
+    with pytest.raises(InvalidToken):
+        TokenVerifier(SECRET).verify(token)
+
+
+def test_revoked_token_is_refused_even_when_cached(clock):
+    verifier = TokenVerifier(SECRET)
+    token, other = (verifier.issue(user, None, expires_minutes=1) for user in ("u1", "u2"))
+    verifier.verify(token)
+    verifier.revoke(token)
+    with pytest.raises(InvalidToken, match="revoked"):
+        verifier.verify(token)
+    assert verifier.verify(other).user_id == "u2"
+    # Revocations are forgotten once the token has expired anyway
+    clock.now += 61
+    verifier.revoke(verifier.issue("u3", None, expires_minutes=1))
+    assert verifier.stats()["revoked"] == 1
+    with pytest.raises(InvalidToken):
+        verifier.revoke("not a token")
+
+
+def test_logout_revokes_the_bearer_token(new_app, api):
+    app = new_app()
+    credentials = {"email": "ada@example.com", "password": "correct horse"}
+
+    async def main():
+        async with api(app) as client:
+            await client.post("/api/auth/register", json=credentials)
+            token = (await client.post("/api/auth/login", json=credentials)).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            statuses = [(await client.get("/api/auth/me", headers=headers)).status_code]
+            statuses.append((await client.post("/api/auth/logout", headers=headers)).status_code)
+            statuses.append((await client.get("/api/auth/me", headers=headers)).status_code)
+            statuses.append((await client.post("/api/auth/logout")).status_code)
+            return statuses
+
+    assert asyncio.run(main()) == [200, 200, 401, 401]
@@ -0,0 +1,65 @@
+import asyncio
+
+import server
+from executor import ExecutorSaturated
+
+CREDENTIALS = {"email": "ada@example.com", "password": "correct horse"}
+
+
+def test_duplicate_email_is_refused_before_hashing(new_app, api, monkeypatch):
+    app = new_app()
+    hashed = []
+    run_password_job = server.run_password_job
+
+    async def counting_job(fn, *args):
+        hashed.append(fn.__name__)
+        return await run_password_job(fn, *args)
+
+    monkeypatch.setattr(server, "run_password_job", counting_job)
+
+    async def main():
+        async with api(app) as client:
+            first = await client.post("/api/auth/register", json=CREDENTIALS)
+            again = await client.post("/api/auth/register", json={**CREDENTIALS, "password": "another one"})
+            return first, again, await server.db.users.count_documents({})
+
+    first, again, users = asyncio.run(main())
+    assert first.status_code == 200
+    assert (again.status_code, again.json()["detail"]) == (400, "Email already registered")
+    assert hashed == ["hash"]
+    assert users == 1
+
+
+def test_login_verifies_off_the_event_loop(new_app, api):
+    app = new_app()
+
+    async def main():
+        async with api(app) as client:
+            await client.post("/api/auth/register", json=CREDENTIALS)
+            wrong = await client.post("/api/auth/login", json={**CREDENTIALS, "password": "wrong"})
+            login = await client.post("/api/auth/login", json=CREDENTIALS)
+            token = login.json()["access_token"]
+            me = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+            return wrong, login, me
+
+    wrong, login, me = asyncio.run(main())
+    assert wrong.status_code == 401
+    assert login.status_code == 200
+    assert me.json()["email"] == CREDENTIALS["email"]
+
+
+def test_busy_password_pool_is_a_503(new_app, api, monkeypatch):
+    app = new_app()
+
+    async def saturated(fn, *args, **kwargs):
+        raise ExecutorSaturated("busy")
+
+    monkeypatch.setattr(server.password_executor, "run", saturated)
+
+    async def main():
+        async with api(app) as client:
+            return await client.post("/api/auth/register", json=CREDENTIALS)
+
+    response = asyncio.run(main())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
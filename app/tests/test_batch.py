@@ -0,0 +1,64 @@
+import asyncio
+import zipfile
+from io import BytesIO
+
+from fastapi import HTTPException
+from openpyxl import load_workbook
+
+import server
+
+
+def test_batch_streams_a_zip_of_workbooks_and_errors(new_app, api, monkeypatch):
+    app = new_app()
+    run_workbook_job = server.run_workbook_job
+
+    async def failing_job(fn, description, *args, **kwargs):
+        if description == "boom":
+            raise HTTPException(status_code=504, detail="Spreadsheet generation timed out")
+        return await run_workbook_job(fn, description, *args, **kwargs)
+
+    monkeypatch.setattr(server, "run_workbook_job", failing_job)
+    items = [{"description": "first", "rows": 5}, {"description": "boom", "rows": 5}, {"description": "third", "rows": 7}]
+
+    async def main():
+        async with api(app) as client:
+            response = await client.post("/api/generate/batch", json={"requests": items})
+        await server.generation_writes.flush()
+        return response, await server.db.generations.find({}, {"_id": 0}).to_list(None)
+
+    response, records = asyncio.run(main())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(BytesIO(response.content))
+    assert archive.testzip() is None
+    error, first, third = sorted(archive.namelist())
+    assert error == "002_error.txt"
+    assert first.startswith("spreadsheet_") and first.endswith("_001.xlsx")
+    assert third == first.replace("_001", "_003")
+    assert archive.read(error) == b"boom\nSpreadsheet generation timed out\n"
+    for name, description, rows in ((first, "first", 5), (third, "third", 7)):
+        # Workbooks are already deflated, so they are stored as they are
+        assert archive.getinfo(name).compress_type == zipfile.ZIP_STORED
+        book = load_workbook(BytesIO(archive.read(name)))
+        assert book["README"]["A2"].value == f"Description: {description}"
+        assert book["Transactions"].max_row == rows + 1
+    assert sorted((r["description"], r["filename"]) for r in records) == [("first", first), ("third", third)]
+    assert all(r["artifact"] for r in records)
+
+
+def test_batch_limits(new_app, api, monkeypatch):
+    monkeypatch.setattr(server, "BATCH_MAX_ITEMS", 2)
+    app = new_app()
+
+    async def main():
+        async with api(app) as client:
+            return [
+                (await client.post("/api/generate/batch", json={"requests": requests})).status_code
+                for requests in (
+                    [],
+                    [{"description": "x", "rows": 1}] * 3,
+                    [{"description": "x", "rows": 1, "format": "csv"}],
+                )
+            ]
+
+    assert asyncio.run(main()) == [400, 413, 400]
@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+
+import cache
+from cache import WorkbookCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock.time)
+    return clock
+
+
+def test_key_ignores_field_order():
+    assert cache_key("2", description="a", rows=10) == cache_key("2", rows=10, description="a")
+    assert cache_key("2", description="a", rows=10) != cache_key("3", description="a", rows=10)
+    assert cache_key("2", description="a", rows=10) != cache_key("2", description="a", rows=11)
+
+
+def test_least_recently_used_are_evicted_by_size(clock):
+    workbooks = WorkbookCache(max_bytes=10)
+
+    async def main():
+        await workbooks.put("a", b"aaaa")
+        await workbooks.put("b", b"bbbb")
+        # Reading a makes b the least recently used
+        assert await workbooks.get("a") == b"aaaa"
+        await workbooks.put("c", b"cccc")
+        # Larger than the whole cache: never kept
+        await workbooks.put("d", b"d" * 11)
+        return [await workbooks.get(key) for key in "abcd"]
+
+    assert asyncio.run(main()) == [b"aaaa", None, b"cccc", None]
+    assert workbooks.stats()["bytes"] == 8
+    assert (workbooks.hits, workbooks.misses) == (3, 2)
+
+
+def test_entries_expire_so_generated_at_stays_fresh(clock):
+    workbooks = WorkbookCache(max_bytes=100, ttl=300)
+
+    async def main():
+        await workbooks.put("a", b"aaaa")
+        clock.now += 300
+        fresh = await workbooks.get("a")
+        clock.now += 1
+        return fresh, await workbooks.get("a")
+
+    assert asyncio.run(main()) == (b"aaaa", None)
+    assert workbooks.stats()["entries"] == 0
+    assert workbooks.current_bytes == 0
+
+
+def test_disk_tier_survives_restarts_and_expires(tmp_path, clock):
+    async def main():
+        await WorkbookCache(max_bytes=0, ttl=300, directory=str(tmp_path)).put("a", b"aaaa")
+        restarted = WorkbookCache(max_bytes=100, ttl=300, directory=str(tmp_path))
+        found = await restarted.get("a")
+        # The file's modification time is its age
+        os.utime(tmp_path / "a.xlsx", (clock.now - 301, clock.now - 301))
+        restarted.clear()
+        return found, restarted.disk_hits, await restarted.get("a")
+
+    assert asyncio.run(main()) == (b"aaaa", 1, None)
+    assert not (tmp_path / "a.xlsx").exists()
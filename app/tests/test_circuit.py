@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+import circuit
+from circuit import CircuitBreaker, CircuitOpen
+
+
+class Down(Exception):
+    pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", clock.monotonic)
+    return clock
+
+
+async def ok():
+    return "ok"
+
+
+async def down():
+    raise Down()
+
+
+def call(breaker: CircuitBreaker, fn):
+    return asyncio.run(breaker.call(fn))
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, failures=(Down,))
+    for _ in range(2):
+        with pytest.raises(Down):
+            call(breaker, down)
+    # A success resets the count
+    assert call(breaker, ok) == "ok"
+    for _ in range(3):
+        with pytest.raises(Down):
+            call(breaker, down)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpen):
+        call(breaker, ok)
+    assert breaker.rejected == 1
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, failures=(Down,))
+    with pytest.raises(Down):
+        call(breaker, down)
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # A failed probe restarts the wait
+    with pytest.raises(Down):
+        call(breaker, down)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 9
+    with pytest.raises(CircuitOpen):
+        call(breaker, ok)
+    clock.now += 1
+    assert call(breaker, ok) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_one_probe_at_a_time(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, failures=(Down,))
+    with pytest.raises(Down):
+        call(breaker, down)
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_other_errors_are_not_health_signals(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, failures=(Down,))
+
+    async def bad_query():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        call(breaker, bad_query)
+    assert breaker.state == CircuitBreaker.CLOSED
+    with pytest.raises(Down):
+        call(breaker, down)
+    clock.now += 10
+    # The probe slot is freed again when the probe fails for another reason
+    with pytest.raises(ValueError):
+        call(breaker, bad_query)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert call(breaker, ok) == "ok"
+
+
+def test_default_failures_are_mongo_connection_errors():
+    from pymongo.errors import ConnectionFailure
+
+    assert CircuitBreaker().failures == (ConnectionFailure,)
@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+@pytest.mark.parametrize("created_at, record_id", [
+    ("2025-01-01T00:00:00+00:00", "b5b6c3c2-2f5e-4a43-9d4e-6a1f0f6f8f11"),
+    ("", ""),
+    ("2025-01-01T00:00:00.123456+00:00", "id with spaces/and+symbols=="),
+])
+def test_cursor_round_trip(created_at, record_id):
+    cursor = server.encode_cursor(created_at, record_id)
+    assert "=" not in cursor
+    assert server.decode_cursor(cursor) == (created_at, record_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGpzb24", "WzFd", "eyJhIjogMX0"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        server.decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_pages_through_generations():
+    from mongomock_motor import AsyncMongoMockClient
+
+    async def main():
+        app = server.create_app()
+        server.db = AsyncMongoMockClient()["cursor_test"]
+        # Two records share a timestamp, so the id breaks the tie
+        stamps = ["2025-01-01T00:00:00+00:00"] * 2 + [f"2025-01-0{d}T00:00:00+00:00" for d in range(2, 7)]
+        await server.db.generations.insert_many([
+            {"id": f"id-{n}", "created_at": stamp, "description": "d", "provider": "auto",
+             "filename": f"f{n}.xlsx", "size_bytes": n}
+            for n, stamp in enumerate(stamps)
+        ])
+        seen, pages = [], 0
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            url = "/api/generations?limit=3&fields=size_bytes"
+            while url:
+                response = await client.get(url)
+                assert response.status_code == 200
+                seen += [doc["id"] for doc in response.json()]
+                pages += 1
+                cursor = response.headers.get("x-next-cursor")
+                url = cursor and f"/api/generations?limit=3&fields=size_bytes&cursor={cursor}"
+            assert (await client.get("/api/generations?cursor=!!!")).status_code == 400
+        return seen, pages
+
+    seen, pages = asyncio.run(main())
+    assert seen == [f"id-{n}" for n in (6, 5, 4, 3, 2, 1, 0)]
+    assert pages == 3
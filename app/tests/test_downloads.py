@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import server
+from downloads import artifact_response, etag_matches, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=0-0", (0, 0)),
+    # Not a single byte range: the whole file is sent
+    ("items=0-10", None),
+    ("bytes=0-10,20-30", None),
+    ("bytes=abc", None),
+    ("bytes=-", None),
+    ("bytes=50-10", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=2000-3000", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-10", 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert not etag_matches('W/"b"', '"b"', weak=False)
+    assert etag_matches("*", '"b"')
+    assert not etag_matches("*", '"b"', weak=False)
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "report.xlsx"
+    path.write_bytes(bytes(range(256)) * 4)
+
+    async def download(request):
+        return artifact_response(request, path, os.stat(path), '"report"', "application/octet-stream", "report.xlsx")
+
+    return TestClient(Starlette(routes=[Route("/download", download, methods=["GET", "HEAD"])]))
+
+
+def test_full_and_partial_downloads(client):
+    full = client.get("/download")
+    assert full.status_code == 200
+    assert len(full.content) == 1024
+    assert full.headers["accept-ranges"] == "bytes"
+    etag = full.headers["etag"]
+    assert etag == '"report"'
+
+    part = client.get("/download", headers={"Range": "bytes=-24"})
+    assert part.status_code == 206
+    assert part.headers["content-range"] == "bytes 1000-1023/1024"
+    assert part.content == full.content[1000:]
+
+    unsatisfiable = client.get("/download", headers={"Range": "bytes=1024-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */1024"
+    assert client.get("/download", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/download", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    # A stale If-Range gets the whole file
+    stale = client.get("/download", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert stale.status_code == 200
+    assert len(stale.content) == 1024
+
+
+def test_cache_hits_reuse_the_stored_artifact(new_app, api, monkeypatch):
+    app = new_app()
+    saved = []
+    save = server.artifact_store.save
+
+    async def counting_save(data, suffix=".xlsx"):
+        saved.append(len(data))
+        return await save(data, suffix)
+
+    monkeypatch.setattr(server.artifact_store, "save", counting_save)
+    body = {"description": "cached download", "rows": 10}
+
+    async def main():
+        async with api(app) as client:
+            responses = [await client.post("/api/generate", json=body) for _ in range(3)]
+            record_id = responses[-1].headers["x-generation-id"]
+            download = await client.get(f"/api/generations/{record_id}/download")
+            # Once the artifact is swept, the next hit stores it again
+            for path in server.artifact_store.directory.iterdir():
+                path.unlink()
+            again = await client.post("/api/generate", json=body)
+            return responses, download, again
+
+    responses, download, again = asyncio.run(main())
+    assert [r.headers["x-cache"] for r in responses] == ["MISS", "HIT", "HIT"]
+    assert download.status_code == 200
+    assert download.content == responses[0].content
+    assert (again.headers["x-cache"], len(saved)) == ("HIT", 2)
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+from openpyxl import load_workbook
+
+import workbook
+from workbook import ENGINES, TRANSACTION_HEADERS, build_workbook
+
+
+class FixedClock(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    monkeypatch.setattr(workbook, "datetime", FixedClock)
+
+
+def load(engine: str, rows: int = 120, data_only: bool = False):
+    return load_workbook(build_workbook("engine check", engine, rows), data_only=data_only)
+
+
+def cells(book) -> dict:
+    return {name: [list(row) for row in book[name].iter_rows(values_only=True)] for name in book.sheetnames}
+
+
+@pytest.mark.parametrize("data_only", [False, True])
+def test_fast_engine_matches_openpyxl(data_only):
+    fast, reference = load("fast", data_only=data_only), load("openpyxl", data_only=data_only)
+    assert fast.sheetnames == reference.sheetnames == ["README", "Data", "Summary", "Transactions"]
+    assert cells(fast) == cells(reference)
+
+
+def test_cached_formula_values():
+    summary = load("fast", data_only=True)["Summary"]
+    assert [summary[f"B{r}"].value for r in (3, 4, 5)] == [282000, 183600, 98400]
+    assert load("fast")["Summary"]["B3"].value == "=SUM(Data!B2:B13)"
+
+
+def test_fast_engine_keeps_the_layout():
+    for engine in sorted(ENGINES):
+        book = load(engine)
+        assert book["README"]["A3"].value == "Generated At: 2025-01-01T00:00:00+00:00"
+        assert book["README"]["A1"].font.bold
+        assert book["README"].column_dimensions["A"].width == 90
+        assert book["Data"].auto_filter.ref == "A1:D13"
+        assert all(cell.font.bold for cell in book["Transactions"][1])
+        assert tuple(cell.value for cell in book["Transactions"][1]) == TRANSACTION_HEADERS
+        assert book["Transactions"].max_row == 121
+
+
+def test_unknown_engine_or_compression():
+    with pytest.raises(ValueError):
+        build_workbook("x", "xlsxwriter")
+    with pytest.raises(ValueError):
+        build_workbook("x", "fast", compression="best")
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+import pytest
+
+from executor import BoundedExecutor, ExecutorSaturated
+
+
+def test_backlog_beyond_capacity_is_rejected():
+    release = threading.Event()
+    executor = BoundedExecutor(max_workers=1, max_queue=1, kind="thread")
+
+    async def main():
+        jobs = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert (executor.running, executor.queued) == (1, 1)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(release.wait)
+        release.set()
+        return await asyncio.gather(*jobs)
+
+    try:
+        assert asyncio.run(main()) == [True, True]
+        assert executor.pending == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    release = threading.Event()
+    executor = BoundedExecutor(max_workers=1, max_queue=0, timeout=0.01, kind="thread")
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(release.wait)
+        # The thread is still running it, so there is no room yet
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(int)
+        release.set()
+        while executor.pending:
+            await asyncio.sleep(0.01)
+        return await executor.run(int, "7")
+
+    try:
+        assert asyncio.run(main()) == 7
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_cancelled_job_that_never_started_frees_its_slot():
+    release = threading.Event()
+    ran = []
+    executor = BoundedExecutor(max_workers=1, max_queue=1, kind="thread")
+
+    async def main():
+        first = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(ran.append, "queued"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.sleep(0.01)
+        assert executor.pending == 1
+        release.set()
+        await first
+
+    try:
+        asyncio.run(main())
+        assert ran == []
+        assert executor.pending == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_waiters_get_free_slots_in_order():
+    executor = BoundedExecutor(max_workers=1, max_queue=0, kind="thread")
+
+    async def main():
+        executor._pending = 1
+        waiters = [asyncio.ensure_future(executor.run(str, n, wait=True)) for n in range(3)]
+        await asyncio.sleep(0)
+        executor._release()
+        return await asyncio.gather(*waiters)
+
+    try:
+        assert asyncio.run(main()) == ["0", "1", "2"]
+    finally:
+        executor.shutdown()
+
+
+def test_cancelled_waiter_passes_on_its_wakeup():
+    executor = BoundedExecutor(max_workers=1, max_queue=0, kind="thread")
+
+    async def main():
+        # Every slot is taken; two callers wait for one
+        executor._pending = 1
+        woken = asyncio.ensure_future(executor.run(str, "woken", wait=True))
+        next_in_line = asyncio.ensure_future(executor.run(str, "next", wait=True))
+        await asyncio.sleep(0)
+        # The slot is handed to the first waiter, which is cancelled before it can take it
+        executor._release()
+        woken.cancel()
+        result = await asyncio.wait_for(next_in_line, 1)
+        return woken.cancelled(), result
+
+    try:
+        assert asyncio.run(main()) == (True, "next")
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
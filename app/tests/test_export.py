@@ -0,0 +1,104 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+import exports
+import mongo
+import server
+from exports import CollectionExport
+
+
+def _export(app, api, path: str):
+    async def main():
+        async with api(app) as client:
+            return await client.get(path)
+
+    return asyncio.run(main())
+
+
+def test_exported_workbook_has_every_document(new_app, api):
+    app = new_app()
+    docs = [
+        {"id": "a", "client_name": "plain", "timestamp": "2025-01-01T00:00:00+00:00"},
+        {"id": "b", "client_name": "=HYPERLINK(\"x\")", "timestamp": "2025-01-02T00:00:00+00:00"},
+        {"id": "c", "client_name": {"nested": [1, 2]}, "timestamp": None},
+    ]
+    asyncio.run(server.db.status_checks.insert_many([dict(doc) for doc in docs]))
+    response = _export(app, api, "/api/export/status_checks?compression=fast")
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith('attachment; filename="status_checks_')
+    sheet = load_workbook(BytesIO(response.content))["status_checks"]
+    rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+    assert rows == [
+        ["id", "client_name", "timestamp"],
+        ["a", "plain", "2025-01-01T00:00:00+00:00"],
+        # Values are never formulas
+        ["b", "=HYPERLINK(\"x\")", "2025-01-02T00:00:00+00:00"],
+        ["c", '{"nested": [1, 2]}', None],
+    ]
+    assert sheet["B3"].data_type == "s"
+
+
+def test_empty_collection_exports_the_header(new_app, api):
+    app = new_app()
+    response = _export(app, api, "/api/export/generations")
+    assert response.status_code == 200
+    rows = list(load_workbook(BytesIO(response.content))["generations"].iter_rows(values_only=True))
+    assert rows == [tuple(server.GenerationRecord.model_fields)]
+
+
+def test_unknown_collection_is_a_404(new_app, api):
+    response = _export(new_app(), api, "/api/export/users")
+    assert response.status_code == 404
+    assert "generations" in response.json()["detail"]
+
+
+def test_database_down_is_a_503(new_app, api, monkeypatch):
+    app = new_app()
+
+    class Cursor:
+        def sort(self, order):
+            return self
+
+        async def to_list(self, length):
+            raise mongo.ConnectionFailure("down")
+
+    class Down:
+        def __getitem__(self, name):
+            return self
+
+        def find(self, *args, **kwargs):
+            return Cursor()
+
+    monkeypatch.setattr(server, "db", Down())
+    response = _export(app, api, "/api/export/generations")
+    assert response.status_code == 503
+
+
+def test_exports_are_rate_limited_per_client(new_app, api):
+    app = new_app(ADMISSION_EXPORT_IP_BURST=2)
+
+    async def main():
+        async with api(app) as client:
+            return [(await client.get("/api/export/status_checks")).status_code for _ in range(3)]
+
+    assert asyncio.run(main()) == [200, 200, 429]
+
+
+def test_sheets_split_at_the_row_limit(monkeypatch):
+    monkeypatch.setattr(exports, "SHEET_DATA_ROWS", 3)
+    export = CollectionExport("items", ("n",), 1)
+    data = export.write([{"n": n} for n in range(5)]) + export.write([{"n": 5}, {"n": 6}]) + export.close()
+    workbook = load_workbook(BytesIO(data))
+    assert workbook.sheetnames == ["items", "items (2)", "items (3)"]
+    assert [[row[0] for row in workbook[name].iter_rows(values_only=True)] for name in workbook.sheetnames] == [
+        ["n", 0, 1, 2], ["n", 3, 4, 5], ["n", 6],
+    ]
+    assert export.rows == 7
+
+
+@pytest.mark.parametrize("value, expected", [(float("nan"), "nan"), (b"x", "b'x'"), ("y" * 40_000, "y" * 32_767)])
+def test_cell_values(value, expected):
+    assert exports.cell_value(value) == expected
@@ -0,0 +1,51 @@
+import pytest
+
+from formulas import FormulaError, evaluate, evaluate_rows, parse
+
+
+def test_arithmetic_and_functions():
+    results = evaluate_rows({"S": [
+        [1, 2, "=A1+B1"],
+        [3, 4, "=SUM(A1:B2)"],
+        ["=C1*2", "=A3+1", "=B3*A3-2^2"],
+        ["=AVERAGE(A1:A2)", "=MIN(A1:B2)", "=MAX(A1:B2)"],
+        ["=COUNT(A1:B2)", "=-A1", "=(A1+B1)/B1"],
+    ]})["S"]
+    assert results == {
+        (1, 3): 3, (2, 3): 10,
+        (3, 1): 6, (3, 2): 7, (3, 3): 38,
+        (4, 1): 2, (4, 2): 1, (4, 3): 4,
+        (5, 1): 4, (5, 2): -1, (5, 3): 1.5,
+    }
+
+
+def test_relative_references_down_a_column():
+    rows = [[n, f"=A{n}*2", f"=SUM($A$1:A{n})"] for n in range(1, 6)]
+    results = evaluate_rows({"S": rows})["S"]
+    assert [results[(n, 2)] for n in range(1, 6)] == [2, 4, 6, 8, 10]
+    assert [results[(n, 3)] for n in range(1, 6)] == [1, 3, 6, 10, 15]
+
+
+def test_other_sheets():
+    assert evaluate({"A": {(1, 1): "=B!A1*2"}, "B": {(1, 1): 21}}) == {"A": {(1, 1): 42}}
+
+
+def test_text_is_skipped_by_aggregates():
+    results = evaluate_rows({"S": [["label", 2, 3], ["=SUM(A1:C1)", "=COUNT(A1:C1)", None]]})["S"]
+    assert results == {(2, 1): 5, (2, 2): 2}
+
+
+def test_cycles_get_no_value():
+    results = evaluate_rows({"S": [["=B1", "=A1", 5, "=C1+1"], ["=A2", "=A1+1", "=C1*2", None]]})["S"]
+    # A1 <-> B1 and the self-reference in A2 are circular, as is B2 which reads them
+    assert results == {(1, 4): 6, (2, 3): 10}
+
+
+def test_errors_and_unsupported_formulas_get_no_value():
+    results = evaluate_rows({"S": [[5, "=A1/0", "=FOO(1)", "=B1+1", "=A1+1"]]})["S"]
+    assert results == {(1, 5): 6}
+
+
+def test_parse_rejects_bad_formulas():
+    with pytest.raises(FormulaError):
+        parse("=SUM(A1:")
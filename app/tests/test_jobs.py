@@ -0,0 +1,92 @@
+import asyncio
+
+import server
+from jobs import JobQueue, JobQueueFull
+
+
+async def forever(job):
+    await asyncio.Event().wait()
+
+
+def test_jobs_run_by_priority_then_submission_order():
+    async def main():
+        ran, gate = [], asyncio.Event()
+
+        async def handler(job):
+            if job == "first":
+                await gate.wait()
+            else:
+                ran.append(job)
+
+        queue = JobQueue(handler, concurrency=1, max_pending=10)
+        queue.submit("first", "first")
+        await asyncio.sleep(0)
+        for job_id, priority in [("c", 5), ("a", 1), ("b", 1)]:
+            queue.submit(job_id, job_id, priority=priority)
+        assert (queue.pending, queue.running) == (3, 1)
+        gate.set()
+        await queue._queue.join()
+        await queue.stop()
+        return ran
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+
+
+def test_backlog_is_bounded():
+    async def main():
+        queue = JobQueue(forever, concurrency=1, max_pending=2)
+        queue.submit("0", 0)
+        await asyncio.sleep(0)
+        queue.submit("1", 1)
+        queue.submit("2", 2)
+        try:
+            queue.submit("late", None)
+        except JobQueueFull:
+            return await queue.stop()
+        raise AssertionError("backlog was not bounded")
+
+    # The first job had started; the other two never did and are handed back
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_stop_hands_back_jobs_that_never_started():
+    async def main():
+        queue = JobQueue(forever, concurrency=2, max_pending=10)
+        for n in range(5):
+            queue.submit(str(n), n)
+        await asyncio.sleep(0)
+        waiting = await queue.stop()
+        return waiting, queue.active, queue.pending
+
+    assert asyncio.run(main()) == ([2, 3, 4], {}, 0)
+
+
+def test_shutdown_fails_every_unfinished_job(new_app, api, monkeypatch):
+    monkeypatch.setattr(server, "JOB_CONCURRENCY", 1)
+
+    async def build_forever(*args, **kwargs):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(server, "run_workbook_job", build_forever)
+    app = new_app(GENERATION_CONCURRENCY_PER_USER=0)
+
+    async def main():
+        await app.router.startup()
+        async with api(app) as client:
+            ids = []
+            for _ in range(4):
+                response = await client.post("/api/generate", json={"description": "x", "rows": 10, "job": True})
+                assert response.status_code == 202
+                ids.append(response.json()["job_id"])
+            await asyncio.sleep(0.05)
+            assert (server.generation_jobs.running, server.generation_jobs.pending) == (1, 3)
+        await app.router.shutdown()
+        docs = await server.db.generations.find({}, {"_id": 0}).to_list(None)
+        return ids, docs
+
+    ids, docs = asyncio.run(main())
+    assert sorted(doc["id"] for doc in docs) == sorted(ids)
+    for doc in docs:
+        assert (doc["status"], doc["error"]) == ("failed", "Interrupted by server shutdown")
+        assert doc["finished_at"]
+    assert server.generation_quotas.stats()["active"] == 0
@@ -0,0 +1,94 @@
+import asyncio
+import re
+
+import httpx
+from fastapi import FastAPI
+
+from metrics import CONTENT_TYPE, Histogram, Registry, RequestMetrics, StageTimer, observe_stages
+
+
+def _value(text: str, series: str) -> float:
+    match = re.search(rf"^{re.escape(series)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = Registry()
+    histogram = registry.histogram("t_seconds", "Test", ("op",), buckets=(0.1, 1, 10))
+    for value in (0.05, 0.1, 0.5, 1, 20):
+        histogram.observe(value, "read")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP t_seconds Test", "# TYPE t_seconds histogram"]
+    assert lines[2:] == [
+        't_seconds_bucket{op="read",le="0.1"} 2',
+        't_seconds_bucket{op="read",le="1"} 4',
+        't_seconds_bucket{op="read",le="10"} 4',
+        't_seconds_bucket{op="read",le="+Inf"} 5',
+        't_seconds_sum{op="read"} 21.65',
+        't_seconds_count{op="read"} 5',
+    ]
+
+
+def test_counter_gauge_and_label_escaping():
+    registry = Registry()
+    counter = registry.counter("t_total", "Things", ("kind",))
+    counter.inc('a "quoted"\nname')
+    counter.inc('a "quoted"\nname', amount=2)
+    registry.gauge("t_level", "Level", lambda: {(): 7})
+    text = registry.render()
+    assert 't_total{kind="a \\"quoted\\"\\nname"} 3' in text
+    assert "# TYPE t_level gauge\nt_level 7\n" in text
+
+
+def test_stage_timer_and_observe_stages():
+    timer = StageTimer()
+    timer.lap("cells")
+    timer.lap("save")
+    timer.lap("cells")
+    assert set(timer.stages) == {"cells", "save"}
+    histogram = Histogram("t_stage_seconds", "Stages", ("engine", "stage"))
+    observe_stages(histogram, timer.stages, "fast")
+    observe_stages(histogram, None, "fast")
+    assert len([line for line in histogram.render() if line.startswith("t_stage_seconds_count")]) == 2
+
+
+def test_request_metrics_label_by_route_template():
+    inner = FastAPI()
+
+    @inner.get("/items/{item_id}", status_code=201)
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    histogram = Histogram("t_request_seconds", "Requests", ("method", "route", "status"))
+    app = RequestMetrics(inner, histogram)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            for n in range(3):
+                await client.get(f"/items/{n}")
+            await client.get("/missing")
+
+    asyncio.run(main())
+    text = "\n".join(histogram.render())
+    assert _value(text, 't_request_seconds_count{method="GET",route="/items/{item_id}",status="201"}') == 3
+    assert _value(text, 't_request_seconds_count{method="GET",route="unmatched",status="404"}') == 1
+
+
+def test_metrics_endpoint_counts_generate_requests(new_app, api):
+    app = new_app()
+    body = {"description": "metrics", "rows": 10, "stream": True}
+    series = 'http_request_duration_seconds_count{method="POST",route="/api/generate",status="200"}'
+
+    async def main():
+        async with api(app) as client:
+            before = _value((await client.get("/api/metrics")).text, series)
+            assert (await client.post("/api/generate", json=body)).status_code == 200
+            response = await client.get("/api/metrics")
+        return before, response
+
+    before, response = asyncio.run(main())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert _value(response.text, series) == before + 1
+    assert 'workbook_bytes_total{mode="stream"}' in response.text
+    assert "# TYPE generation_jobs gauge" in response.text
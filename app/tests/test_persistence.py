@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timezone
+
+import mongo
+from circuit import CircuitBreaker
+from persistence import DUPLICATE_KEY, WriteBehindBuffer
+
+
+class Collection:
+    """Records insert_many batches; ``down`` fails them like an unreachable server, ``reject`` like a partial write."""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self.reject = {}
+
+    async def insert_many(self, docs, ordered=True):
+        if self.down:
+            raise mongo.ConnectionFailure("down")
+        self.batches.append([doc["n"] for doc in docs])
+        if self.reject:
+            errors = [{"index": i, "code": code, "errmsg": "rejected"} for i, code in sorted(self.reject.items())]
+            self.reject = {}
+            raise mongo.BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+
+
+def docs(*numbers):
+    return [{"n": n} for n in numbers]
+
+
+def buffer(collection, **options) -> WriteBehindBuffer:
+    return WriteBehindBuffer(lambda: collection, CircuitBreaker(failure_threshold=100), **options)
+
+
+def test_full_batch_is_written_at_once():
+    collection = Collection()
+    writes = buffer(collection, batch_size=3, flush_interval=60)
+
+    async def main():
+        await writes.put(docs(1, 2))
+        await asyncio.sleep(0.01)
+        assert collection.batches == []
+        await writes.put(docs(3))
+        await asyncio.sleep(0.01)
+        await writes.close()
+
+    asyncio.run(main())
+    assert collection.batches == [[1, 2, 3]]
+
+
+def test_partial_batch_is_written_after_the_interval():
+    collection = Collection()
+    writes = buffer(collection, batch_size=100, flush_interval=0.02)
+
+    async def main():
+        await writes.put(docs(1))
+        await writes.put(docs(2))
+        await asyncio.sleep(0)
+        written_early = list(collection.batches)
+        await asyncio.sleep(0.1)
+        await writes.close()
+        return written_early
+
+    assert asyncio.run(main()) == []
+    assert collection.batches == [[1, 2]]
+    assert writes.stats()["flushed"] == 2
+
+
+def test_documents_spill_to_disk_during_an_outage(tmp_path):
+    collection = Collection()
+    collection.down = True
+    spill = tmp_path / "spill.jsonl"
+    writes = buffer(collection, max_items=2, batch_size=10, spill_path=str(spill))
+    stamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    async def main():
+        writes.add([{"n": n, "ts": stamp} for n in range(5)])
+        assert await writes.flush() == 0
+        assert (len(writes), writes.spilled) == (2, 3)
+        assert len(spill.read_text().splitlines()) == 3
+        collection.down = False
+        return await writes.flush()
+
+    assert asyncio.run(main()) == 5
+    # Spilled documents come back no more than max_items at a time
+    assert collection.batches == [[0, 1], [2, 3], [4]]
+    assert not spill.exists()
+
+
+def test_oldest_are_dropped_without_a_spill_file():
+    collection = Collection()
+    collection.down = True
+    writes = buffer(collection, max_items=2)
+
+    async def main():
+        writes.add(docs(1, 2, 3))
+        return [doc["n"] for doc in writes._docs]
+
+    assert asyncio.run(main()) == [2, 3]
+    assert writes.dropped == 1
+
+
+def test_partial_bulk_write_error_keeps_what_was_stored():
+    collection = Collection()
+    collection.reject = {1: DUPLICATE_KEY, 2: 121}
+    stored = []
+
+    async def after_write(batch):
+        stored.extend(doc["n"] for doc in batch)
+
+    writes = buffer(collection, after_write=after_write)
+
+    async def main():
+        writes.add(docs(1, 2, 3, 4))
+        return await writes.flush()
+
+    # The duplicate was stored by an earlier attempt; the document failing validation is lost
+    assert asyncio.run(main()) == 3
+    assert stored == [1, 2, 4]
+    assert len(writes) == 0
+
+
+def test_queued_documents_can_be_read_back():
+    collection = Collection()
+    collection.down = True
+    writes = buffer(collection)
+
+    async def main():
+        writes.add([{"n": 1, "id": "a", "state": "queued"}, {"n": 2, "id": "a", "state": "done"}])
+        return writes.find("id", "a"), writes.find("id", "b")
+
+    latest, missing = asyncio.run(main())
+    assert (latest["state"], missing) == ("done", None)
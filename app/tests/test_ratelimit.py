@@ -0,0 +1,136 @@
+import asyncio
+import math
+
+import pytest
+
+from admission import Gate, Rejected
+from ratelimit import QuotaExceeded, Quotas, TokenBucket
+
+
+def test_bucket_refills_at_rate_up_to_burst():
+    bucket = TokenBucket(rate=2, burst=4, now=0)
+    assert bucket.take(4, now=0) == 0
+    assert bucket.take(1, now=0) == pytest.approx(0.5)
+    assert bucket.take(1, now=0.5) == 0
+    # Idle time never fills it past the burst
+    assert bucket.full(now=100)
+    assert bucket.take(4, now=100) == 0
+    assert bucket.take(1, now=100) > 0
+
+
+def test_bucket_never_goes_into_debt():
+    bucket = TokenBucket(rate=1, burst=5, now=0)
+    assert math.isinf(bucket.take(6, now=0))
+    # Nothing was taken by the refused request
+    assert bucket.take(5, now=0) == 0
+    assert bucket.tokens == 0
+    assert bucket.take(2, now=1) == pytest.approx(1)
+
+
+def test_burst_below_one_is_refused():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+    with pytest.raises(ValueError):
+        Quotas(rate=1, burst=0.5, concurrency=1)
+    # Without a rate the burst is unused
+    Quotas(rate=0, burst=0, concurrency=1).acquire("a", 100).release()
+
+
+def test_quotas_rate_and_concurrency():
+    quotas = Quotas(rate=1, burst=3, concurrency=2)
+    with quotas.acquire("a"), quotas.acquire("a"):
+        with pytest.raises(QuotaExceeded, match="concurrent"):
+            quotas.acquire("a")
+        # Other callers have their own quota
+        quotas.acquire("b").release()
+    assert quotas.stats()["active"] == 0
+    quotas.charge("a")
+    with pytest.raises(QuotaExceeded) as e:
+        quotas.charge("a")
+    assert 0 < e.value.retry_after <= 1
+    with pytest.raises(QuotaExceeded) as e:
+        quotas.acquire("c", cost=4)
+    assert math.isinf(e.value.retry_after)
+    assert quotas.stats()["rejected_rate"] == 2
+
+
+def test_lease_releases_once():
+    quotas = Quotas(rate=0, burst=1, concurrency=1)
+    lease = quotas.acquire("a")
+    lease.release()
+    lease.release()
+    with lease:
+        pass
+    assert quotas.stats()["active"] == 0
+    quotas.acquire("a").release()
+
+
+def test_idle_callers_are_forgotten_first():
+    quotas = Quotas(rate=0, burst=1, concurrency=1, max_keys=2)
+    busy = quotas.acquire("busy")
+    quotas.acquire("idle").release()
+    quotas.acquire("new").release()
+    assert quotas.stats()["callers"] == 2
+    # The busy caller was kept, so its slot is still taken
+    with pytest.raises(QuotaExceeded):
+        quotas.acquire("busy")
+    busy.release()
+
+
+def test_gate_queues_in_order_and_sheds():
+    async def main():
+        gate = Gate(limit=1, max_queue=2, timeout=1)
+        await gate.enter()
+        admitted = []
+
+        async def wait(n):
+            await gate.enter()
+            admitted.append(n)
+
+        waiters = [asyncio.create_task(wait(n)) for n in range(2)]
+        await asyncio.sleep(0)
+        assert gate.queued == 2
+        with pytest.raises(Rejected) as e:
+            await gate.enter()
+        assert (e.value.status, e.value.reason) == (503, "queue_full")
+        gate.leave()
+        await asyncio.sleep(0)
+        gate.leave()
+        await asyncio.gather(*waiters)
+        assert admitted == [0, 1]
+        assert (gate.active, gate.queued) == (1, 0)
+        gate.leave()
+        assert gate.active == 0
+
+    asyncio.run(main())
+
+
+def test_gate_wait_times_out():
+    async def main():
+        gate = Gate(limit=1, max_queue=1, timeout=0.01)
+        await gate.enter()
+        with pytest.raises(Rejected) as e:
+            await gate.enter()
+        assert e.value.reason == "queue_timeout"
+        assert (gate.active, gate.queued) == (1, 0)
+
+    asyncio.run(main())
+
+
+def test_gate_passes_on_a_slot_handed_to_a_cancelled_waiter():
+    async def main():
+        gate = Gate(limit=1, max_queue=2, timeout=1)
+        await gate.enter()
+        first = asyncio.create_task(gate.enter())
+        second = asyncio.create_task(gate.enter())
+        await asyncio.sleep(0)
+        gate.leave()
+        first.cancel()
+        (outcome,) = await asyncio.gather(first, return_exceptions=True)
+        if not isinstance(outcome, asyncio.CancelledError):
+            # wait_for may finish with the slot anyway; the request then leaves as usual
+            gate.leave()
+        await second
+        assert (gate.active, gate.queued) == (1, 0)
+
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timezone
+
+import mongo
+from circuit import CircuitBreaker
+from rollups import StatusRollups
+
+
+class Counts:
+    """A collection applying ``$inc`` upserts to a dict; ``fail_at`` ops fail the next bulk_write like Mongo would."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.docs = {}
+        self.calls = []
+        self.fail_at = None
+        self.down = False
+
+    async def bulk_write(self, ops, ordered=True):
+        self.calls.append([op._filter[self.key] for op in ops])
+        if self.down:
+            self.down = False
+            raise mongo.ConnectionFailure("down")
+        assert ordered
+        for i, op in enumerate(ops):
+            if i == self.fail_at:
+                self.fail_at = None
+                raise mongo.BulkWriteError({
+                    "writeErrors": [{"index": i, "code": 11000, "errmsg": "duplicate key"}],
+                    "nInserted": 0, "nUpserted": i // 2, "nModified": i - i // 2, "nMatched": i - i // 2,
+                })
+            name = op._filter[self.key]
+            self.docs[name] = self.docs.get(name, 0) + op._doc["$inc"]["count"]
+
+
+def checks(*names: str) -> list:
+    ts = datetime(2025, 1, 1, 12, 0, 30, tzinfo=timezone.utc)
+    return [{"client_name": name, "ts": ts} for name in names]
+
+
+def rollups(flush_interval: float = 5.0):
+    buckets, clients = Counts("client_name"), Counts("client_name")
+    return StatusRollups(lambda: buckets, lambda: clients, CircuitBreaker(), flush_interval), buckets, clients
+
+
+def test_counts_per_minute_and_client():
+    from mongomock_motor import AsyncMongoMockClient
+
+    db = AsyncMongoMockClient()["test"]
+    status = StatusRollups(lambda: db.status_rollups, lambda: db.status_clients, CircuitBreaker())
+    later = [{"client_name": "a", "ts": datetime(2025, 1, 1, 12, 1, 5, tzinfo=timezone.utc)}]
+
+    async def main():
+        await status.apply(checks("a", "b", "a"))
+        await status.apply(later + checks("a"))
+        buckets = await db.status_rollups.find({}, {"_id": 0}).sort([("client_name", 1), ("minute", 1)]).to_list(None)
+        clients = await db.status_clients.find({}, {"_id": 0}).sort("client_name", 1).to_list(None)
+        return buckets, clients
+
+    buckets, clients = asyncio.run(main())
+    assert [(doc["client_name"], doc["minute"].minute, doc["count"]) for doc in buckets] == [
+        ("a", 0, 3), ("a", 1, 1), ("b", 0, 1),
+    ]
+    assert [(doc["client_name"], doc["count"], doc["last_seen"].minute) for doc in clients] == [("a", 4, 1), ("b", 1, 0)]
+    assert status.pending == 0
+
+
+def test_partial_bulk_write_retries_only_what_was_not_applied():
+    status, buckets, clients = rollups()
+    clients.fail_at = 2
+
+    async def main():
+        await status.apply(checks("a", "b", "c", "d"))
+        assert status.pending == 2
+        await status.apply(checks("c"))
+
+    asyncio.run(main())
+    # a and b were applied before the error and are not sent again
+    assert clients.calls == [["a", "b", "c", "d"], ["c", "d"]]
+    assert clients.docs == {"a": 1, "b": 1, "c": 2, "d": 1}
+    assert status.pending == 0
+
+
+def test_pending_deltas_are_flushed_on_a_timer():
+    status, buckets, clients = rollups(flush_interval=0.01)
+    buckets.down = True
+
+    async def main():
+        status.start()
+        await status.apply(checks("a", "a"))
+        assert status.pending == 1
+        # No further batch arrives; the timer writes what the outage left pending
+        await asyncio.sleep(0.05)
+        pending = status.pending
+        await status.close()
+        return pending
+
+    assert asyncio.run(main()) == 0
+    assert buckets.docs == {"a": 2}
+    assert clients.docs == {"a": 2}
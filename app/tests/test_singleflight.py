@@ -0,0 +1,87 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def build(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"built {key}"
+
+    async def main():
+        results = await asyncio.gather(*(flights.do(key, lambda key=key: build(key)) for key in "aaab"))
+        # Finished flights are forgotten; the next call runs again
+        again = await flights.do("a", lambda: build("a"))
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert results == ["built a", "built a", "built a", "built b"]
+    assert again == "built a"
+    assert calls == ["a", "b", "a"]
+    assert (flights.leaders, flights.coalesced, flights.in_flight) == (3, 2, 0)
+
+
+def test_waiters_share_the_exception():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("broken")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("k", fail) for _ in range(2)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert [str(e) for e in errors] == ["broken", "broken"]
+    assert flights.in_flight == 0
+
+
+def test_cancelling_one_waiter_leaves_the_others_waiting():
+    flights = SingleFlight()
+    release = None
+
+    async def build():
+        await release.wait()
+        return "done"
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.ensure_future(flights.do("k", build))
+        second = asyncio.ensure_future(flights.do("k", build))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first.cancelled(), await second
+
+    assert asyncio.run(main()) == (True, "done")
+
+
+def test_shared_call_is_cancelled_with_its_last_waiter():
+    flights = SingleFlight()
+    stopped = []
+
+    async def build():
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            stopped.append(True)
+            raise
+
+    async def main():
+        waiters = [asyncio.ensure_future(flights.do("k", build)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+            await asyncio.sleep(0)
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return [type(r) for r in results], flights.in_flight
+
+    assert asyncio.run(main()) == ([asyncio.CancelledError] * 2, 0)
+    assert stopped == [True]
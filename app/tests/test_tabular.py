@@ -0,0 +1,78 @@
+import asyncio
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+from tabular import FORMATS, iter_csv, iter_ndjson, iter_parquet, negotiate
+from workbook import DATA_HEADERS, TRANSACTION_HEADERS, data_rows, transaction_columns
+
+ROWS = 25
+
+
+def expected_rows() -> list:
+    return [list(row) for row in zip(*transaction_columns(1, ROWS))]
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, None),
+    ("text/html", None),
+    ("text/csv", "csv"),
+    ("text/csv;q=0.5, application/x-ndjson", "ndjson"),
+    ("application/vnd.apache.parquet;q=0.9, text/csv;q=0.2", "parquet"),
+    ("TEXT/CSV; charset=utf-8", "csv"),
+    ("application/jsonlines;q=bad, text/csv;q=0.1", "csv"),
+    ("*/*", None),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept) == expected
+
+
+def test_csv_round_trip():
+    # A batch size that does not divide the rows, so the header is only written once
+    data = b"".join(iter_csv("transactions", ROWS, batch_size=10)).decode("utf-8")
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[0] == list(TRANSACTION_HEADERS)
+    assert rows[1:] == [[str(value) for value in row] for row in expected_rows()]
+
+
+def test_ndjson_round_trip():
+    lines = b"".join(iter_ndjson("transactions", ROWS, batch_size=10)).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [dict(zip(TRANSACTION_HEADERS, row)) for row in expected_rows()]
+
+
+def test_data_sheet_has_evaluated_profit():
+    lines = b"".join(iter_ndjson("data", ROWS)).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [dict(zip(DATA_HEADERS, row)) for row in data_rows()]
+    assert json.loads(lines[0])["Profit"] == 6000
+
+
+def test_parquet_round_trip():
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(iter_parquet("transactions", ROWS, row_group=10))
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column_names == list(TRANSACTION_HEADERS)
+    assert str(table.schema.field("Date").type) == "date32[day]"
+    rows = [list(row.values()) for row in table.to_pylist()]
+    assert [[row[0].isoformat()] + row[1:] for row in rows] == expected_rows()
+    assert isinstance(rows[0][0], datetime.date)
+
+
+def test_accept_header_picks_the_format(new_app, api):
+    app = new_app()
+
+    async def main():
+        async with api(app) as client:
+            return await client.post(
+                "/api/generate", json={"description": "tabular", "rows": 3}, headers={"Accept": "text/csv"},
+            )
+
+    response = asyncio.run(main())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == FORMATS["csv"][0]
+    assert response.headers["vary"] == "Accept"
+    assert response.headers["content-disposition"].endswith('_transactions.csv"')
+    assert len(response.text.splitlines()) == 4
@@ -0,0 +1,76 @@
+import struct
+import time
+import zipfile
+from datetime import datetime, timezone
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+import workbook
+from workbook import DEFAULT_ENGINE, build_workbook, workbook_template, write_workbook
+from xlsx_writer import COMPRESSION_LEVELS, XlsxStreamWriter
+
+
+class FixedClock(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    # "Generated At" and the ZIP member timestamps are the only parts that change between builds
+    monkeypatch.setattr(workbook, "datetime", FixedClock)
+    stamp = time.localtime()
+    monkeypatch.setattr(time, "localtime", lambda *args: stamp)
+
+
+def _build(precompiled: bool, level: int, shared_strings: bool = False) -> bytes:
+    xw = XlsxStreamWriter(level, shared_strings=shared_strings)
+    for _ in write_workbook(xw, "template check", rows=250, precompiled=precompiled):
+        pass
+    xw.close()
+    return xw.drain()
+
+
+def _members(data: bytes) -> list:
+    # Spliced members carry their sizes in the local header instead of a data descriptor, so the archives differ
+    # in framing; each member's deflated bytes must be the same
+    members = []
+    for info in zipfile.ZipFile(BytesIO(data)).infolist():
+        name_length, extra_length = struct.unpack_from("<HH", data, info.header_offset + 26)
+        start = info.header_offset + 30 + name_length + extra_length
+        members.append((info.filename, info.CRC, info.file_size, data[start:start + info.compress_size]))
+    return members
+
+
+@pytest.mark.parametrize("compression", sorted(COMPRESSION_LEVELS))
+def test_template_build_is_byte_identical_to_rendering(compression):
+    level = COMPRESSION_LEVELS[compression]
+    assert _members(_build(True, level)) == _members(_build(False, level))
+
+
+def test_shared_strings_build_has_the_same_cells():
+    # The template keeps its strings inline while a live sheet indexes them, so only the values can match
+    def cells(data: bytes):
+        book = load_workbook(BytesIO(data))
+        return {name: [list(row) for row in book[name].iter_rows(values_only=True)] for name in book.sheetnames}
+
+    level = COMPRESSION_LEVELS["default"]
+    assert cells(_build(True, level, shared_strings=True)) == cells(_build(False, level, shared_strings=True))
+
+
+def test_template_is_compiled_once_per_level():
+    workbook_template.cache_clear()
+    _build(True, 1)
+    _build(True, 1)
+    _build(True, 6)
+    assert workbook_template.cache_info().misses == 2
+
+
+def test_default_engine_uses_the_template():
+    assert DEFAULT_ENGINE == "fast"
+    workbook_template.cache_clear()
+    build_workbook("default engine", rows=10)
+    assert workbook_template.cache_info().currsize == 1
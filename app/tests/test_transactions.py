@@ -0,0 +1,46 @@
+import pytest
+from openpyxl import load_workbook
+
+import workbook
+from workbook import (
+    MAX_SHEET_ROWS, SHEET_DATA_ROWS, TRANSACTION_HEADERS, build_workbook, transaction_columns, transaction_sheets,
+)
+
+
+def test_sheets_split_at_excels_row_limit():
+    assert SHEET_DATA_ROWS == MAX_SHEET_ROWS - 1 == 1_048_575
+    assert list(transaction_sheets(0)) == [("Transactions", 1, 0)]
+    assert list(transaction_sheets(SHEET_DATA_ROWS)) == [("Transactions", 1, SHEET_DATA_ROWS)]
+    assert list(transaction_sheets(SHEET_DATA_ROWS + 1)) == [
+        ("Transactions", 1, SHEET_DATA_ROWS),
+        ("Transactions (2)", SHEET_DATA_ROWS + 1, SHEET_DATA_ROWS + 1),
+    ]
+    assert [title for title, _, _ in transaction_sheets(2 * SHEET_DATA_ROWS + 5)] == [
+        "Transactions", "Transactions (2)", "Transactions (3)",
+    ]
+
+
+def test_columns_follow_the_row_number():
+    dates, categories, amounts, notes, refs, details = transaction_columns(1, 366)
+    assert dates[:2] == ["2025-01-02", "2025-01-03"]
+    # Dates repeat every 365 rows
+    assert dates[364] == "2025-01-01" and dates[365] == dates[0]
+    assert categories[:3] == ["Ops", "Marketing", "R&D"]
+    assert amounts[:3] == [57, 64, 71]
+    assert notes[0] == "Auto-generated transaction row 1 with detailed description"
+    assert refs[0] == "REF-000001"
+    assert details[9].startswith("Detailed description for transaction 10 including")
+    assert transaction_columns(200, 201)[4] == ["REF-000200", "REF-000201"]
+
+
+@pytest.mark.parametrize("engine", sorted(workbook.ENGINES))
+def test_workbooks_continue_on_new_sheets(engine, monkeypatch):
+    monkeypatch.setattr(workbook, "SHEET_DATA_ROWS", 4)
+    book = load_workbook(build_workbook("split", engine, rows=10))
+    assert book.sheetnames[3:] == ["Transactions", "Transactions (2)", "Transactions (3)"]
+    refs = []
+    for name in book.sheetnames[3:]:
+        rows = list(book[name].iter_rows(values_only=True))
+        assert rows[0] == TRANSACTION_HEADERS
+        refs += [row[4] for row in rows[1:]]
+    assert refs == [f"REF-{n:06d}" for n in range(1, 11)]
@@ -0,0 +1,79 @@
+import io
+import random
+import zipfile
+
+import pytest
+
+from xlsx_writer import PARALLEL_BLOCK_SIZE, CompiledPart, ZipStream, compile_part
+
+
+def _payload(size: int) -> bytes:
+    rng = random.Random(size)
+    words = [b"alpha ", b"beta ", b"gamma ", b"delta "]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words)
+    return bytes(out[:size])
+
+
+def _archive(zs: ZipStream) -> zipfile.ZipFile:
+    zs.close()
+    data = zs.drain()
+    assert len(data) == zs.bytes_written
+    return zipfile.ZipFile(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("level", [0, 1, 6])
+@pytest.mark.parametrize("threads", [1, 3])
+def test_streamed_members_read_back(level, threads):
+    big = _payload(PARALLEL_BLOCK_SIZE * 3 + 12345)
+    zs = ZipStream(level, threads)
+    zs.open("big.xml")
+    for i in range(0, len(big), 100_000):
+        zs.write(big[i:i + 100_000])
+    zs.close_entry()
+    zs.writestr("small.xml", b"<x/>")
+    zs.writestr("stored.bin", b"\x00\x01" * 100, compress=False)
+    zs.write_compiled("compiled.xml", compile_part(b"<compiled/>" * 50, level))
+    archive = _archive(zs)
+    assert archive.testzip() is None
+    assert archive.namelist() == ["big.xml", "small.xml", "stored.bin", "compiled.xml"]
+    assert archive.read("big.xml") == big
+    assert archive.read("small.xml") == b"<x/>"
+    assert archive.read("stored.bin") == b"\x00\x01" * 100
+    assert archive.read("compiled.xml") == b"<compiled/>" * 50
+
+
+def test_output_can_be_drained_while_writing():
+    zs = ZipStream(6, threads=2)
+    chunks = []
+    zs.open("a.xml")
+    for _ in range(4):
+        zs.write(_payload(PARALLEL_BLOCK_SIZE))
+        chunks.append(zs.drain())
+    zs.close_entry()
+    zs.close()
+    chunks.append(zs.drain())
+    assert sum(map(len, chunks[:-1])) > 0
+    assert zipfile.ZipFile(io.BytesIO(b"".join(chunks))).read("a.xml") == _payload(PARALLEL_BLOCK_SIZE) * 4
+
+
+def test_members_over_4_gib_are_refused():
+    zs = ZipStream()
+    with pytest.raises(ValueError, match="exceeds 4 GiB"):
+        zs.write_compiled("huge.xml", CompiledPart(b"", 0, 2 ** 32))
+    zs.open("streamed.xml")
+    zs.write(b"x")
+    # Writing 4 GiB takes too long here; the entry only needs to report that size
+    zs._current.size = 2 ** 32
+    with pytest.raises(ValueError, match="exceeds 4 GiB"):
+        zs.close_entry()
+
+
+def test_open_member_blocks_others():
+    zs = ZipStream()
+    zs.open("a.xml")
+    with pytest.raises(RuntimeError):
+        zs.open("b.xml")
+    with pytest.raises(RuntimeError):
+        zs.writestr("c.bin", b"", compress=False)